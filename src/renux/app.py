@@ -1,15 +1,28 @@
 import os
+import re
+from typing import Iterator
 
 from textual.app import App, ComposeResult
-from textual.containers import Container, HorizontalScroll, VerticalScroll
+from textual.containers import (
+    Container,
+    HorizontalScroll,
+    Vertical,
+    VerticalScroll,
+)
 from textual.widgets import Checkbox, Footer, Input, Label, Select
+from textual.worker import get_current_worker
 
-from renux.backup import load_backup, save_backup
+from renux.backup import HistoryStack, load_backup, record_operation
 from renux.bindings import BINDINGS
 from renux.components import Form, Preview
 from renux.constants import DEFAULT_OPTIONS
-from renux.helpers.files import get_files, is_excluded
-from renux.renamer import apply_renames, get_renames
+from renux.helpers.files import (
+    ExcludeMatcher,
+    scan_batches,
+    sort_paths,
+    walk_batches,
+)
+from renux.renamer import RenameError, RenamePlan, apply_renames, get_renames
 from renux.screens import HelpScreen
 from renux.ui import CSS_PATH, THEME
 
@@ -27,6 +40,8 @@ class RenameApp(App):
         replacement: str = "",
         options: dict[str, str | int | bool] = DEFAULT_OPTIONS.copy(),
         exclude: str = "",
+        jobs: int = 1,
+        recursive: bool = False,
         *args,
         **kwargs,
     ):
@@ -35,27 +50,117 @@ class RenameApp(App):
 
         super().__init__(*args, **kwargs)
 
-        self.undo_stack, self.redo_stack = load_backup(directory)
+        # Loaded on first use (see `undo_stack`), not before the first frame.
+        self._history: tuple[HistoryStack, HistoryStack] | None = None
 
         self.directory = directory
         self.pattern = pattern
         self.replacement = replacement
         self.options = options
         self.exclude = exclude
+        self._exclude_source = ""
+        self._exclude_matcher = ExcludeMatcher([])
+        self.jobs = jobs
+        # Whether files in subdirectories are listed (as relative paths) too.
+        self.recursive = recursive
+
+        # Filled in by `load_files` once the app is running.
+        self.entries: dict[str, os.DirEntry[str]] = {}
+        self.files: list[str] = []
+        self.files_version = 0
+        self.scanning = False
+        self._scan_generation = 0
+        self.disabled_files: set[str] = set()
+
+    @property
+    def undo_stack(self) -> HistoryStack:
+        return self._load_history()[0]
+
+    @property
+    def redo_stack(self) -> HistoryStack:
+        return self._load_history()[1]
+
+    def _load_history(self) -> tuple[HistoryStack, HistoryStack]:
+        if self._history is None:
+            self._history = load_backup(self.directory)
+        return self._history
+
+    def load_files(self) -> None:
+        """(Re)scan the directory in a background thread.
+
+        Files are added to `files` in batches as `os.scandir` finds them, so
+        the preview fills in while a big directory is still being read, and
+        sorted once the scan is done. `entries` keeps each file's
+        `os.DirEntry` so placeholders can reuse its stat result. With
+        `recursive`, subdirectories are walked too (see `walk_batches`)."""
+        self._scan_generation += 1
+        generation = self._scan_generation
+        self.scanning = True
+        self.entries = {}
+        self.files = []
+        # Bumped on every change to the list, so cached previews are dropped.
+        self.files_version += 1
+        directory = self.directory
+        recursive = self.recursive
+        jobs = self.jobs
+
+        def batches() -> Iterator[list[tuple[str, os.DirEntry[str]]]]:
+            if recursive:
+                yield from walk_batches(directory, jobs)
+            else:
+                for batch in scan_batches(directory):
+                    yield [(entry.name, entry) for entry in batch]
+
+        def scan() -> None:
+            worker = get_current_worker()
+            try:
+                for batch in batches():
+                    if worker.is_cancelled:
+                        return
+                    self.call_from_thread(self._add_scanned, generation, batch)
+            except OSError as e:
+                self.call_from_thread(
+                    self.show_message, f"Couldn't read the directory: {e}"
+                )
+            if not worker.is_cancelled:
+                self.call_from_thread(self._finish_scan, generation)
+
+        # `exclusive` cancels the scan started before this one.
+        self.run_worker(scan, group="scan", exclusive=True, thread=True)
+
+    def _add_scanned(
+        self, generation: int, batch: list[tuple[str, os.DirEntry[str]]]
+    ) -> None:
+        if generation != self._scan_generation:
+            return  # from a scan that's been replaced
+        self.entries.update(batch)
+        self.files.extend(path for path, _ in batch)
+        self.files_version += 1
+        self.query_one(Preview).update_preview()
 
-        self.files = get_files(directory)
-        self.disabled_files: list[str] = []
+    def _finish_scan(self, generation: int) -> None:
+        if generation != self._scan_generation:
+            return
+        self.entries = sort_paths(self.entries.items())
+        self.files = list(self.entries)
+        self.scanning = False
+        self.files_version += 1
+        self.query_one(Preview).update_preview(debounce=False)
 
     def is_excluded(self, file_name: str) -> bool:
         """Check if `file_name` matches a pattern in the exclude field."""
-        patterns = [p.strip() for p in self.exclude.split(",") if p.strip()]
-        return is_excluded(file_name, patterns)
+        if self._exclude_source != self.exclude:
+            # Compile the patterns once per edit of the field, not per file.
+            self._exclude_matcher = ExcludeMatcher.from_string(self.exclude)
+            self._exclude_source = self.exclude
+        return self._exclude_matcher.matches(file_name)
 
     def on_mount(self) -> None:
         self.register_theme(THEME)
         self.theme = THEME.name
         # Focus on the first input field
         self.query_one("#pattern", Input).focus()
+        self.load_files()
 
     def compose(self) -> ComposeResult:
         yield Footer()
@@ -67,8 +172,8 @@ class RenameApp(App):
                     classes="align-center",
                 )
                 yield Form(id="form")
-            # Preview column
-            with VerticalScroll(id="preview-column"):
+            # Preview column (the preview list scrolls itself)
+            with Vertical(id="preview-column"):
                 yield Preview(id="preview")
 
     def show_message(self, message: str, status: str = "error") -> None:
@@ -77,7 +182,10 @@ class RenameApp(App):
         error_label.update(message)
 
     def on_input_changed(self, event: Input.Changed) -> None:
-        self.query_one(Preview).update_preview()
+        if event.input.id == "exclude":
+            self.query_one(Preview).restyle()
+        else:
+            self.query_one(Preview).update_preview()
         self.show_message("")
 
     def on_checkbox_changed(self, event: Checkbox.Changed) -> None:
@@ -108,23 +216,76 @@ class RenameApp(App):
             DEFAULT_OPTIONS["case_sensitive"]
         )
         self.query_one("#apply_to", Select).value = DEFAULT_OPTIONS["apply_to"]
+        self.query_one("#per_directory_counters", Checkbox).value = bool(
+            DEFAULT_OPTIONS["per_directory_counters"]
+        )
 
     def action_save(self) -> None:
+        """Apply the renames shown in the preview (minus toggled-off and
+        excluded files).
+
+        The preview's result for the current form is reused when it's what
+        renaming just the kept files gives, i.e. no file is skipped or the
+        template has no counters (which would number the skipped files too).
+        Otherwise the renames are planned again in a background thread, so
+        a big directory doesn't freeze the UI."""
+        if self.scanning:
+            self.show_message("Still reading the directory. Try again in a moment.")
+            return
+
         files = [
             file
             for file in self.files
             if file not in self.disabled_files and not self.is_excluded(file)
         ]
+        rows = self.query_one(Preview).cached_rows()
+        if rows is not None and (
+            len(files) == len(self.files) or not self._has_counters()
+        ):
+            kept = set(files)
+            self._apply_save([pair for pair in zip(*rows) if pair[0] in kept])
+            return
+
+        # Snapshot the form state; the worker must not read the live app.
+        args = (
+            files,
+            self.directory,
+            self.pattern,
+            self.replacement,
+            dict(self.options),
+            self.jobs,
+        )
+        entries = self.entries
+
+        def plan() -> None:
+            worker = get_current_worker()
+            renames = get_renames(*args, entries=entries)
+            if not worker.is_cancelled:
+                self.call_from_thread(self._apply_save, renames)
+
+        self.show_message("Planning renames…", "warning")
+        self.run_worker(plan, group="save", exclusive=True, thread=True)
+
+    def _has_counters(self) -> bool:
         try:
-            renames = get_renames(
-                files, self.directory, self.pattern, self.replacement, self.options
-            )
-            self.undo_stack.append(renames)
-            apply_renames(self.directory, renames)
+            plan = RenamePlan(self.pattern, self.replacement, self.options)
+        except re.error:
+            return False
+        return bool(plan.template.stateful)
 
-            self.files = get_files(self.directory)
+    def _apply_save(self, renames: list[tuple[str, str]]) -> None:
+        try:
+            try:
+                apply_renames(self.directory, renames, self.jobs)
+            except RenameError as e:
+                # Keep what was renamed undoable.
+                record_operation(self.undo_stack, self.redo_stack, "apply", e.applied)
+                self.load_files()
+                raise
+            record_operation(self.undo_stack, self.redo_stack, "apply", renames)
+
+            self.load_files()
             self.disabled_files.clear()
-            self.redo_stack.clear()
 
             self.query_one("#pattern", Input).value = ""
             self.query_one("#replacement", Input).value = ""
@@ -133,47 +294,48 @@ class RenameApp(App):
         except Exception as e:
             self.show_message(str(e))
 
-        save_backup(self.directory, self.undo_stack, self.redo_stack)
-
-        self.query_one(Preview).update_preview()
+        self.query_one(Preview).update_preview(debounce=False)
 
     def action_undo(self) -> None:
         if not self.undo_stack:
             self.show_message("Nothing to undo.", "error")
             return
 
-        last_renames = self.undo_stack.pop()
-
+        reversed_renames = [(new, old) for old, new in self.undo_stack[-1]]
         try:
-            reversed_renames = [(new, old) for old, new in last_renames]
-            apply_renames(self.directory, reversed_renames)
-            self.redo_stack.append(last_renames)
+            apply_renames(self.directory, reversed_renames, self.jobs, "undo")
+            record_operation(self.undo_stack, self.redo_stack, "undo", reversed_renames)
             self.show_message("Undo successful.", "success")
+        except RenameError as e:
+            record_operation(
+                self.undo_stack, self.redo_stack, "undo", e.applied, e.failed
+            )
+            self.show_message(f"Undo failed: {e}", "error")
         except Exception as e:
             self.show_message(f"Undo failed: {e}", "error")
 
-        save_backup(self.directory, self.undo_stack, self.redo_stack)
-
-        self.files = get_files(self.directory)
+        self.load_files()
         self.disabled_files.clear()
-        self.query_one(Preview).update_preview()
+        self.query_one(Preview).update_preview(debounce=False)
 
     def action_redo(self) -> None:
         if not self.redo_stack:
             self.show_message("Nothing to redo.", "error")
             return
 
-        renames = self.redo_stack.pop()
-
+        renames = self.redo_stack[-1]
         try:
-            apply_renames(self.directory, renames)
-            self.undo_stack.append(renames)
+            apply_renames(self.directory, renames, self.jobs, "redo")
+            record_operation(self.undo_stack, self.redo_stack, "redo", renames)
             self.show_message("Redo successful.", "success")
+        except RenameError as e:
+            record_operation(
+                self.undo_stack, self.redo_stack, "redo", e.applied, e.failed
+            )
+            self.show_message(f"Redo failed: {e}", "error")
         except Exception as e:
             self.show_message(f"Redo failed: {e}", "error")
 
-        save_backup(self.directory, self.undo_stack, self.redo_stack)
-
-        self.files = get_files(self.directory)
+        self.load_files()
         self.disabled_files.clear()
-        self.query_one(Preview).update_preview()
+        self.query_one(Preview).update_preview(debounce=False)
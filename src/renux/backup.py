@@ -1,9 +1,60 @@
+"""Per-directory undo/redo history.
+
+Every directory's undo and redo stacks live in one SQLite database in the
+backup directory, one row per operation. An operation holds just the pairs
+that changed a name, front-coded and compressed (see `_encode`), so a few
+hundred renames in a huge directory take a few KB. Pushing or popping an
+operation touches just that row, and nothing is read until it's needed: the
+stacks returned by `load_backup` only look up their length, and fetch an
+operation when it's popped or indexed. Changes are written as they're made.
+
+History is kept within limits (see `MAX_OPERATIONS`, `MAX_BYTES` and
+`MAX_AGE_DAYS`): after an operation is recorded, the oldest operations over
+a limit are dropped on a background thread, and the space they took is
+handed back to the filesystem (the database uses incremental auto-vacuum).
+
+History saved by older versions (a JSON file per directory) is moved into
+the database the first time that directory is loaded.
+"""
+
+from __future__ import annotations
+
+import atexit
 import hashlib
 import json
 import os
+import sqlite3
 import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Mapping
 
 BACKUP_DIRNAME = ".renux_backup"
+HISTORY_FILENAME = "history.sqlite3"
+
+
+def _env_limit(name: str, default: int) -> int:
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+# History limits; 0 turns a limit off. Set with the environment variables
+# of the same name (e.g. `RENUX_HISTORY_MAX_OPERATIONS=20`).
+# Operations kept per directory (undo and redo together).
+MAX_OPERATIONS = _env_limit("RENUX_HISTORY_MAX_OPERATIONS", 100)
+# Total size of all directories' recorded operations.
+MAX_BYTES = _env_limit("RENUX_HISTORY_MAX_BYTES", 256 * 1024 * 1024)
+# Days after which an operation is dropped.
+MAX_AGE_DAYS = _env_limit("RENUX_HISTORY_MAX_AGE_DAYS", 90)
+
+UNDO = "undo"
+REDO = "redo"
+
+Renames = list[tuple[str, str]]
 
 
 def _get_backup_dir() -> str:
@@ -13,46 +64,425 @@ def _get_backup_dir() -> str:
     return backup_dir
 
 
+def _directory_digest(directory: str) -> str:
+    """Return a short, filename-safe ID for the given directory."""
+    return hashlib.sha256(directory.encode()).hexdigest()[:16]
+
+
 def _get_backup_path(directory: str) -> str:
-    """Return a unique backup file path for the given directory."""
-    hash_digest = hashlib.sha256(directory.encode()).hexdigest()[:16]
-    filename = f"backup_{hash_digest}.json"
+    """Return the path of the given directory's JSON backup file, as saved
+    before the history moved into the database."""
+    filename = f"backup_{_directory_digest(directory)}.json"
     return os.path.join(_get_backup_dir(), filename)
 
 
-def load_backup(
-    directory: str,
-) -> tuple[list[list[tuple[str, str]]], list[list[tuple[str, str]]]]:
-    """Load undo and redo stacks from a directory-specific backup file."""
-    backup_filepath = _get_backup_path(directory)
+@dataclass
+class DirectoryStats:
+    """How much history one directory has."""
+
+    directory: str
+    undo: int
+    redo: int
+    size: int
+    oldest: float
+    newest: float
+
+
+class HistoryStore:
+    """The undo/redo history database, kept within the given limits."""
 
-    if not os.path.exists(backup_filepath):
-        return [], []
+    def __init__(
+        self,
+        path: str,
+        max_operations: int = MAX_OPERATIONS,
+        max_bytes: int = MAX_BYTES,
+        max_age_days: int = MAX_AGE_DAYS,
+    ) -> None:
+        self.path = path
+        self.max_operations = max_operations
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._evicting: threading.Thread | None = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        (auto_vacuum,) = self._conn.execute("PRAGMA auto_vacuum").fetchone()
+        if auto_vacuum != 2:
+            # So evicting can shrink the file. Takes effect right away on a
+            # new database, and after rebuilding it (once) for an older one.
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("VACUUM")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                directory TEXT, stack TEXT, renames BLOB,
+                size INTEGER, created REAL
+            );
+            CREATE INDEX IF NOT EXISTS history_stack
+                ON history (directory, stack, id);
+            """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(history)")}
+        with self._conn:
+            if "created" not in columns:
+                # A database from before history had limits.
+                self._conn.execute("ALTER TABLE history ADD COLUMN size INTEGER")
+                self._conn.execute("ALTER TABLE history ADD COLUMN created REAL")
+            # Fill in rows written without them, including by an older renux
+            # sharing this database since it was upgraded.
+            self._conn.execute(
+                "UPDATE history SET size = length(renames), created = ? "
+                "WHERE size IS NULL OR created IS NULL",
+                (time.time(),),
+            )
 
+    def count(self, directory: str, stack: str) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM history WHERE directory = ? AND stack = ?",
+                (directory, stack),
+            ).fetchone()
+        return count
+
+    def get(self, directory: str, stack: str, offset: int) -> Renames | None:
+        """Return the operation `offset` places below the top of `stack`."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT renames FROM history WHERE directory = ? AND stack = ? "
+                "ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (directory, stack, offset),
+            ).fetchone()
+        return None if row is None else _decode(row[0])
+
+    def iter(self, directory: str, stack: str) -> Iterator[Renames]:
+        """Yield the operations on `stack`, oldest first, one at a time."""
+        with self._lock:
+            ids = [
+                row_id
+                for (row_id,) in self._conn.execute(
+                    "SELECT id FROM history WHERE directory = ? AND stack = ? "
+                    "ORDER BY id",
+                    (directory, stack),
+                )
+            ]
+        for row_id in ids:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT renames FROM history WHERE id = ?", (row_id,)
+                ).fetchone()
+            if row is not None:
+                yield _decode(row[0])
+
+    def push(self, directory: str, stack: str, renames: Renames) -> None:
+        encoded = _encode(renames)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO history (directory, stack, renames, size, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (directory, stack, encoded, len(encoded), time.time()),
+            )
+        self._evict_in_background(directory)
+
+    def pop(self, directory: str, stack: str) -> Renames | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, renames FROM history WHERE directory = ? AND stack = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (directory, stack),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM history WHERE id = ?", (row[0],))
+        return _decode(row[1])
+
+    def clear(self, directory: str, stack: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM history WHERE directory = ? AND stack = ?",
+                (directory, stack),
+            )
+
+    def migrate(self, directory: str) -> None:
+        """Move `directory`'s JSON backup file, if any, into the database."""
+        path = _get_backup_path(directory)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError):
+            data = {}
+        now = time.time()
+        with self._lock, self._conn:
+            for stack in (UNDO, REDO):
+                encoded = [_encode(r) for r in data.get(f"{stack}_stack", [])]
+                self._conn.executemany(
+                    "INSERT INTO history (directory, stack, renames, size, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(directory, stack, e, len(e), now) for e in encoded],
+                )
+        os.remove(path)
+
+    def _evict_in_background(self, directory: str) -> None:
+        if self._evicting is not None and self._evicting.is_alive():
+            return  # the running pass will do
+        self._evicting = threading.Thread(
+            target=self.evict, args=(directory,), daemon=True
+        )
+        self._evicting.start()
+
+    def evict(self, directory: str | None = None) -> int:
+        """Drop the oldest operations over the limits: beyond
+        `max_operations` in `directory` (if given), older than
+        `max_age_days`, and beyond `max_bytes` in total. Old JSON backup
+        files past the age limit are deleted too. Returns how many
+        operations were dropped."""
+        dropped = 0
+        with self._lock, self._conn:
+            if directory is not None and self.max_operations > 0:
+                dropped += self._conn.execute(
+                    "DELETE FROM history WHERE directory = ? AND id NOT IN "
+                    "(SELECT id FROM history WHERE directory = ? "
+                    "ORDER BY id DESC LIMIT ?)",
+                    (directory, directory, self.max_operations),
+                ).rowcount
+            if self.max_age_days > 0:
+                dropped += self._conn.execute(
+                    "DELETE FROM history WHERE created < ?",
+                    (time.time() - self.max_age_days * 86400,),
+                ).rowcount
+            if self.max_bytes > 0:
+                # Keep the newest operations that fit in the budget.
+                dropped += self._conn.execute(
+                    "DELETE FROM history WHERE id IN (SELECT id FROM "
+                    "(SELECT id, SUM(size) OVER (ORDER BY id DESC) AS total "
+                    "FROM history) WHERE total > ?)",
+                    (self.max_bytes,),
+                ).rowcount
+        if dropped:
+            # executescript runs each pragma to completion; `execute` would
+            # free only the first page.
+            with self._lock:
+                self._conn.executescript(
+                    "PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);"
+                )
+        if self.max_age_days > 0:
+            _remove_old_backup_files(
+                os.path.dirname(self.path), self.max_age_days * 86400
+            )
+        return dropped
+
+    def stats(self) -> list[DirectoryStats]:
+        """Return each directory's history usage, largest first."""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT directory, SUM(stack = 'undo'), SUM(stack = 'redo'),
+                       COALESCE(SUM(size), 0), MIN(created), MAX(created)
+                FROM history GROUP BY directory ORDER BY 4 DESC
+                """).fetchall()
+        return [DirectoryStats(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# First byte of an encoded operation, so the encoding can change later.
+_RECORD_FORMAT = 1
+
+
+def _remove_old_backup_files(backup_dir: str, max_age: float) -> None:
+    """Delete JSON backup files (from before the history database) that
+    haven't been written to for `max_age` seconds."""
+    cutoff = time.time() - max_age
     try:
-        with open(backup_filepath, "r") as f:
-            data = json.load(f)
-            undo_stack = data.get("undo_stack", [])
-            redo_stack = data.get("redo_stack", [])
-            return undo_stack, redo_stack
-    except (json.JSONDecodeError, IOError):
-        return [], []
-
-
-def save_backup(
-    directory: str,
-    undo_stack: list[list[tuple[str, str]]],
-    redo_stack: list[list[tuple[str, str]]],
-    indent: int = 2,
-) -> None:
-    """Save undo and redo stacks to a directory-specific backup file."""
-    backup_filepath = _get_backup_path(directory)
-    with open(backup_filepath, "w") as f:
-        json.dump(
-            {
-                "undo_stack": undo_stack,
-                "redo_stack": redo_stack,
-            },
-            f,
-            indent=indent,
+        entries = list(os.scandir(backup_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if not (entry.name.startswith("backup_") and entry.name.endswith(".json")):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def disk_usage(directory: str, kinds: Mapping[str, str]) -> dict[str, int]:
+    """Bytes taken by the files in `directory`, per kind: `kinds` maps each
+    kind to the prefix of its files' names. Kinds without files are left
+    out."""
+    usage: dict[str, int] = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return usage
+    for entry in entries:
+        for kind, prefix in kinds.items():
+            if entry.name.startswith(prefix):
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    break
+                usage[kind] = usage.get(kind, 0) + size
+                break
+    return usage
+
+
+def _encode(renames: Renames) -> bytes:
+    """Encode an operation compactly: each name is front-coded against the
+    previous pair's name on the same side (names in a batch are sorted, so
+    neighbours tend to share long prefixes), then the lot is compressed.
+
+    Each name is stored as the length of the shared prefix and the rest of
+    the name as length-prefixed UTF-8 (with surrogates kept, since file
+    names needn't be valid UTF-8)."""
+    out = bytearray()
+    previous = ("", "")
+    for pair in renames:
+        for name, prev in zip(pair, previous):
+            shared = len(os.path.commonprefix((name, prev)))
+            suffix = name[shared:].encode("utf-8", "surrogatepass")
+            _put_varint(out, shared)
+            _put_varint(out, len(suffix))
+            out += suffix
+        previous = pair
+    return bytes([_RECORD_FORMAT]) + zlib.compress(out)
+
+
+def _decode(value: bytes | str) -> Renames:
+    if isinstance(value, str):
+        # A plain JSON list, as stored before operations were encoded.
+        return [(old, new) for old, new in json.loads(value)]
+
+    data = zlib.decompress(value[1:])
+    renames = []
+    previous = ["", ""]
+    pos = 0
+    while pos < len(data):
+        for side in (0, 1):
+            shared, pos = _get_varint(data, pos)
+            length, pos = _get_varint(data, pos)
+            suffix = data[pos : pos + length].decode("utf-8", "surrogatepass")
+            pos += length
+            previous[side] = previous[side][:shared] + suffix
+        renames.append((previous[0], previous[1]))
+    return renames
+
+
+def _put_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+_store: HistoryStore | None = None
+
+
+def get_store() -> HistoryStore:
+    """Return the process-wide history database."""
+    global _store
+    if _store is None:
+        _store = HistoryStore(os.path.join(_get_backup_dir(), HISTORY_FILENAME))
+        atexit.register(_store.close)
+    return _store
+
+
+class HistoryStack:
+    """One directory's undo or redo stack, read and written in place.
+
+    It supports the list operations the history needs (`append`, `pop`,
+    `clear`, `len`, indexing and iteration), each touching only the
+    operations involved."""
+
+    def __init__(self, store: HistoryStore, directory: str, stack: str) -> None:
+        self._store = store
+        self._directory = directory
+        self._stack = stack
+
+    def __len__(self) -> int:
+        return self._store.count(self._directory, self._stack)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, index: int) -> Renames:
+        offset = -index - 1 if index < 0 else len(self) - index - 1
+        renames = (
+            self._store.get(self._directory, self._stack, offset)
+            if offset >= 0
+            else None
         )
+        if renames is None:
+            raise IndexError("history index out of range")
+        return renames
+
+    def __iter__(self) -> Iterator[Renames]:
+        return self._store.iter(self._directory, self._stack)
+
+    def append(self, renames: Renames) -> None:
+        self._store.push(self._directory, self._stack, renames)
+
+    def pop(self) -> Renames:
+        renames = self._store.pop(self._directory, self._stack)
+        if renames is None:
+            raise IndexError("pop from empty history")
+        return renames
+
+    def clear(self) -> None:
+        self._store.clear(self._directory, self._stack)
+
+
+def load_backup(directory: str) -> tuple[HistoryStack, HistoryStack]:
+    """Return the undo and redo stacks of `directory`."""
+    store = get_store()
+    store.migrate(directory)
+    return (
+        HistoryStack(store, directory, UNDO),
+        HistoryStack(store, directory, REDO),
+    )
+
+
+def record_operation(
+    undo_stack: HistoryStack,
+    redo_stack: HistoryStack,
+    operation: str,
+    applied: Renames,
+    failed: Renames | None = None,
+) -> None:
+    """Update the history after a batch of renames for `operation` ("apply",
+    "undo", "redo" or "rollback") renamed the `applied` pairs and couldn't
+    rename the `failed` ones. An undone or redone operation is taken off its
+    stack; whatever of it failed is put back, so it can be tried again.
+
+    Only pairs that change a name are recorded."""
+    applied = [(old, new) for old, new in applied if old != new]
+    if operation == "apply":
+        if applied:
+            undo_stack.append(applied)
+            redo_stack.clear()
+    elif operation == "undo":
+        undo_stack.pop()
+        # The pairs of an undo are reversed; store them the right way round.
+        if applied:
+            redo_stack.append([(old, new) for new, old in applied])
+        if failed:
+            undo_stack.append([(old, new) for new, old in failed])
+    elif operation == "redo":
+        redo_stack.pop()
+        if applied:
+            undo_stack.append(applied)
+        if failed:
+            redo_stack.append(failed)
@@ -0,0 +1,169 @@
+"""Persistent cache of extracted file metadata (see `renux.facts`).
+
+Extractor results are stored in a SQLite database next to the undo/redo
+backups, keyed by the file's (device, inode, size, mtime_ns) plus the
+extractor family. A renamed file keeps its entry; a modified one gets a new
+key. Failed extractions (e.g. "not an image") are stored too, so they don't
+have to be re-discovered on the next run.
+
+The cache holds at most `MAX_ENTRIES` entries, evicting the least recently
+used first. Set `RENUX_NO_CACHE=1` (or pass `--no-cache`) to disable it.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from renux.backup import _get_backup_dir
+
+CACHE_FILENAME = "metadata.sqlite3"
+MAX_ENTRIES = 1_000_000
+# Pending writes are committed in batches of this many.
+FLUSH_EVERY = 1000
+
+Key = tuple[int, int, int, int]  # (device, inode, size, mtime_ns)
+
+
+class MetadataCache:
+    """A size-bounded, least-recently-used store of extractor results."""
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS facts (
+                dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+                family TEXT, value TEXT, error TEXT, used INTEGER,
+                PRIMARY KEY (dev, ino, size, mtime_ns, family)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS facts_used ON facts (used);
+            """)
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM facts").fetchone()
+        self._pending: dict[tuple[Key, str], tuple[str | None, str | None]] = {}
+        self._touched: set[tuple[Key, str]] = set()
+
+    def get(self, key: Key, family: str) -> tuple[Any, str | None] | None:
+        """Return `(value, error)` for a cached result, or None on a miss."""
+        with self._lock:
+            entry = self._pending.get((key, family))
+            if entry is None:
+                try:
+                    entry = self._conn.execute(
+                        "SELECT value, error FROM facts WHERE dev = ? AND ino = ? "
+                        "AND size = ? AND mtime_ns = ? AND family = ?",
+                        (*key, family),
+                    ).fetchone()
+                except sqlite3.Error:
+                    return None  # e.g. locked by another renux; treat as a miss
+                if entry is None:
+                    return None
+                self._touched.add((key, family))
+        value, error = entry
+        return (None if value is None else json.loads(value)), error
+
+    def put(
+        self, key: Key, family: str, value: Any = None, error: str | None = None
+    ) -> None:
+        """Store an extractor's result (`value`) or failure message (`error`)."""
+        try:
+            encoded = None if error is not None else json.dumps(value)
+        except (TypeError, ValueError):
+            return  # not JSON-serializable; it just isn't cached
+        with self._lock:
+            self._pending[(key, family)] = (encoded, error)
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def flush(self) -> None:
+        """Commit pending writes and evict old entries if over the limit."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending and not self._touched:
+            return
+        try:
+            self._write()
+        except sqlite3.Error:
+            pass  # the cache is best-effort; drop this batch
+        self._pending.clear()
+        self._touched.clear()
+
+    def _write(self) -> None:
+        now = time.time_ns()
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE facts SET used = ? WHERE dev = ? AND ino = ? AND size = ? "
+                "AND mtime_ns = ? AND family = ?",
+                [(now, *key, family) for key, family in self._touched],
+            )
+            cursor = self._conn.executemany(
+                "INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (*key, family, value, error, now)
+                    for (key, family), (value, error) in self._pending.items()
+                ],
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                # Replacing a key counts as a new row above; recount before
+                # evicting anything.
+                (self._count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM facts"
+                ).fetchone()
+            if self._count > self.max_entries:
+                # Evict down to 90% so this doesn't run on every flush.
+                excess = self._count - self.max_entries * 9 // 10
+                self._conn.execute(
+                    "DELETE FROM facts WHERE (dev, ino, size, mtime_ns, family) IN "
+                    "(SELECT dev, ino, size, mtime_ns, family FROM facts "
+                    "ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+                (self._count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM facts"
+                ).fetchone()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+_cache: MetadataCache | None = None
+_enabled = not os.environ.get("RENUX_NO_CACHE")
+# Guards opening `_cache`, which prefetch threads may ask for at once.
+_cache_lock = threading.Lock()
+
+
+def disable() -> None:
+    """Turn the metadata cache off for the rest of this process."""
+    global _enabled
+    _enabled = False
+
+
+def get_cache() -> MetadataCache | None:
+    """Return the process-wide metadata cache, or None if it's disabled or
+    can't be opened."""
+    global _cache, _enabled
+    if not _enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and _enabled:
+                try:
+                    _cache = MetadataCache(
+                        os.path.join(_get_backup_dir(), CACHE_FILENAME)
+                    )
+                except (sqlite3.Error, OSError):
+                    _enabled = False
+                    return None
+                atexit.register(_cache.close)
+    return _cache
@@ -1,10 +1,30 @@
 import os
+import re
+import time
+from typing import Mapping
 
+from rich import box
+from rich.table import Table
+
+from renux import cache, snapshot
 from renux.app import RenameApp
-from renux.backup import load_backup, save_backup
-from renux.helpers.files import filter_excluded, get_files
+from renux.backup import (
+    HISTORY_FILENAME,
+    disk_usage,
+    get_store,
+    load_backup,
+    record_operation,
+)
+from renux.helpers.files import Entry, filter_excluded, walk_files
+from renux.journal import Journal
 from renux.parser import parse_args
-from renux.renamer import apply_renames, get_renames
+from renux.renamer import (
+    RenameError,
+    RenamePlan,
+    apply_renames,
+    rename_files,
+)
+from renux.snapshot import Snapshot
 from renux.ui import CONSOLE
 
 
@@ -15,37 +35,79 @@ def run_headless(
     options: dict,
     dry_run: bool,
     exclude: list[str] | None = None,
+    workers: int = 1,
+    recursive: bool = False,
 ) -> None:
-    """Compute and (unless dry-run) apply renames without opening the TUI."""
-    files = filter_excluded(get_files(directory), exclude or [])
-    renames = get_renames(files, directory, pattern, replacement, options)
-    changed = [(old, new) for old, new in renames if old != new]
+    """Compute and (unless dry-run) apply renames without opening the TUI.
+    With `recursive`, files in subdirectories are renamed too, as one batch."""
+    try:
+        plan = RenamePlan(pattern, replacement, options)
+    except re.error as e:
+        CONSOLE.print(f"Invalid pattern: {e}", style="red")
+        return
+
+    # Only keep each file's DirEntry (for its stat result) if the template
+    # reads file metadata; otherwise the names are all that's needed.
+    entries: Mapping[str, Entry] | None
+    listing: Snapshot | None = None
+    if recursive:
+        entries = walk_files(directory, workers)
+        names = list(entries)
+        if not plan.template.extractors:
+            entries = None
+    else:
+        # A run just before on the same, unchanged directory (e.g. the
+        # --dry-run before this --yes) saved its listing; reuse it.
+        listing = Snapshot.scan(directory)
+        entries = listing.entries if plan.template.extractors else None
+        names = list(listing.entries)
+    files = filter_excluded(names, exclude or [])
+
+    # Stream the plan, printing each change as it's planned. A dry run keeps
+    # none of them; otherwise the changed pairs are kept, as the batch is
+    # applied, journaled and recorded for undo as a whole (see apply_renames).
+    record: list[tuple[str, str]] = []
+    changed = 0
+    for old_name, new_name in plan.iter_renames(
+        files, directory, workers, processes=workers, entries=entries
+    ):
+        if old_name != new_name:
+            CONSOLE.print(f"{old_name} -> {new_name}")
+            changed += 1
+            if not dry_run:
+                record.append((old_name, new_name))
+    existing: set[str] | None = None
+    if listing is not None:
+        listing.save()
+        # Applying checks the new names against the listing while the
+        # directory's stamp still matches it, instead of listing it again.
+        if not dry_run:
+            existing, stamp = listing.existing(), listing.stamp
+    del entries, names, files, listing
 
     if not changed:
         CONSOLE.print("No files to rename.", style="yellow")
         return
 
-    for old_name, new_name in changed:
-        CONSOLE.print(f"{old_name} -> {new_name}")
-
     if dry_run:
         return
 
+    undo_stack, redo_stack = load_backup(directory)
+    if existing is not None and not snapshot.is_current(directory, stamp):
+        existing = None
     try:
-        apply_renames(directory, renames)
+        apply_renames(directory, record, workers, existing=existing)
+    except RenameError as e:
+        record_operation(undo_stack, redo_stack, "apply", e.applied)
+        CONSOLE.print(str(e), style="red")
     except ValueError as e:
         CONSOLE.print(str(e), style="red")
-        return
-
-    undo_stack, redo_stack = load_backup(directory)
-    undo_stack.append(renames)
-    redo_stack.clear()
-    save_backup(directory, undo_stack, redo_stack)
-
-    CONSOLE.print(f"Renamed {len(changed)} file(s).", style="green")
+    else:
+        record_operation(undo_stack, redo_stack, "apply", record)
+        CONSOLE.print(f"Renamed {len(record)} file(s).", style="green")
 
 
-def run_undo(directory: str) -> None:
+def run_undo(directory: str, workers: int = 1) -> None:
     """Undo the last rename applied to `directory` without opening the TUI."""
     undo_stack, redo_stack = load_backup(directory)
 
@@ -53,20 +115,19 @@ def run_undo(directory: str) -> None:
         CONSOLE.print("Nothing to undo.", style="yellow")
         return
 
-    last_renames = undo_stack.pop()
-
+    reversed_renames = [(new, old) for old, new in undo_stack[-1]]
     try:
-        reversed_renames = [(new, old) for old, new in last_renames]
-        apply_renames(directory, reversed_renames)
-        redo_stack.append(last_renames)
+        apply_renames(directory, reversed_renames, workers, "undo")
+        record_operation(undo_stack, redo_stack, "undo", reversed_renames)
         CONSOLE.print("Undo successful.", style="green")
+    except RenameError as e:
+        record_operation(undo_stack, redo_stack, "undo", e.applied, e.failed)
+        CONSOLE.print(f"Undo failed: {e}", style="red")
     except Exception as e:
         CONSOLE.print(f"Undo failed: {e}", style="red")
 
-    save_backup(directory, undo_stack, redo_stack)
-
 
-def run_redo(directory: str) -> None:
+def run_redo(directory: str, workers: int = 1) -> None:
     """Redo the last undone rename in `directory` without opening the TUI."""
     undo_stack, redo_stack = load_backup(directory)
 
@@ -74,16 +135,147 @@ def run_redo(directory: str) -> None:
         CONSOLE.print("Nothing to redo.", style="yellow")
         return
 
-    renames = redo_stack.pop()
-
+    renames = redo_stack[-1]
     try:
-        apply_renames(directory, renames)
-        undo_stack.append(renames)
+        apply_renames(directory, renames, workers, "redo")
+        record_operation(undo_stack, redo_stack, "redo", renames)
         CONSOLE.print("Redo successful.", style="green")
+    except RenameError as e:
+        record_operation(undo_stack, redo_stack, "redo", e.applied, e.failed)
+        CONSOLE.print(f"Redo failed: {e}", style="red")
     except Exception as e:
         CONSOLE.print(f"Redo failed: {e}", style="red")
 
-    save_backup(directory, undo_stack, redo_stack)
+
+def run_resume(directory: str, workers: int = 1) -> None:
+    """Finish the interrupted batch of renames in `directory`, from its
+    journal, and record it in the undo/redo history as it would have been."""
+    journal = Journal.load(directory)
+    if journal is None:
+        CONSOLE.print("Nothing to resume.", style="yellow")
+        return
+
+    try:
+        applied, pending = journal.recover()
+    except OSError as e:
+        journal.close()
+        CONSOLE.print(f"Couldn't recover the interrupted rename: {e}", style="red")
+        return
+    with journal:
+        failures = rename_files(directory, pending, workers, journal)
+    failed = {pair for pair, _ in failures}
+    applied += [pair for pair in pending if pair not in failed]
+    undo_stack, redo_stack = load_backup(directory)
+    record_operation(undo_stack, redo_stack, journal.operation, applied, list(failed))
+
+    if failures:
+        CONSOLE.print(str(RenameError(applied, failures)), style="red")
+    else:
+        CONSOLE.print(f"Resumed: renamed {len(pending)} more file(s).", style="green")
+
+
+def run_rollback(directory: str, workers: int = 1) -> None:
+    """Undo the part of the interrupted batch of renames in `directory` that
+    was applied. The undo/redo history is left as it was before the batch."""
+    journal = Journal.load(directory)
+    if journal is None:
+        CONSOLE.print("Nothing to roll back.", style="yellow")
+        return
+
+    try:
+        applied, _ = journal.recover()
+    except OSError as e:
+        CONSOLE.print(f"Couldn't recover the interrupted rename: {e}", style="red")
+        return
+    finally:
+        journal.close()
+    if not applied:
+        journal.finish()
+        CONSOLE.print("Rolled back: no files had been renamed.", style="green")
+        return
+
+    # The rollback is journaled too (replacing the interrupted batch's
+    # journal), so it can itself be resumed.
+    renames = [(new, old) for old, new in applied]
+    with Journal.create(directory, "rollback", renames) as rollback:
+        failures = rename_files(directory, renames, workers, rollback)
+
+    if failures:
+        rolled_back = [pair for pair in renames if pair not in dict(failures)]
+        CONSOLE.print(str(RenameError(rolled_back, failures)), style="red")
+    else:
+        CONSOLE.print(f"Rolled back {len(renames)} file(s).", style="green")
+
+
+def run_history_stats() -> None:
+    """Print how much undo/redo history is kept, per directory."""
+    store = get_store()
+    stats = store.stats()
+
+    table = Table(box=box.SIMPLE_HEAD)
+    table.add_column("Directory", overflow="fold")
+    table.add_column("Undo", justify="right")
+    table.add_column("Redo", justify="right")
+    table.add_column("Size", justify="right")
+    table.add_column("Last change", justify="right")
+    for entry in stats:
+        table.add_row(
+            entry.directory,
+            str(entry.undo),
+            str(entry.redo),
+            _format_size(entry.size),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.newest)),
+        )
+    if stats:
+        CONSOLE.print(table)
+
+    def limit(value: int, text: str) -> str:
+        return text if value > 0 else "no limit"
+
+    operations = sum(entry.undo + entry.redo for entry in stats)
+    size = sum(entry.size for entry in stats)
+    CONSOLE.print(
+        f"{operations} operation(s) in {len(stats)} "
+        f"director{'y' if len(stats) == 1 else 'ies'}, "
+        f"{_format_size(size)} of "
+        f"{limit(store.max_bytes, _format_size(store.max_bytes))}."
+    )
+    CONSOLE.print(
+        "Keeping "
+        f"{limit(store.max_operations, f'{store.max_operations} operations')} "
+        "per directory, for "
+        f"{limit(store.max_age_days, f'{store.max_age_days} days')}.",
+        style="dim",
+    )
+    # The limits cover the history; the other files kept alongside it are
+    # shown so the directory's whole footprint is visible.
+    usage = disk_usage(
+        os.path.dirname(store.path),
+        {
+            "undo history": HISTORY_FILENAME,
+            "metadata cache": cache.CACHE_FILENAME,
+            "directory snapshots": "snapshot_",
+            "old undo files": "backup_",
+        },
+    )
+    CONSOLE.print(
+        f"On disk in {os.path.dirname(store.path)}: "
+        + (
+            ", ".join(f"{kind} {_format_size(size)}" for kind, size in usage.items())
+            or "nothing"
+        )
+        + ".",
+        style="dim",
+    )
+
+
+def _format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("b", "kb", "mb"):
+        if value < 1024:
+            return f"{size}b" if unit == "b" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}gb"
 
 
 def main() -> None:
@@ -91,16 +283,32 @@ def main() -> None:
     # Parse command-line arguments
     args = parse_args()
 
+    if args.history_stats:
+        run_history_stats()
+        return
+
     directory = args.directory
     if not os.path.isdir(directory):
         CONSOLE.print(f"Directory `{directory}` does not exist.", style="red")
         return
+    if args.no_cache:
+        cache.disable()
+        snapshot.disable()
+
+    # Headless mode: finish or roll back an interrupted rename and exit
+    if args.resume:
+        run_resume(directory, workers=args.jobs)
+        return
+    if args.rollback_incomplete:
+        run_rollback(directory, workers=args.jobs)
+        return
+
     # Headless mode: undo/redo the last rename directly and exit, no TUI
     if args.undo:
-        run_undo(directory)
+        run_undo(directory, workers=args.jobs)
         return
     if args.redo:
-        run_redo(directory)
+        run_redo(directory, workers=args.jobs)
         return
 
     pattern = args.pattern
@@ -110,6 +318,7 @@ def main() -> None:
         "regex": args.regex,
         "case_sensitive": args.case_sensitive,
         "apply_to": args.apply_to,
+        "per_directory_counters": args.per_directory_counters,
     }
 
     # Headless mode: apply/preview the rename directly and exit, no TUI
@@ -121,6 +330,8 @@ def main() -> None:
             options,
             dry_run=args.dry_run,
             exclude=args.exclude,
+            workers=args.jobs,
+            recursive=args.recursive,
         )
         return
 
@@ -131,6 +342,8 @@ def main() -> None:
         replacement=replacement,
         options=options,
         exclude=", ".join(args.exclude) if args.exclude else "",
+        jobs=args.jobs,
+        recursive=args.recursive,
     )
     app.run()
 
@@ -1,4 +1,5 @@
 from .form import Form
 from .preview import Preview
+from .rename_list import RenameList
 
-__all__ = ["Form", "Preview"]
+__all__ = ["Form", "Preview", "RenameList"]
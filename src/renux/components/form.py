@@ -2,14 +2,13 @@ import os
 from typing import TYPE_CHECKING
 
 from textual.containers import Horizontal
-from textual.suggester import SuggestFromList
 from textual.validation import Number
 from textual.widget import Widget
 from textual.widgets import Checkbox, Input, Label, Select
 
 from renux.constants import APPLY_TO_OPTIONS
 from renux.helpers.highlighter import TokenHighlighter
-from renux.helpers.suggester import TagSuggester
+from renux.helpers.suggester import FileNameSuggester, TagSuggester
 
 if TYPE_CHECKING:
     from renux.app import RenameApp
@@ -34,7 +33,7 @@ class Form(Widget):
             placeholder="Search for",
             compact=True,
             highlighter=highlighter,
-            suggester=SuggestFromList(self.app.files, case_sensitive=False),
+            suggester=FileNameSuggester(self._files, case_sensitive=False),
         )
         yield Input(
             id="replacement",
@@ -42,7 +41,7 @@ class Form(Widget):
             placeholder="Replace with",
             compact=True,
             highlighter=highlighter,
-            suggester=TagSuggester(self.app.files, case_sensitive=False),
+            suggester=TagSuggester(self._files, case_sensitive=False),
             classes="mb",
         )
         yield Input(
@@ -50,7 +49,7 @@ class Form(Widget):
             value=self.app.exclude,
             placeholder="Exclude files (comma-separated)",
             compact=True,
-            suggester=SuggestFromList(self.app.files, case_sensitive=False),
+            suggester=FileNameSuggester(self._files, case_sensitive=False),
             classes="mb",
         )
 
@@ -83,6 +82,20 @@ class Form(Widget):
             compact=True,
             classes="w-100",
         )
+        yield Checkbox(
+            "Include subdirectories",
+            id="recursive",
+            value=self.app.recursive,
+            compact=True,
+            classes="w-100",
+        )
+        yield Checkbox(
+            "Counters per directory",
+            id="per_directory_counters",
+            value=self.app.options["per_directory_counters"],
+            compact=True,
+            classes="w-100",
+        )
         yield Select(
             id="apply_to",
             value=self.app.options["apply_to"],
@@ -90,6 +103,10 @@ class Form(Widget):
             compact=True,
         )
 
+    def _files(self) -> list[str]:
+        # Read at lookup time: the list fills in while the directory is scanned.
+        return self.app.files
+
     def on_input_changed(self, event: Input.Changed) -> None:
         if event.input.id in ("pattern", "replacement", "exclude"):
             setattr(self.app, event.input.id, event.value)
@@ -97,7 +114,13 @@ class Form(Widget):
             self.app.options["count"] = int(event.value or "0")
 
     def on_checkbox_changed(self, event: Checkbox.Changed) -> None:
-        self._update_option(event.checkbox.id, event.value)
+        if event.checkbox.id == "recursive":
+            # Not a rename option: it changes which files are listed.
+            if self.app.recursive != event.value:
+                self.app.recursive = event.value
+                self.app.load_files()
+        else:
+            self._update_option(event.checkbox.id, event.value)
 
     def on_select_changed(self, event: Select.Changed) -> None:
         self._update_option(event.select.id, event.value)
@@ -1,61 +1,177 @@
+from collections import OrderedDict
 from typing import TYPE_CHECKING
 
 from rich.text import Text
+from textual.timer import Timer
 from textual.widget import Widget
-from textual.widgets import Tree
+from textual.widgets import Static
+from textual.worker import get_current_worker
 
-from renux.renamer import get_renames
+from renux.components.rename_list import RenameList
+from renux.renamer import iter_renames
 
 if TYPE_CHECKING:
     from renux.app import RenameApp
 
+# Seconds to wait after the last form change before recomputing the preview,
+# so typing a pattern doesn't start a computation per keystroke.
+DEBOUNCE = 0.15
+# How many recent form states' results to keep, so going back to one (e.g.
+# backspacing, or toggling "Use regex" off and on) doesn't recompute it.
+CACHE_SIZE = 16
+
+Rows = tuple[list[str], list[str]]
+# (pattern, replacement, options, files version)
+CacheKey = tuple[str, str, tuple, int]
+
 
 class Preview(Widget):
-    """Tree widget for live preview of renaming changes."""
+    """Live preview of renaming changes.
+
+    Renames are computed in a background thread (a Textual worker), so a big
+    directory doesn't block the UI. A newer form state cancels any
+    computation still running for an older one. Results of recent form
+    states are kept in an LRU cache, dropped whenever the file list changes.
+
+    Whether a file is toggled off or excluded only affects how its row is
+    drawn, so changing either just redraws rows (see `restyle`); the
+    renames aren't recomputed."""
 
     app: "RenameApp"
 
+    DEFAULT_CSS = """
+    Preview {
+        height: 1fr;
+    }
+    Preview > #preview-title {
+        height: 1;
+    }
+    """
+
     def compose(self):
-        tree = Tree(self.app.directory, id="preview-tree")
-        yield tree
+        yield Static(self.app.directory, id="preview-title")
+        yield RenameList(self._is_disabled, id="preview-list")
 
     def on_mount(self) -> None:
-        self._tree: Tree = self.query_one("#preview-tree", Tree)
-        self._tree.root.expand()
-        self.update_preview()
-
-    def update_preview(self) -> None:
-        # Get files and their renaming results
-
-        renames = get_renames(
-            self.app.files,
-            self.app.directory,
-            self.app.pattern,
-            self.app.replacement,
-            self.app.options,
-        )
+        self._title = self.query_one("#preview-title", Static)
+        self._list = self.query_one("#preview-list", RenameList)
+        self._timer: Timer | None = None
+        # Bumped for every new form state; results of older ones are dropped.
+        self._generation = 0
+        self._cache: OrderedDict[CacheKey, Rows] = OrderedDict()
+        self._cache_files_version = self.app.files_version
+        # The first preview is computed once the directory scan is done.
+        self._title.update(self._title_text())
 
-        theme = self.app.current_theme
-        self._tree.root.remove_children()
-        for old, new in renames:
-            disabled = old in self.app.disabled_files or self.app.is_excluded(old)
-            text = Text()
-            text.append(
-                "▢ " if disabled else "▣ ", "dim" if disabled else theme.primary
-            )
-            text.append(old, "dim" if disabled else theme.foreground)
-            if old != new:
-                text.append(" → ", "dim bold"),
-                text.append(new, ("dim" if disabled else theme.primary) + " bold"),
-
-            self._tree.root.add_leaf(text, data=old)
-
-    def on_tree_node_selected(self, event: Tree.NodeSelected) -> None:
-        if event.node is None or event.node.data is None:
+    def _is_disabled(self, file_name: str) -> bool:
+        return file_name in self.app.disabled_files or self.app.is_excluded(file_name)
+
+    def update_preview(self, debounce: bool = True) -> None:
+        """Recompute the preview for the current form state, after a short
+        pause if `debounce` (to let a burst of changes settle)."""
+        self._generation += 1
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+        cached = self._cached(self._cache_key())
+        if cached is not None:
+            self.workers.cancel_group(self, "preview")
+            self._show(*cached, self._generation)
             return
-        file_name: str = event.node.data
+
+        self._title.update(self._title_text("computing…"))
+        if debounce:
+            self._timer = self.set_timer(DEBOUNCE, self._start_computing)
+        else:
+            self._start_computing()
+
+    def _cache_key(self) -> CacheKey:
+        """The form state the preview depends on (exclusions and toggles only
+        change how rows are styled, so they aren't part of it)."""
+        app = self.app
+        return (
+            app.pattern,
+            app.replacement,
+            tuple(sorted(app.options.items())),
+            app.files_version,
+        )
+
+    def cached_rows(self) -> Rows | None:
+        """The computed `(old_names, new_names)` for the current form state
+        and file list, if they're cached (every file, including toggled-off
+        and excluded ones)."""
+        return self._cached(self._cache_key())
+
+    def _cached(self, key: CacheKey) -> Rows | None:
+        if self._cache_files_version != self.app.files_version:
+            self._cache.clear()
+            self._cache_files_version = self.app.files_version
+        rows = self._cache.get(key)
+        if rows is not None:
+            self._cache.move_to_end(key)
+        return rows
+
+    def _start_computing(self) -> None:
+        self._timer = None
+        app = self.app
+        generation = self._generation
+        key = self._cache_key()
+        # Snapshot the form state; the worker must not read the live app.
+        args = (
+            list(app.files),  # it grows while the directory is scanned
+            app.directory,
+            app.pattern,
+            app.replacement,
+            dict(app.options),
+            app.jobs,
+        )
+        entries = app.entries
+
+        def compute() -> None:
+            worker = get_current_worker()
+            old: list[str] = []
+            new: list[str] = []
+            for old_name, new_name in iter_renames(*args, entries=entries):
+                if worker.is_cancelled:
+                    return
+                old.append(old_name)
+                new.append(new_name)
+            if not worker.is_cancelled:
+                app.call_from_thread(self._store, key, (old, new), generation)
+
+        # `exclusive` cancels the worker for the previous form state.
+        self.run_worker(compute, group="preview", exclusive=True, thread=True)
+
+    def _store(self, key: CacheKey, rows: Rows, generation: int) -> None:
+        if key[-1] == self.app.files_version:
+            self._cache[key] = rows
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        self._show(*rows, generation)
+
+    def _show(self, old: list[str], new: list[str], generation: int) -> None:
+        if generation != self._generation:
+            return  # superseded by a newer form state
+        self._title.update(self._title_text())
+        self._list.set_rows(old, new)
+
+    def _title_text(self, status: str | None = None) -> Text:
+        if self.app.scanning:
+            status = f"scanning… {len(self.app.files)} files"
+        if status is None:
+            return Text(self.app.directory)
+        return Text.assemble(self.app.directory, (f"  {status}", "dim italic"))
+
+    def on_rename_list_toggled(self, event: RenameList.Toggled) -> None:
+        file_name = event.file_name
         if file_name in self.app.disabled_files:
-            self.app.disabled_files.remove(file_name)
+            self.app.disabled_files.discard(file_name)
         else:
-            self.app.disabled_files.append(file_name)
-        self.update_preview()
+            self.app.disabled_files.add(file_name)
+        self._list.refresh_row(event.index)
+
+    def restyle(self) -> None:
+        """Redraw the rows in view after the toggled or excluded files changed,
+        keeping the current rename results."""
+        self._list.refresh()
@@ -0,0 +1,153 @@
+from typing import TYPE_CHECKING, Callable, ClassVar
+
+from rich.text import Text
+from textual.binding import Binding, BindingType
+from textual.events import Click
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+if TYPE_CHECKING:
+    from renux.app import RenameApp
+
+
+class RenameList(ScrollView, can_focus=True):
+    """Scrollable `old → new` list that only renders the rows in view.
+
+    Rows are kept as two plain lists of names; a row's styled text is built
+    when it scrolls into view, so memory and redraw cost don't grow with the
+    number of files."""
+
+    app: "RenameApp"
+
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding("up", "cursor_up", "Up", show=False),
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+        Binding("enter,space", "toggle_row", "Toggle", show=False),
+    ]
+
+    COMPONENT_CLASSES = {"rename-list--cursor"}
+
+    DEFAULT_CSS = """
+    RenameList {
+        background: $background;
+    }
+    RenameList > .rename-list--cursor {
+        background: $boost;
+    }
+    RenameList:focus > .rename-list--cursor {
+        background: $primary 30%;
+    }
+    """
+
+    cursor = reactive(0, always_update=True)
+
+    class Toggled(Message):
+        """Posted when the user toggles the file in row `index` on or off."""
+
+        def __init__(self, index: int, file_name: str) -> None:
+            super().__init__()
+            self.index = index
+            self.file_name = file_name
+
+    def __init__(
+        self, is_disabled: Callable[[str], bool], *, id: str | None = None
+    ) -> None:
+        super().__init__(id=id)
+        self._is_disabled = is_disabled
+        self._old: list[str] = []
+        self._new: list[str] = []
+
+    def set_rows(self, old: list[str], new: list[str]) -> None:
+        """Replace the rows with `old[i] → new[i]` pairs."""
+        self._old, self._new = old, new
+        width = max(
+            (len(o) + len(n) + 5 for o, n in zip(old, new)),
+            default=0,
+        )
+        self.virtual_size = Size(width, len(old))
+        self.cursor = min(self.cursor, max(len(old) - 1, 0))
+        self.refresh()
+
+    @property
+    def row_count(self) -> int:
+        return len(self._old)
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        if index >= len(self._old):
+            return Strip.blank(width, self.rich_style)
+
+        style = self.rich_style
+        if index == self.cursor:
+            style += self.get_component_rich_style("rename-list--cursor")
+        text = self._row_text(index)
+        text.style = style
+        strip = Strip(list(text.render(self.app.console, end="")), text.cell_len)
+        return strip.crop_extend(scroll_x, scroll_x + width, style)
+
+    def _row_text(self, index: int) -> Text:
+        old, new = self._old[index], self._new[index]
+        disabled = self._is_disabled(old)
+        theme = self.app.current_theme
+        text = Text()
+        text.append("▢ " if disabled else "▣ ", "dim" if disabled else theme.primary)
+        text.append(old, "dim" if disabled else theme.foreground)
+        if old != new:
+            text.append(" → ", "dim bold")
+            text.append(new, ("dim" if disabled else theme.primary) + " bold")
+        return text
+
+    def refresh_row(self, index: int) -> None:
+        """Redraw row `index` (e.g. after its file was toggled)."""
+        self.refresh_lines(index)
+
+    def row_text(self, index: int) -> str:
+        """The plain text of row `index`."""
+        return self._row_text(index).plain
+
+    def watch_cursor(self, cursor: int) -> None:
+        self.scroll_to_region(
+            Region(0, cursor, 1, 1), animate=False, force=True, immediate=True
+        )
+        self.refresh()
+
+    def _move(self, delta: int) -> None:
+        if self._old:
+            self.cursor = max(0, min(self.cursor + delta, len(self._old) - 1))
+
+    def action_cursor_up(self) -> None:
+        self._move(-1)
+
+    def action_cursor_down(self) -> None:
+        self._move(1)
+
+    def action_page_up(self) -> None:
+        self._move(-max(self.size.height - 1, 1))
+
+    def action_page_down(self) -> None:
+        self._move(max(self.size.height - 1, 1))
+
+    def action_first(self) -> None:
+        self._move(-self.cursor)
+
+    def action_last(self) -> None:
+        self._move(len(self._old))
+
+    def action_toggle_row(self) -> None:
+        if self.cursor < len(self._old):
+            self.post_message(self.Toggled(self.cursor, self._old[self.cursor]))
+
+    def on_click(self, event: Click) -> None:
+        index = self.scroll_offset.y + event.y
+        if 0 <= index < len(self._old):
+            self.cursor = index
+            self.post_message(self.Toggled(index, self._old[index]))
@@ -3,6 +3,7 @@ DEFAULT_OPTIONS: dict[str, str | int | bool] = {
     "regex": True,
     "case_sensitive": False,
     "apply_to": "name",
+    "per_directory_counters": False,
 }
 
 APPLY_TO_LABELS = {
@@ -0,0 +1,199 @@
+"""Carry out a batch of renames within one directory.
+
+The directory is opened once and every rename is made relative to that file
+descriptor (`src_dir_fd`/`dst_dir_fd`), so the OS doesn't resolve the full
+path again for each file. Where the platform doesn't support that (e.g.
+Windows), joined paths are used instead.
+
+Renames can run on a thread pool, which helps most on network filesystems
+where each rename is a round trip. A rename whose target is another rename's
+source (a chain, e.g. `b → c` then `a → b`) waits for that one to finish,
+and cycles (e.g. swapping `a` and `b`) go through a temporary name.
+
+Names may be paths relative to the directory (in a recursive run); each
+rename stays within its subdirectory, so a cycle's temporary name is placed
+there too.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    from renux.journal import Journal
+
+Pair = tuple[str, str]
+
+# Whether this platform's `os.rename` takes `src_dir_fd`/`dst_dir_fd`.
+_RENAME_DIR_FD = os.rename in os.supports_dir_fd
+
+Failure = tuple[Pair, OSError]
+
+
+def schedule(renames: Iterable[Pair]) -> tuple[list[list[Pair]], list[list[Pair]]]:
+    """Split `renames` into `(chains, cycles)`, in linear time.
+
+    With every target distinct, the renames form independent chains and
+    cycles. A rename `x → y` has to wait until the rename moving `y` away is
+    done, so each chain is returned in the order it can run in (the first
+    rename's target is free). Cycles (e.g. `a → b`, `b → a`) can't run in
+    any order without a temporary name; each is returned in cycle order.
+
+    Raises ValueError if two renames have the same target."""
+    pairs = [(old, new) for old, new in renames if old != new]
+    by_source = {pair[0]: pair for pair in pairs}
+    targets: set[str] = set()
+    for _, new in pairs:
+        if new in targets:
+            raise ValueError("There will be duplicate files. Try again.")
+        targets.add(new)
+
+    # Chains start at a rename whose source nothing else is renamed to.
+    done: set[str] = set()
+    chains = []
+    for pair in pairs:
+        if pair[0] in targets:
+            continue
+        chain = []
+        link: Pair | None = pair
+        while link is not None:
+            chain.append(link)
+            done.add(link[0])
+            link = by_source.get(link[1])
+        chain.reverse()
+        chains.append(chain)
+
+    # Whatever's left is in a cycle.
+    cycles = []
+    for pair in pairs:
+        if pair[0] in done:
+            continue
+        cycle = []
+        link = pair
+        while link[0] not in done:
+            cycle.append(link)
+            done.add(link[0])
+            link = by_source[link[1]]
+        cycles.append(cycle)
+
+    return chains, cycles
+
+
+def cycle_steps(cycle: list[Pair], temp: str) -> list[Pair]:
+    """The renames that carry out `cycle` (in cycle order) via `temp`.
+
+    The first file is parked under `temp`; the rest of the cycle is then a
+    chain ending in the freed name, followed by the parked file moving to
+    its target. Like a chain, the steps done at any point are a prefix."""
+    first_old, first_new = cycle[0]
+    return [(first_old, temp), *reversed(cycle[1:]), (temp, first_new)]
+
+
+class RenameExecutor:
+    """Renames files within `directory`, on up to `workers` threads.
+
+    If a `journal` is given, each completed rename is recorded in it, and
+    cycles use its temporary names (see `renux.journal`).
+
+    Use as a context manager, so the directory descriptor is closed."""
+
+    def __init__(
+        self, directory: str, workers: int = 1, journal: Journal | None = None
+    ) -> None:
+        self.directory = directory
+        self.workers = workers
+        self.journal = journal
+        self._dir_fd: int | None = None
+        if _RENAME_DIR_FD:
+            self._dir_fd = os.open(
+                directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)
+            )
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """Rename one file, raising `OSError` if that fails."""
+        if self._dir_fd is not None:
+            os.rename(
+                old_name, new_name, src_dir_fd=self._dir_fd, dst_dir_fd=self._dir_fd
+            )
+        else:
+            os.rename(
+                os.path.join(self.directory, old_name),
+                os.path.join(self.directory, new_name),
+            )
+
+    def run(self, renames: Iterable[Pair]) -> list[Failure]:
+        """Apply `renames` (see `schedule`), returning the ones that failed
+        with their errors.
+
+        Chains and cycles are independent of each other, so with `workers`
+        > 1 they run in parallel. If a rename in a chain fails, the renames
+        after it are skipped (their targets are still taken). A cycle is
+        run through a temporary name; if any step fails, the steps before
+        it are undone, leaving the cycle's files as they were."""
+        chains, cycles = schedule(renames)
+        tasks: list[Callable[[], list[Failure]]] = [
+            *(partial(self._run_chain, chain) for chain in chains),
+            *(partial(self._run_cycle, cycle) for cycle in cycles),
+        ]
+        if self.workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(lambda task: task(), tasks))
+        else:
+            results = [task() for task in tasks]
+        return [failure for result in results for failure in result]
+
+    def _run_chain(self, chain: list[Pair]) -> list[Failure]:
+        for index, pair in enumerate(chain):
+            try:
+                self.rename(*pair)
+            except OSError as e:
+                blocked = [(p, _target_taken(p)) for p in chain[index + 1 :]]
+                return [(pair, e), *blocked]
+            if self.journal is not None:
+                self.journal.done(pair)
+        return []
+
+    def _run_cycle(self, cycle: list[Pair]) -> list[Failure]:
+        if self.journal is not None:
+            temp = self.journal.temp_name(cycle[0])
+        else:
+            temp = os.path.join(
+                os.path.dirname(cycle[0][0]), f".renux-{uuid.uuid4().hex}.tmp"
+            )
+        steps = cycle_steps(cycle, temp)
+        for index, step in enumerate(steps):
+            try:
+                self.rename(*step)
+            except OSError as e:
+                for old, new in reversed(steps[:index]):
+                    try:
+                        self.rename(new, old)
+                    except OSError:
+                        pass  # nothing more to do; the error below stands
+                return [(pair, e) for pair in cycle]
+        if self.journal is not None:
+            for pair in cycle:
+                self.journal.done(pair)
+        return []
+
+    def close(self) -> None:
+        if self._dir_fd is not None:
+            os.close(self._dir_fd)
+            self._dir_fd = None
+
+    def __enter__(self) -> RenameExecutor:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def _target_taken(pair: Pair) -> OSError:
+    """The error for a chained rename skipped because its target is still
+    taken by a file that couldn't be renamed."""
+    return FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), pair[1])
@@ -0,0 +1,238 @@
+"""Per-file metadata shared by every placeholder resolved for that file.
+
+Placeholders declare which extractor family they read from (`stat`, `image`,
+`exif`, `video`). A `FileFacts` runs each family's extractor at most once per
+file, the first time a placeholder asks for it, so a template like
+`{width}x{height}_{latitude}_{longitude}` reads the image header once for its
+dimensions and the EXIF block (camera, capture date and GPS alike) once,
+rather than once per placeholder.
+
+Extractors return plain dicts of primitive values. A field that the file
+doesn't have is `None`; a file the extractor can't read at all raises, and
+that error is remembered and re-raised for every later lookup.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Iterable
+
+from renux.cache import Key, get_cache
+from renux.helpers.exif import read_exif
+from renux.helpers.files import Entry
+from renux.helpers.imagesize import image_size
+from renux.helpers.videoinfo import video_info
+
+STAT = "stat"
+IMAGE = "image"
+EXIF = "exif"
+VIDEO = "video"
+
+Facts = dict[str, Any]
+
+
+def _extract_stat(path: str) -> Facts:
+    return _stat_facts(os.stat(path))
+
+
+def _stat_facts(st: os.stat_result) -> Facts:
+    return {
+        "size": st.st_size,
+        "ctime": st.st_ctime,
+        "mtime": st.st_mtime,
+        "mtime_ns": st.st_mtime_ns,
+        "dev": st.st_dev,
+        "ino": st.st_ino,
+    }
+
+
+def _extract_image(path: str) -> Facts:
+    size = image_size(path)
+    if size is None:
+        # Not a format the header probe knows; let Pillow decode it.
+        from PIL import Image
+
+        with Image.open(path) as img:
+            size = img.size
+    width, height = size
+    return {"width": width, "height": height}
+
+
+_EXIF_MAKE = 271
+_EXIF_MODEL = 272
+_EXIF_SUB_IFD = 0x8769
+_EXIF_DATETIME_ORIGINAL = 36867
+_EXIF_GPS_IFD = 0x8825
+_GPS_LAT_REF = 1
+_GPS_LAT = 2
+_GPS_LON_REF = 3
+_GPS_LON = 4
+_GPS_ALT_REF = 5
+_GPS_ALT = 6
+
+
+def _text(value: Any) -> str | None:
+    return str(value).strip() if value else None
+
+
+def _dms(value: Any) -> tuple[float, float, float] | None:
+    if not value:
+        return None
+    degrees, minutes, seconds = value
+    return float(degrees), float(minutes), float(seconds)
+
+
+def _extract_exif(path: str) -> Facts:
+    fields = read_exif(path)
+    if fields is not None:
+        return fields
+
+    # Not a container the EXIF reader knows; let Pillow find the EXIF block.
+    from PIL import Image
+
+    with Image.open(path) as img:
+        exif = img.getexif()
+        datetime_original = exif.get_ifd(_EXIF_SUB_IFD).get(_EXIF_DATETIME_ORIGINAL)
+        gps = exif.get_ifd(_EXIF_GPS_IFD)
+    alt = gps.get(_GPS_ALT)
+    alt_ref = gps.get(_GPS_ALT_REF, 0)
+    return {
+        "make": _text(exif.get(_EXIF_MAKE)),
+        "model": _text(exif.get(_EXIF_MODEL)),
+        "datetime_original": _text(datetime_original),
+        "lat": _dms(gps.get(_GPS_LAT)),
+        "lat_ref": gps.get(_GPS_LAT_REF) or None,
+        "lon": _dms(gps.get(_GPS_LON)),
+        "lon_ref": gps.get(_GPS_LON_REF) or None,
+        "alt": None if alt is None else float(alt),
+        "alt_ref": 1 if alt_ref == 1 or alt_ref == b"\x01" else 0,
+    }
+
+
+def _extract_video(path: str) -> Facts:
+    info = video_info(path)
+    if info is not None:
+        return info
+
+    # Not a container the video probe knows; let hachoir parse it.
+    from hachoir.metadata import extractMetadata
+    from hachoir.parser import createParser
+
+    parser = createParser(path)
+    if not parser:
+        raise ValueError(f"Unable to parse video file: {path}")
+    with parser:
+        metadata = extractMetadata(parser)
+    if not metadata:
+        raise ValueError(f"No metadata found for video file: {path}")
+
+    def get(key: str) -> Any:
+        return metadata.get(key) if metadata.has(key) else None
+
+    duration = get("duration")
+    frame_rate = get("frame_rate")
+    return {
+        "width": get("width"),
+        "height": get("height"),
+        "frame_rate": None if frame_rate is None else float(frame_rate),
+        "duration": None if duration is None else duration.total_seconds(),
+    }
+
+
+EXTRACTORS: dict[str, Callable[[str], Facts]] = {
+    STAT: _extract_stat,
+    IMAGE: _extract_image,
+    EXIF: _extract_exif,
+    VIDEO: _extract_video,
+}
+
+
+def _cacheable(error: Exception) -> bool:
+    """Whether a failed extraction says something lasting about the file
+    (e.g. "not an image") rather than about this attempt to read it."""
+    return not (isinstance(error, OSError) and error.errno is not None)
+
+
+class FileFacts:
+    """Lazily extracted metadata for one file, at most one extraction per
+    family. Results other than `stat` go through the persistent metadata
+    cache (`renux.cache`) when it's enabled.
+
+    If the file's `os.DirEntry` (or another `Entry`) from a directory scan is
+    passed as `entry`, `stat` is taken from it, once. That's free where the
+    entry already has it (on Windows); on POSIX, a `DirEntry` or a snapshot's
+    entry still makes the stat call (see `scan_files`)."""
+
+    def __init__(self, path: str, entry: Entry | None = None) -> None:
+        self.path = path
+        self._entry = entry
+        self._results: dict[str, Facts | Exception] = {}
+
+    def get(self, family: str) -> Facts:
+        """Return the facts of `family`, extracting them on first use."""
+        if family not in self._results:
+            self._results[family] = self._extract(family)
+        result = self._results[family]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def prefetch(self, families: Iterable[str]) -> None:
+        """Extract `families` now, so later lookups don't touch the disk.
+        Errors are kept for those lookups to raise."""
+        for family in families:
+            if family not in self._results:
+                self._results[family] = self._extract(family)
+
+    def _extract(self, family: str) -> Facts | Exception:
+        if family == STAT and self._entry is not None:
+            try:
+                return _stat_facts(self._entry.stat())
+            except Exception as e:
+                return e
+
+        key = self._cache_key() if family != STAT else None
+        cache = get_cache() if key is not None else None
+        if cache is not None and key is not None:
+            hit = cache.get(key, family)
+            if hit is not None:
+                value, error = hit
+                return ValueError(error) if error is not None else value
+
+        try:
+            result: Facts | Exception = EXTRACTORS[family](self.path)
+        except Exception as e:
+            result = e
+
+        if cache is not None and key is not None:
+            if not isinstance(result, Exception):
+                cache.put(key, family, value=result)
+            elif _cacheable(result):
+                cache.put(key, family, error=str(result) or type(result).__name__)
+        return result
+
+    def _cache_key(self) -> Key | None:
+        """Identify this version of the file: (device, inode, size, mtime_ns)."""
+        try:
+            st = self.stat
+        except Exception:
+            return None
+        if not st["ino"]:
+            return None  # no stable file ID on this filesystem
+        return st["dev"], st["ino"], st["size"], st["mtime_ns"]
+
+    @property
+    def stat(self) -> Facts:
+        return self.get(STAT)
+
+    @property
+    def image(self) -> Facts:
+        return self.get(IMAGE)
+
+    @property
+    def exif(self) -> Facts:
+        return self.get(EXIF)
+
+    @property
+    def video(self) -> Facts:
+        return self.get(VIDEO)
@@ -0,0 +1,308 @@
+"""Read the EXIF fields renux uses straight from the file.
+
+Finds the EXIF TIFF structure inside JPEG (APP1), PNG (eXIf), WebP (EXIF),
+HEIC/AVIF (the `Exif` item of the `meta` box) and TIFF-based files (TIFF and
+most camera RAW formats, e.g. CR2, NEF, ARW, DNG), then walks only IFD0, the
+Exif IFD and the GPS IFD. Everything is returned from that one parse, which
+usually only touches the first few KB of the file.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any
+
+from renux.helpers.imagesize import HEAD_SIZE, HeadReader, iter_boxes
+
+_MAKE = 271
+_MODEL = 272
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+_DATETIME_ORIGINAL = 36867
+_GPS_LAT_REF = 1
+_GPS_LAT = 2
+_GPS_LON_REF = 3
+_GPS_LON = 4
+_GPS_ALT_REF = 5
+_GPS_ALT = 6
+
+# Longest value worth reading; anything longer is corrupt or not a field we use.
+_MAX_VALUES = 1024
+
+# TIFF field type -> (struct code, size in bytes)
+_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+    7: ("s", 1),  # UNDEFINED
+    9: ("i", 4),  # SLONG
+    10: ("ii", 8),  # SRATIONAL
+    13: ("I", 4),  # IFD (an offset, as some RAW and HEIF writers store it)
+}
+
+
+class _Tiff:
+    """An EXIF TIFF structure starting at `base` within the file."""
+
+    def __init__(self, r: HeadReader, base: int) -> None:
+        self._r = r
+        self._base = base
+        order = r.read(base, 2)
+        if order == b"II":
+            self._endian = "<"
+        elif order == b"MM":
+            self._endian = ">"
+        else:
+            raise ValueError("Not a TIFF structure")
+
+    def _unpack(self, fmt: str, offset: int) -> tuple:
+        data = self._r.read(self._base + offset, struct.calcsize(self._endian + fmt))
+        return struct.unpack(self._endian + fmt, data)
+
+    def first_ifd(self) -> int:
+        return self._unpack("I", 4)[0]
+
+    def ifd(self, offset: int, tags: set[int]) -> dict[int, Any]:
+        """Read the values of `tags` from the IFD at `offset`."""
+        (count,) = self._unpack("H", offset)
+        values: dict[int, Any] = {}
+        for i in range(count):
+            tag, type_, n = self._unpack("HHI", offset + 2 + i * 12)
+            if tag not in tags or type_ not in _TYPES or n > _MAX_VALUES:
+                continue
+            code, size = _TYPES[type_]
+            value_offset = offset + 2 + i * 12 + 8
+            if size * n > 4:
+                (value_offset,) = self._unpack("I", value_offset)
+            values[tag] = self._value(type_, code, size, n, value_offset)
+        return values
+
+    def _value(self, type_: int, code: str, size: int, n: int, offset: int) -> Any:
+        if code == "s":
+            raw = self._r.read(self._base + offset, n)
+            if type_ == 7:
+                return raw
+            return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+        items = self._unpack(code * n, offset)
+        if type_ in (5, 10):
+            items = tuple(
+                num / den if den else 0.0 for num, den in zip(items[::2], items[1::2])
+            )
+        return items[0] if n == 1 else items
+
+
+def _jpeg_base(r: HeadReader) -> int | None:
+    pos = 2
+    while True:
+        header = r.read(pos, 10)
+        if len(header) < 4 or header[0] != 0xFF:
+            return None
+        marker = header[1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan
+            return None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", header[2:4])
+        if marker == 0xE1 and header[4:10] == b"Exif\0\0":
+            return pos + 10
+        pos += 2 + length
+
+
+def _png_base(r: HeadReader) -> int | None:
+    pos = 8
+    while True:
+        header = r.read(pos, 8)
+        if len(header) < 8:
+            return None
+        length, chunk = struct.unpack(">I4s", header)
+        if chunk == b"eXIf":
+            return pos + 8
+        if chunk in (b"IDAT", b"IEND"):
+            return None
+        pos += 12 + length
+
+
+def _webp_base(r: HeadReader) -> int | None:
+    pos = 12
+    while True:
+        header = r.read(pos, 14)
+        if len(header) < 8:
+            return None
+        chunk, length = struct.unpack("<4sI", header[:8])
+        if chunk == b"EXIF":
+            # Some writers keep JPEG's "Exif\0\0" prefix.
+            return pos + 14 if header[8:14] == b"Exif\0\0" else pos + 8
+        pos += 8 + length + (length & 1)
+
+
+def _heif_base(r: HeadReader) -> int | None:
+    meta = next(
+        ((s, e) for t, s, e in iter_boxes(r, 0, 1 << 62) if t == b"meta"),
+        None,
+    )
+    if meta is None:
+        return None
+    children = {t: (s, e) for t, s, e in iter_boxes(r, meta[0] + 4, meta[1])}
+    if b"iinf" not in children or b"iloc" not in children:
+        return None
+
+    # Find the item ID of the `Exif` item.
+    start, end = children[b"iinf"]
+    version = r.read(start, 1)[0]
+    entries_start = start + (8 if version else 6)
+    exif_id = None
+    for box_type, s, _ in iter_boxes(r, entries_start, end):
+        if box_type != b"infe":
+            continue
+        infe_version = r.read(s, 1)[0]
+        if infe_version < 2:
+            continue
+        if infe_version == 2:
+            item_id, _, item_type = struct.unpack(">HH4s", r.read(s + 4, 8))
+        else:
+            item_id, _, item_type = struct.unpack(">IH4s", r.read(s + 4, 10))
+        if item_type == b"Exif":
+            exif_id = item_id
+            break
+    if exif_id is None:
+        return None
+
+    # Find where that item's data starts.
+    start, _ = children[b"iloc"]
+    version = r.read(start, 1)[0]
+    sizes = r.read(start + 4, 2)
+    offset_size, length_size = sizes[0] >> 4, sizes[0] & 0xF
+    base_offset_size = sizes[1] >> 4
+    index_size = sizes[1] & 0xF if version in (1, 2) else 0
+    pos = start + 6
+
+    def read_int(size: int) -> int:
+        nonlocal pos
+        value = int.from_bytes(r.read(pos, size), "big") if size else 0
+        pos += size
+        return value
+
+    item_count = read_int(4 if version == 2 else 2)
+    for _ in range(item_count):
+        item_id = read_int(4 if version == 2 else 2)
+        if version in (1, 2):
+            read_int(2)  # construction_method
+        read_int(2)  # data_reference_index
+        base_offset = read_int(base_offset_size)
+        extent_count = read_int(2)
+        extents = []
+        for _ in range(extent_count):
+            read_int(index_size)
+            extent_offset = read_int(offset_size)
+            read_int(length_size)
+            extents.append(extent_offset)
+        if item_id == exif_id and extents:
+            data = base_offset + extents[0]
+            # The item starts with the offset from here to the TIFF header.
+            (tiff_offset,) = struct.unpack(">I", r.read(data, 4))
+            return data + 4 + tiff_offset
+    return None
+
+
+def _find_tiff(r: HeadReader) -> int | None:
+    """Return the file offset of the EXIF TIFF header, or None if there is
+    none. Raises ValueError for containers this module doesn't know."""
+    head = r.head
+    if head[:2] == b"\xff\xd8":
+        return _jpeg_base(r)
+    if head[:4] in (b"II*\x00", b"MM\x00*") or head[:4] in (b"IIRO", b"IIU\x00"):
+        return 0  # TIFF-based RAW: the file itself is the TIFF structure
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _png_base(r)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp_base(r)
+    if head[4:8] == b"ftyp":
+        return _heif_base(r)
+    raise ValueError("Unsupported EXIF container")
+
+
+def _empty() -> dict[str, Any]:
+    return {
+        "make": None,
+        "model": None,
+        "datetime_original": None,
+        "lat": None,
+        "lat_ref": None,
+        "lon": None,
+        "lon_ref": None,
+        "alt": None,
+        "alt_ref": 0,
+    }
+
+
+def _text(value: Any) -> str | None:
+    return (value.strip() or None) if isinstance(value, str) else None
+
+
+def _offset(value: Any) -> int | None:
+    """An IFD pointer's value, if it's a single offset; a malformed file may
+    store several."""
+    return value if isinstance(value, int) else None
+
+
+def _dms(value: Any) -> tuple[float, float, float] | None:
+    return value if isinstance(value, tuple) and len(value) == 3 else None
+
+
+def read_exif(path: str) -> dict[str, Any] | None:
+    """Return the camera, capture-date and GPS fields of the file at `path`.
+
+    Missing fields are None. Returns None if the file's format isn't one this
+    module can look inside, so callers can fall back to a full decoder."""
+    with open(path, "rb", buffering=0) as f:
+        head = f.read(HEAD_SIZE)
+        r = HeadReader(f, head)
+        try:
+            base = _find_tiff(r)
+        except ValueError:
+            return None
+        except (struct.error, IndexError):
+            base = None
+
+        fields = _empty()
+        if base is None:
+            return fields
+
+        try:
+            tiff = _Tiff(r, base)
+            ifd0 = tiff.ifd(tiff.first_ifd(), {_MAKE, _MODEL, _EXIF_IFD, _GPS_IFD})
+            exif_offset = _offset(ifd0.get(_EXIF_IFD))
+            exif = (
+                tiff.ifd(exif_offset, {_DATETIME_ORIGINAL})
+                if exif_offset is not None
+                else {}
+            )
+            gps_offset = _offset(ifd0.get(_GPS_IFD))
+            gps = (
+                tiff.ifd(gps_offset, set(range(_GPS_LAT_REF, _GPS_ALT + 1)))
+                if gps_offset is not None
+                else {}
+            )
+        except (struct.error, ValueError, IndexError):
+            return fields
+
+    alt = gps.get(_GPS_ALT)
+    alt_ref = gps.get(_GPS_ALT_REF, 0)
+    fields.update(
+        make=_text(ifd0.get(_MAKE)),
+        model=_text(ifd0.get(_MODEL)),
+        datetime_original=_text(exif.get(_DATETIME_ORIGINAL)),
+        lat=_dms(gps.get(_GPS_LAT)),
+        lat_ref=_text(gps.get(_GPS_LAT_REF)),
+        lon=_dms(gps.get(_GPS_LON)),
+        lon_ref=_text(gps.get(_GPS_LON_REF)),
+        alt=float(alt) if isinstance(alt, (int, float)) else None,
+        alt_ref=1 if alt_ref in (1, b"\x01") else 0,
+    )
+    return fields
@@ -1,39 +1,242 @@
 import fnmatch
+import functools
 import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, Protocol
 
 
-def get_files(directory: str) -> list[str]:
-    """Get all files in the directory, sorted alphabetically (case-insensitive)."""
-    return sorted(
-        [
-            entry.name
-            for entry in os.scandir(directory)
-            if entry.is_file() and entry.name
-        ],
-        key=lambda name: name.lower(),
+class Entry(Protocol):
+    """What planning needs of a scanned file: an `os.DirEntry`, or a stand-in
+    for one (see `renux.snapshot`)."""
+
+    @property
+    def name(self) -> str: ...
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result: ...
+
+
+def scan_files(directory: str) -> dict[str, os.DirEntry[str]]:
+    """Get all files in the directory, sorted alphabetically (case-insensitive),
+    as a table of name -> `os.DirEntry`.
+
+    Stat-based placeholders (`{size}`, `{modified_at}`, ...) take each
+    file's stat result from its entry (see `renux.facts.FileFacts`). On
+    Windows, the listing comes with it, so no file is looked up again; on
+    POSIX only the file type does, and `DirEntry.stat()` makes one stat call
+    per file, like `os.stat` would. (So do entries from a saved snapshot,
+    see `renux.snapshot`.)"""
+    with os.scandir(directory) as it:
+        return sort_entries(entry for entry in it if entry.is_file() and entry.name)
+
+
+def scan_directory(directory: str) -> tuple[dict[str, os.DirEntry[str]], set[str]]:
+    """`scan_files`, along with the names in the directory that aren't files
+    (subdirectories, broken links, ...), from the same listing."""
+    files: list[os.DirEntry[str]] = []
+    others: set[str] = set()
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name:
+                files.append(entry)
+            else:
+                others.add(entry.name)
+    return sort_entries(files), others
+
+
+def sort_entries(
+    entries: Iterable[os.DirEntry[str]],
+) -> dict[str, os.DirEntry[str]]:
+    """Sort `entries` as `scan_files` does, into a table of name -> entry."""
+    ordered = sorted(entries, key=lambda entry: entry.name.lower())
+    return {entry.name: entry for entry in ordered}
+
+
+def scan_batches(
+    directory: str, batch_size: int = 1000, interval: float = 0.1
+) -> Iterator[list[os.DirEntry[str]]]:
+    """Yield the directory's files as `os.scandir` finds them (unsorted), in
+    batches of `batch_size`, or of whatever was found within `interval`
+    seconds if that's fewer, so a slow listing still shows progress."""
+    batch: list[os.DirEntry[str]] = []
+    started = time.monotonic()
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name:
+                batch.append(entry)
+            if batch and (
+                len(batch) >= batch_size or time.monotonic() - started >= interval
+            ):
+                yield batch
+                batch = []
+                started = time.monotonic()
+    if batch:
+        yield batch
+
+
+def walk_batches(
+    directory: str, workers: int = 8
+) -> Iterator[list[tuple[str, os.DirEntry[str]]]]:
+    """Yield the files in `directory` and its subdirectories as `(path,
+    entry)` pairs, `path` relative to `directory`, one batch per directory
+    (unsorted, and in no particular directory order).
+
+    Up to `workers` directories are listed at once, which helps most on
+    network filesystems where each listing is a round trip. Symlinked
+    directories aren't followed, and subdirectories that can't be listed
+    are skipped; an error listing `directory` itself is raised."""
+
+    def list_dir(
+        subdir: str,
+    ) -> tuple[list[tuple[str, os.DirEntry[str]]], list[str]]:
+        files, subdirs = [], []
+        with os.scandir(os.path.join(directory, subdir)) as it:
+            for entry in it:
+                path = os.path.join(subdir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(path)
+                elif entry.is_file() and entry.name:
+                    files.append((path, entry))
+        return files, subdirs
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        root = pool.submit(list_dir, "")
+        pending: set[Future] = {root}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    files, subdirs = future.result()
+                except OSError:
+                    if future is root:
+                        raise
+                    continue
+                pending.update(pool.submit(list_dir, path) for path in subdirs)
+                if files:
+                    yield files
+
+
+def walk_files(directory: str, workers: int = 8) -> dict[str, os.DirEntry[str]]:
+    """Like `scan_files`, but including subdirectories (see `walk_batches`):
+    a table of relative path -> entry, each directory's files together."""
+    return sort_paths(
+        pair for batch in walk_batches(directory, workers) for pair in batch
     )
 
 
-def is_excluded(file_name: str, patterns: list[str]) -> bool:
-    """Check whether `file_name` matches any of the given exclude patterns
-    (exact names or globs, e.g. `README.md`, `*.log`).
+def sort_paths(
+    pairs: Iterable[tuple[str, os.DirEntry[str]]],
+) -> dict[str, os.DirEntry[str]]:
+    """Sort `(path, entry)` pairs into a table of path -> entry, by directory
+    and then by name (case-insensitive). For paths without a directory, this
+    is the order `scan_files` uses."""
+    return dict(sorted(pairs, key=lambda pair: _path_key(pair[0])))
+
+
+def _path_key(path: str) -> tuple[str, str, str]:
+    # The exact directory breaks ties, so directories whose names differ only
+    # in case don't get their files interleaved.
+    subdir, name = os.path.split(path)
+    return subdir.lower(), subdir, name.lower()
+
+
+def list_existing(directory: str, paths: Iterable[str]) -> set[str]:
+    """The names in each directory that `paths` (relative to `directory`)
+    are in, as paths relative to `directory`, listing each directory once.
+    Subdirectories that can't be listed are left out."""
+    existing: set[str] = set()
+    for subdir in {os.path.dirname(path) for path in paths}:
+        try:
+            names = os.listdir(os.path.join(directory, subdir))
+        except OSError:
+            if not subdir:
+                raise
+            continue
+        existing.update(os.path.join(subdir, name) for name in names)
+    return existing
+
+
+def get_files(directory: str) -> list[str]:
+    """Get all files in the directory, sorted alphabetically (case-insensitive).
+    Unlike `scan_files`, only the names are kept."""
+    with os.scandir(directory) as it:
+        names = [entry.name for entry in it if entry.is_file() and entry.name]
+    names.sort(key=str.lower)
+    return names
+
+
+def _is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+class ExcludeMatcher:
+    """A list of exclude patterns (exact names or globs, e.g. `README.md`,
+    `*.log`) compiled once, for matching many file names.
 
     Patterns are evaluated in order, gitignore-style: a pattern prefixed with
     `!` re-includes a file that matched an earlier pattern, so later patterns
     take precedence (e.g. `["*.txt", "!foo1.txt"]` excludes all `.txt` files
-    except `foo1.txt`)."""
-    excluded = False
-    for pattern in patterns:
-        if pattern.startswith("!"):
-            if fnmatch.fnmatch(file_name, pattern[1:]):
-                excluded = False
-        elif fnmatch.fnmatch(file_name, pattern):
-            excluded = True
-    return excluded
+    except `foo1.txt`).
+
+    For a path in a subdirectory (in a recursive run), a pattern matches
+    either the whole relative path (e.g. `drafts/*`) or just the file name.
+
+    Consecutive patterns with the same sign are merged into one rule: a set
+    of exact names plus a single regex for the globs. A name's fate is then
+    decided by the last rule it matches, checked from the end."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        runs: list[tuple[bool, list[str]]] = []
+        for pattern in patterns:
+            exclude = not pattern.startswith("!")
+            pattern = pattern if exclude else pattern[1:]
+            if runs and runs[-1][0] == exclude:
+                runs[-1][1].append(pattern)
+            else:
+                runs.append((exclude, [pattern]))
+
+        # (exclude, exact names, glob regex or None), last rule first
+        self._rules: list[tuple[bool, frozenset[str], re.Pattern[str] | None]] = []
+        for exclude, run in reversed(runs):
+            run = [os.path.normcase(p) for p in run]
+            names = frozenset(p for p in run if not _is_glob(p))
+            globs = [fnmatch.translate(p) for p in run if _is_glob(p)]
+            regex = re.compile("|".join(globs)) if globs else None
+            self._rules.append((exclude, names, regex))
+
+    @classmethod
+    def from_string(cls, text: str) -> "ExcludeMatcher":
+        """Build a matcher from a comma-separated pattern list (as typed in
+        the TUI's exclude field)."""
+        return cls(p.strip() for p in text.split(",") if p.strip())
+
+    def matches(self, file_name: str) -> bool:
+        """Whether `file_name` is excluded."""
+        name = os.path.normcase(file_name)
+        base = os.path.basename(name)
+        candidates = (name,) if base == name else (name, base)
+        for exclude, names, regex in self._rules:
+            for candidate in candidates:
+                if candidate in names or (regex is not None and regex.match(candidate)):
+                    return exclude
+        return False
+
+
+@functools.lru_cache(maxsize=32)
+def _matcher(patterns: tuple[str, ...]) -> ExcludeMatcher:
+    return ExcludeMatcher(patterns)
+
+
+def is_excluded(file_name: str, patterns: list[str]) -> bool:
+    """Check whether `file_name` matches any of the given exclude patterns
+    (see `ExcludeMatcher` for the pattern rules)."""
+    return _matcher(tuple(patterns)).matches(file_name)
 
 
 def filter_excluded(files: list[str], patterns: list[str]) -> list[str]:
     """Return `files` with any entries matching an exclude pattern removed."""
     if not patterns:
         return files
-    return [f for f in files if not is_excluded(f, patterns)]
+    matcher = ExcludeMatcher(patterns)
+    return [f for f in files if not matcher.matches(f)]
@@ -0,0 +1,167 @@
+"""Read image dimensions straight from the file header.
+
+Covers PNG, JPEG, GIF, BMP, WebP and TIFF by reading only the first few KB
+(plus a few bytes further in for JPEG/TIFF files whose size marker sits past
+that). Returns None for anything it doesn't recognise, so callers can fall
+back to a full decoder.
+"""
+
+import struct
+from typing import BinaryIO, Iterator
+
+HEAD_SIZE = 4096
+
+# JPEG start-of-frame markers (SOF0-SOF15, minus DHT, JPG and DAC).
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers that have no length field.
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xDA)}
+
+_TIFF_WIDTH = 256
+_TIFF_HEIGHT = 257
+
+
+class HeadReader:
+    """Random access to a file, served from the already-read head when possible."""
+
+    def __init__(self, f: BinaryIO, head: bytes) -> None:
+        self._f = f
+        self.head = head
+
+    def read(self, offset: int, size: int) -> bytes:
+        if offset + size <= len(self.head):
+            return self.head[offset : offset + size]
+        self._f.seek(offset)
+        return self._f.read(size)
+
+
+def iter_boxes(r: HeadReader, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Yield `(type, payload_start, box_end)` for the ISO BMFF boxes (as in
+    HEIF images and MP4/MOV videos) in a range. Stops at a truncated or
+    malformed box header."""
+    pos = start
+    while pos + 8 <= end:
+        header = r.read(pos, 16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            (size,) = struct.unpack(">Q", header[8:16])
+            header_size = 16
+        elif size == 0:  # box extends to the end of the file
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _png(r: HeadReader) -> tuple[int, int] | None:
+    if r.head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", r.head[16:24])
+
+
+def _gif(r: HeadReader) -> tuple[int, int] | None:
+    return struct.unpack("<HH", r.head[6:10])
+
+
+def _bmp(r: HeadReader) -> tuple[int, int] | None:
+    (header_size,) = struct.unpack("<I", r.head[14:18])
+    if header_size == 12:  # BITMAPCOREHEADER
+        return struct.unpack("<HH", r.head[18:22])
+    width, height = struct.unpack("<ii", r.head[18:26])
+    return width, abs(height)  # negative height means top-down rows
+
+
+def _webp(r: HeadReader) -> tuple[int, int] | None:
+    chunk = r.head[12:16]
+    if chunk == b"VP8 ":
+        if r.head[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", r.head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        if r.head[20] != 0x2F:
+            return None
+        bits = int.from_bytes(r.head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(r.head[24:27], "little") + 1
+        height = int.from_bytes(r.head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _jpeg(r: HeadReader) -> tuple[int, int] | None:
+    pos = 2
+    while True:
+        header = r.read(pos, 4)
+        if len(header) < 2 or header[0] != 0xFF:
+            return None
+        marker = header[1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            pos += 2
+            continue
+        if marker == 0xD9 or len(header) < 4:  # end of image
+            return None
+        (length,) = struct.unpack(">H", header[2:4])
+        if marker in _JPEG_SOF:
+            frame = r.read(pos + 5, 4)
+            if len(frame) < 4:
+                return None
+            height, width = struct.unpack(">HH", frame)
+            return width, height
+        pos += 2 + length
+
+
+def _tiff(r: HeadReader) -> tuple[int, int] | None:
+    endian = "<" if r.head[:2] == b"II" else ">"
+    (ifd_offset,) = struct.unpack(endian + "I", r.head[4:8])
+    count_bytes = r.read(ifd_offset, 2)
+    if len(count_bytes) < 2:
+        return None
+    (count,) = struct.unpack(endian + "H", count_bytes)
+    entries = r.read(ifd_offset + 2, count * 12)
+
+    size: dict[int, int] = {}
+    for i in range(0, len(entries) - 11, 12):
+        tag, type_ = struct.unpack(endian + "HH", entries[i : i + 4])
+        if tag not in (_TIFF_WIDTH, _TIFF_HEIGHT):
+            continue
+        if type_ == 3:  # SHORT
+            (size[tag],) = struct.unpack(endian + "H", entries[i + 8 : i + 10])
+        elif type_ == 4:  # LONG
+            (size[tag],) = struct.unpack(endian + "I", entries[i + 8 : i + 12])
+    if _TIFF_WIDTH not in size or _TIFF_HEIGHT not in size:
+        return None
+    return size[_TIFF_WIDTH], size[_TIFF_HEIGHT]
+
+
+def image_size(path: str) -> tuple[int, int] | None:
+    """Return `(width, height)` read from the header of the image at `path`,
+    or None if the format isn't recognised or the header is malformed."""
+    with open(path, "rb", buffering=0) as f:
+        head = f.read(HEAD_SIZE)
+        r = HeadReader(f, head)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return _png(r)
+            if head[:2] == b"\xff\xd8":
+                return _jpeg(r)
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return _gif(r)
+            if head[:2] == b"BM":
+                return _bmp(r)
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp(r)
+            if head[:4] in (b"II*\x00", b"MM\x00*"):
+                return _tiff(r)
+        except (struct.error, IndexError):
+            return None
+    return None
@@ -1,8 +1,40 @@
-from textual.suggester import Suggester, SuggestFromList
+from typing import Callable
+
+from textual.suggester import Suggester
 
 from renux.tags import FILTERS, PLACEHOLDERS
 
 
+class FileNameSuggester(Suggester):
+    """Suggests the first file name that starts with the typed value.
+
+    `files` is called for the current list on every lookup, so names found
+    after the form was built (the directory is scanned in the background)
+    are suggested too. Folded names for matching are kept, and only
+    extended as the list grows, or rebuilt if it's replaced."""
+
+    def __init__(
+        self, files: Callable[[], list[str]], *, case_sensitive: bool = False
+    ) -> None:
+        super().__init__(use_cache=False, case_sensitive=case_sensitive)
+        self._files = files
+        self._source: list[str] | None = None
+        self._folded: list[str] = []
+
+    async def get_suggestion(self, value: str) -> str | None:
+        files = self._files()
+        if files is not self._source:
+            self._source = files
+            self._folded = []
+        if len(self._folded) < len(files):
+            new = files[len(self._folded) :]
+            self._folded += new if self.case_sensitive else [n.casefold() for n in new]
+        for name, folded in zip(files, self._folded):
+            if folded.startswith(value):
+                return name
+        return None
+
+
 class TagSuggester(Suggester):
     """Suggests filenames, or, while inside an unclosed `{...}`, matching
     placeholder/filter names from the tags registry.
@@ -13,11 +45,13 @@ class TagSuggester(Suggester):
     only to the comparison, not the returned string.
     """
 
-    def __init__(self, filenames: list[str], *, case_sensitive: bool = False) -> None:
+    def __init__(
+        self, files: Callable[[], list[str]], *, case_sensitive: bool = False
+    ) -> None:
         super().__init__(case_sensitive=True)
         self._match_case_sensitive = case_sensitive
-        self._filename_suggester = SuggestFromList(
-            filenames, case_sensitive=case_sensitive
+        self._filename_suggester = FileNameSuggester(
+            files, case_sensitive=case_sensitive
         )
         self._placeholder_names = sorted(PLACEHOLDERS)
         self._filter_names = sorted(FILTERS)
@@ -0,0 +1,224 @@
+"""Read video dimensions, frame rate and duration straight from the container.
+
+Walks ISO BMFF boxes (MP4, MOV, M4V, 3GP) down to `mvhd`/`tkhd`/`mdhd`/
+`stsd`/`stts`, or Matroska/WebM EBML elements down to Segment Info and
+Tracks, seeking past everything else (including the media data itself).
+A Matroska frame rate comes only from a video track's DefaultDuration, which
+many files leave out; working it out from block timestamps would mean
+reading the media data.
+Returns None for containers it doesn't recognise, so callers can fall back
+to a full parser.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Iterator
+
+from renux.helpers.imagesize import HEAD_SIZE, HeadReader, iter_boxes
+
+_UNKNOWN_END = 1 << 62
+
+
+def _empty() -> dict[str, Any]:
+    return {"width": None, "height": None, "frame_rate": None, "duration": None}
+
+
+# ISO BMFF (MP4/MOV)
+
+
+def _child(
+    r: HeadReader, start: int, end: int, box_type: bytes
+) -> tuple[int, int] | None:
+    return next(
+        ((s, e) for t, s, e in iter_boxes(r, start, end) if t == box_type), None
+    )
+
+
+def _timescaled(r: HeadReader, start: int) -> tuple[int, int]:
+    """Read `(timescale, duration)` from an `mvhd` or `mdhd` payload."""
+    if r.read(start, 1)[0] == 1:
+        return struct.unpack(">IQ", r.read(start + 20, 12))
+    return struct.unpack(">II", r.read(start + 12, 8))
+
+
+def _mp4(r: HeadReader) -> dict[str, Any]:
+    info = _empty()
+    moov = _child(r, 0, _UNKNOWN_END, b"moov")
+    if moov is None:
+        return info
+
+    mvhd = _child(r, *moov, b"mvhd")
+    if mvhd is not None:
+        timescale, duration = _timescaled(r, mvhd[0])
+        if timescale:
+            info["duration"] = duration / timescale
+
+    for box_type, start, end in iter_boxes(r, *moov):
+        if box_type != b"trak":
+            continue
+        mdia = _child(r, start, end, b"mdia")
+        if mdia is None:
+            continue
+        hdlr = _child(r, *mdia, b"hdlr")
+        if hdlr is None or r.read(hdlr[0] + 8, 4) != b"vide":
+            continue
+
+        # Display size from the track header (16.16 fixed point).
+        tkhd = _child(r, start, end, b"tkhd")
+        if tkhd is not None:
+            offset = 88 if r.read(tkhd[0], 1)[0] == 1 else 76
+            width, height = struct.unpack(">II", r.read(tkhd[0] + offset, 8))
+            info["width"], info["height"] = width >> 16, height >> 16
+
+        stbl = None
+        minf = _child(r, *mdia, b"minf")
+        if minf is not None:
+            stbl = _child(r, *minf, b"stbl")
+
+        # Fall back to the coded size in the sample description.
+        if not info["width"] and stbl is not None:
+            stsd = _child(r, *stbl, b"stsd")
+            if stsd is not None:
+                width, height = struct.unpack(">HH", r.read(stsd[0] + 8 + 32, 4))
+                info["width"], info["height"] = width, height
+
+        # Frame rate: number of samples over the track's duration.
+        mdhd = _child(r, *mdia, b"mdhd")
+        stts = _child(r, *stbl, b"stts") if stbl is not None else None
+        if mdhd is not None and stts is not None:
+            timescale, duration = _timescaled(r, mdhd[0])
+            (count,) = struct.unpack(">I", r.read(stts[0] + 4, 4))
+            table = r.read(stts[0] + 8, count * 8)
+            samples = sum(
+                struct.unpack(">I", table[i : i + 4])[0]
+                for i in range(0, len(table) - 7, 8)
+            )
+            if timescale and duration:
+                info["frame_rate"] = samples * timescale / duration
+        break
+
+    return info
+
+
+# Matroska/WebM (EBML)
+
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_TRACKS = 0x1654AE6B
+_CLUSTER = 0x1F43B675
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE = 0x83
+_DEFAULT_DURATION = 0x23E383
+_VIDEO = 0xE0
+_PIXEL_WIDTH = 0xB0
+_PIXEL_HEIGHT = 0xBA
+
+
+def _vint(r: HeadReader, pos: int, *, keep_marker: bool) -> tuple[int | None, int]:
+    """Read an EBML variable-length integer, returning `(value, next_pos)`.
+    A size with all value bits set ("unknown size") is returned as None."""
+    first = r.read(pos, 1)
+    if not first or first[0] == 0:
+        raise ValueError("Invalid EBML variable-length integer")
+    length = 9 - first[0].bit_length()
+    data = r.read(pos, length)
+    if len(data) < length:
+        raise ValueError("Truncated EBML variable-length integer")
+    value = int.from_bytes(data, "big")
+    if keep_marker:
+        return value, pos + length
+    value &= (1 << (7 * length)) - 1
+    if value == (1 << (7 * length)) - 1:
+        return None, pos + length
+    return value, pos + length
+
+
+def _elements(r: HeadReader, start: int, end: int) -> Iterator[tuple[int, int, int]]:
+    """Yield `(id, data_start, data_end)` for the EBML elements in a range."""
+    pos = start
+    while pos < end:
+        element_id, pos = _vint(r, pos, keep_marker=True)
+        size, pos = _vint(r, pos, keep_marker=False)
+        data_end = end if size is None else pos + size
+        assert element_id is not None
+        yield element_id, pos, data_end
+        if size is None:
+            return  # unknown-size element: its children follow directly
+        pos = data_end
+
+
+def _uint(r: HeadReader, start: int, end: int) -> int:
+    return int.from_bytes(r.read(start, end - start), "big")
+
+
+def _float(r: HeadReader, start: int, end: int) -> float:
+    data = r.read(start, end - start)
+    return struct.unpack(">f" if len(data) == 4 else ">d", data)[0]
+
+
+def _mkv(r: HeadReader) -> dict[str, Any]:
+    info = _empty()
+    top = _elements(r, 0, _UNKNOWN_END)
+    next(top)  # EBML header
+    segment = next(((s, e) for i, s, e in top if i == _SEGMENT), None)
+    if segment is None:
+        return info
+
+    found_info = found_tracks = False
+    for element_id, start, end in _elements(r, *segment):
+        if element_id == _INFO:
+            found_info = True
+            scale = 1_000_000  # nanoseconds per timecode unit
+            duration = None
+            for child_id, s, e in _elements(r, start, end):
+                if child_id == _TIMECODE_SCALE:
+                    scale = _uint(r, s, e)
+                elif child_id == _DURATION:
+                    duration = _float(r, s, e)
+            if duration is not None:
+                info["duration"] = duration * scale / 1e9
+        elif element_id == _TRACKS:
+            found_tracks = True
+            for entry_id, s, e in _elements(r, start, end):
+                if entry_id != _TRACK_ENTRY:
+                    continue
+                fields = {i: (cs, ce) for i, cs, ce in _elements(r, s, e)}
+                if _TRACK_TYPE not in fields or _uint(r, *fields[_TRACK_TYPE]) != 1:
+                    continue
+                if _DEFAULT_DURATION in fields:
+                    frame_ns = _uint(r, *fields[_DEFAULT_DURATION])
+                    if frame_ns:
+                        info["frame_rate"] = 1e9 / frame_ns
+                if _VIDEO in fields:
+                    video = {i: (cs, ce) for i, cs, ce in _elements(r, *fields[_VIDEO])}
+                    if _PIXEL_WIDTH in video and _PIXEL_HEIGHT in video:
+                        info["width"] = _uint(r, *video[_PIXEL_WIDTH])
+                        info["height"] = _uint(r, *video[_PIXEL_HEIGHT])
+                break
+        elif element_id == _CLUSTER:
+            break  # media data; Info and Tracks come before it
+        if found_info and found_tracks:
+            break
+
+    return info
+
+
+def video_info(path: str) -> dict[str, Any] | None:
+    """Return the `width`, `height`, `frame_rate` and `duration` (seconds) of
+    the video at `path`, with None for anything the container doesn't state.
+    Returns None if the container isn't MP4/MOV or Matroska/WebM, or is too
+    malformed to walk."""
+    with open(path, "rb", buffering=0) as f:
+        head = f.read(HEAD_SIZE)
+        r = HeadReader(f, head)
+        try:
+            if head[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free"):
+                return _mp4(r)
+            if head[:4] == b"\x1a\x45\xdf\xa3":
+                return _mkv(r)
+        except (struct.error, ValueError, IndexError, StopIteration):
+            return None  # malformed; let the full parser have a go
+    return None
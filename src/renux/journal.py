@@ -0,0 +1,295 @@
+"""Write-ahead journal of a batch of renames, so an interrupted batch can be
+resumed or rolled back.
+
+Before anything is renamed, the whole batch is written to a journal file and
+synced to disk. Journals are kept in a per-user state directory
+(`$XDG_STATE_HOME/renux`, or `%LOCALAPPDATA%\\renux` on Windows) rather than
+next to the undo/redo backups, as the temp directory those are in is often
+cleared on reboot or kept in memory. As renames complete, their indices are
+appended in batches of `BATCH_SIZE`, and the file is synced at most every
+`CHECKPOINT_INTERVAL` seconds. The journal is deleted once the batch is done.
+
+If renux is killed mid-batch, the journal is left behind, and `recover`
+works out which renames happened from the recorded progress plus one
+directory listing, so the files don't have to be scanned or the batch
+planned again. Renames after the last checkpoint can be found this way
+because the renames done in a chain are always a prefix of it, ending at
+the first one whose source name is missing (see `renux.executor`). In a
+recursive batch, each subdirectory involved is listed once.
+
+The journal is JSON lines: a header, the batch in chunks, the inode of each
+cycle's first file (to tell a finished cycle from one not started), then
+progress records.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import IO, Iterable
+
+from renux.backup import _directory_digest
+from renux.executor import Pair, cycle_steps, schedule
+from renux.helpers.files import list_existing
+
+JOURNAL_VERSION = 1
+# Pairs per plan record.
+PLAN_CHUNK = 10_000
+# Completed renames per progress record.
+BATCH_SIZE = 1000
+# Most seconds between syncs of the progress records to disk.
+CHECKPOINT_INTERVAL = 1.0
+
+
+def _get_journal_dir() -> str:
+    """Get the directory journals are kept in, creating it if necessary."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(
+            os.path.join("~", "AppData", "Local")
+        )
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.expanduser(
+            os.path.join("~", ".local", "state")
+        )
+    journal_dir = os.path.join(base, "renux")
+    os.makedirs(journal_dir, exist_ok=True)
+    return journal_dir
+
+
+def _get_journal_path(directory: str) -> str:
+    """Return the journal file path for the given directory."""
+    filename = f"journal_{_directory_digest(directory)}.jsonl"
+    return os.path.join(_get_journal_dir(), filename)
+
+
+def has_journal(directory: str) -> bool:
+    """Whether a batch of renames in `directory` was interrupted."""
+    return os.path.exists(_get_journal_path(directory))
+
+
+class Journal:
+    """The journal of one batch of renames in `directory`.
+
+    `operation` is what the batch was for ("apply", "undo", "redo" or
+    "rollback"), so a resumed batch can be recorded the same way.
+
+    Use as a context manager: the journal is deleted if the block finishes,
+    and kept (for `--resume`) if it raises, e.g. on Ctrl-C."""
+
+    def __init__(
+        self,
+        directory: str,
+        operation: str,
+        renames: list[Pair],
+        journal_id: str,
+        cycle_inodes: dict[int, int],
+        done: set[int],
+    ) -> None:
+        self.directory = directory
+        self.operation = operation
+        self.renames = renames
+        self.path = _get_journal_path(directory)
+        self._id = journal_id
+        self._cycle_inodes = cycle_inodes
+        self._done = done
+        self._index = {pair: i for i, pair in enumerate(renames)}
+        self._lock = threading.Lock()
+        self._pending: list[int] = []
+        self._synced = time.monotonic()
+        self._file = open(self.path, "a")
+
+    @classmethod
+    def create(cls, directory: str, operation: str, renames: list[Pair]) -> Journal:
+        """Write and sync the journal of a new batch of changed `renames`,
+        replacing any previous journal for `directory`."""
+        path = _get_journal_path(directory)
+        journal_id = uuid.uuid4().hex[:12]
+        index = {pair: i for i, pair in enumerate(renames)}
+        cycle_inodes = {}
+        for cycle in schedule(renames)[1]:
+            try:
+                st = os.lstat(os.path.join(directory, cycle[0][0]))
+            except OSError:
+                continue  # its rename will fail, and nothing will move
+            cycle_inodes[index[cycle[0]]] = st.st_ino
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            _write_record(
+                f,
+                {
+                    "version": JOURNAL_VERSION,
+                    "id": journal_id,
+                    "directory": directory,
+                    "operation": operation,
+                },
+            )
+            for start in range(0, len(renames), PLAN_CHUNK):
+                _write_record(f, {"plan": renames[start : start + PLAN_CHUNK]})
+            _write_record(f, {"cycles": list(cycle_inodes.items())})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _sync_dir(os.path.dirname(path))
+        return cls(directory, operation, renames, journal_id, cycle_inodes, set())
+
+    @classmethod
+    def load(cls, directory: str) -> Journal | None:
+        """Return the journal of the interrupted batch in `directory`, if any."""
+        try:
+            f = open(_get_journal_path(directory))
+        except FileNotFoundError:
+            return None
+
+        header = None
+        renames: list[Pair] = []
+        cycle_inodes: dict[int, int] = {}
+        done: set[int] = set()
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # a write cut off by the interruption
+                if "version" in record:
+                    header = record
+                elif "plan" in record:
+                    renames.extend((old, new) for old, new in record["plan"])
+                elif "cycles" in record:
+                    cycle_inodes.update(record["cycles"])
+                elif "done" in record:
+                    done.update(record["done"])
+        if header is None or header["version"] != JOURNAL_VERSION:
+            return None
+        return cls(
+            directory, header["operation"], renames, header["id"], cycle_inodes, done
+        )
+
+    def temp_name(self, pair: Pair) -> str:
+        """The temporary name for the cycle starting with `pair`. It's derived
+        from the journal, so a cycle cut off halfway can be found again. It's
+        in the same subdirectory as the cycle's files."""
+        name = f".renux-{self._id}-{self._index[pair]}.tmp"
+        return os.path.join(os.path.dirname(pair[0]), name)
+
+    def done(self, pair: Pair) -> None:
+        """Record that `pair` was renamed (thread-safe)."""
+        with self._lock:
+            self._pending.append(self._index[pair])
+            if len(self._pending) >= BATCH_SIZE:
+                self._write_pending()
+
+    def _write_pending(self, sync: bool = False) -> None:
+        if self._pending:
+            self._done.update(self._pending)
+            _write_record(self._file, {"done": self._pending})
+            self._pending = []
+            self._file.flush()
+        if sync or time.monotonic() - self._synced >= CHECKPOINT_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._synced = time.monotonic()
+
+    def recover(self) -> tuple[list[Pair], list[Pair]]:
+        """Work out which renames of the interrupted batch happened, returning
+        `(applied, pending)`. A cycle cut off halfway is first put back as it
+        was, so it ends up pending."""
+        existing = list_existing(
+            self.directory, (name for pair in self.renames for name in pair)
+        )
+        chains, cycles = schedule(self.renames)
+        applied: list[Pair] = []
+        pending: list[Pair] = []
+
+        for chain in chains:
+            done = 0
+            while done < len(chain) and self._index[chain[done]] in self._done:
+                done += 1
+            done += _renamed_prefix(chain[done:], existing)
+            applied += chain[:done]
+            pending += chain[done:]
+
+        for cycle in cycles:
+            if all(self._index[pair] in self._done for pair in cycle):
+                applied += cycle
+                continue
+            temp = self.temp_name(cycle[0])
+            if temp in existing:
+                steps = cycle_steps(cycle, temp)
+                done = _renamed_prefix(steps, existing)
+                for old, new in reversed(steps[:done]):
+                    os.rename(self._path(new), self._path(old))
+                pending += cycle
+            elif self._cycle_finished(cycle):
+                applied += cycle
+            else:
+                pending += cycle
+
+        return applied, pending
+
+    def _cycle_finished(self, cycle: list[Pair]) -> bool:
+        """Whether `cycle`, with no file left under its temporary name, was
+        carried out: its first file is no longer under its old name."""
+        inode = self._cycle_inodes.get(self._index[cycle[0]])
+        if inode is None:
+            return False
+        try:
+            return os.lstat(self._path(cycle[0][0])).st_ino != inode
+        except OSError:
+            return False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def close(self) -> None:
+        """Write and sync the remaining progress records."""
+        with self._lock:
+            if not self._file.closed:
+                self._write_pending(sync=True)
+                self._file.close()
+
+    def finish(self) -> None:
+        """Close and delete the journal, once its batch is done."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.finish()
+        else:
+            self.close()
+
+
+def _sync_dir(path: str) -> None:
+    """Sync the directory `path` to disk, so a file just put in it survives a
+    crash. Not possible (or needed) on Windows."""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _renamed_prefix(steps: Iterable[Pair], existing: set[str]) -> int:
+    """How many of a chain's `steps` were done, given the names that
+    `existing` in the directory: up to the first step whose source is
+    missing (the steps before it have had their sources filled again)."""
+    for i, (old, _) in enumerate(steps):
+        if old not in existing:
+            return i + 1
+    return 0
+
+
+def _write_record(f: IO[str], record: dict) -> None:
+    f.write(json.dumps(record, separators=(",", ":")))
+    f.write("\n")
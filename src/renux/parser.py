@@ -89,6 +89,24 @@ def _main(
         metavar="PATTERN",
         help="Exclude files matching PATTERN (exact name or glob, e.g. `README.md`, `*.log`). Repeatable; prefix with `!` to re-include a file matched by an earlier pattern.",
     ),
+    jobs: int = typer.Option(
+        1,
+        "-j",
+        "--jobs",
+        min=1,
+        help="Use N workers (default: 1): threads to read file metadata for tags like {width}, {camera_model} or {duration}, processes to plan large metadata-free renames, threads to apply the renames, and threads to walk subdirectories with --recursive. Helps most on slow or network filesystems.",
+    ),
+    recursive: bool = typer.Option(
+        False,
+        "-R",
+        "--recursive",
+        help="Also rename files in subdirectories, each within its own directory. One undo record covers the whole tree.",
+    ),
+    per_directory_counters: bool = typer.Option(
+        DEFAULT_OPTIONS["per_directory_counters"],
+        "--per-directory-counters",
+        help="With --recursive, start counter tags like {counter} over in each directory (default: False).",
+    ),
     yes: bool = typer.Option(
         False,
         "-y",
@@ -100,6 +118,11 @@ def _main(
         "--dry-run",
         help="Preview the rename without opening the TUI or changing any files (headless mode).",
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Don't read or write the metadata cache used by image/video/EXIF tags, or the directory snapshots that let a headless run reuse the previous run's listing.",
+    ),
     undo: bool = typer.Option(
         False,
         "--undo",
@@ -110,6 +133,21 @@ def _main(
         "--redo",
         help="Redo the last undone rename in `directory` without opening the TUI (headless mode).",
     ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Finish a rename in `directory` that was interrupted (e.g. killed or a reboot) without opening the TUI (headless mode).",
+    ),
+    rollback_incomplete: bool = typer.Option(
+        False,
+        "--rollback-incomplete",
+        help="Undo the part of an interrupted rename in `directory` that was applied, without opening the TUI (headless mode).",
+    ),
+    history_stats: bool = typer.Option(
+        False,
+        "--history-stats",
+        help="Show how much undo/redo history is kept per directory, and the limits, then exit.",
+    ),
 ) -> SimpleNamespace:
     if apply_to not in APPLY_TO_CHOICES:
         raise typer.BadParameter(
@@ -126,10 +164,17 @@ def _main(
         case_sensitive=case_sensitive,
         apply_to=apply_to,
         exclude=exclude,
+        jobs=jobs,
+        recursive=recursive,
+        per_directory_counters=per_directory_counters,
         yes=yes,
         dry_run=dry_run,
+        no_cache=no_cache,
         undo=undo,
         redo=redo,
+        resume=resume,
+        rollback_incomplete=rollback_incomplete,
+        history_stats=history_stats,
     )
 
 
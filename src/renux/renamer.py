@@ -1,63 +1,382 @@
 import os
 import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Collection, Iterable, Iterator, Mapping
 
 from renux.constants import DEFAULT_OPTIONS
-from renux.tags import FILTERS, PLACEHOLDERS, PlaceholderContext
+from renux.executor import Failure, RenameExecutor
+from renux.facts import FileFacts
+from renux.helpers.files import Entry, list_existing
+from renux.journal import Journal, has_journal
+from renux.template import Template
 
+# Fewest files worth sending to a worker process; below this, starting the
+# processes costs more than planning on one core.
+MIN_SHARD_SIZE = 5000
 
-def _placeholder_pattern(*, stateful: bool) -> re.Pattern:
-    """Regex matching `{name}`, `{name(args)}`, or `{name(args)|filter...}`
-    for placeholders with the given statefulness."""
-    names = [p.name for p in PLACEHOLDERS.values() if p.stateful == stateful]
-    if not names:
-        return re.compile(r"(?!)")  # never matches
-    alternation = "|".join(re.escape(name) for name in names)
-    return re.compile(rf"\{{({alternation})(?:\((.*?)\))?((?:\|[^{{}}]+)*)\}}")
 
+class RenameError(ValueError):
+    """Some renames in a batch failed; the others were applied.
 
-def apply_filters(value: str, filter_chain: str) -> str:
-    """Apply a `|filter1|filter2` chain to `value`, skipping unknown filter names."""
-    for name in filter_chain.split("|"):
-        if not name:
-            continue
-        filt = FILTERS.get(name)
-        if filt:
-            value = filt.func(value)
-    return value
+    `applied` and `failed` are the `(old_name, new_name)` pairs that were and
+    weren't renamed, so callers can record just the part that happened."""
 
+    def __init__(self, applied: list[tuple[str, str]], failures: list[Failure]) -> None:
+        (old, new), error = failures[0]
+        reason = error.strerror or str(error)
+        super().__init__(
+            f"{len(failures)} file(s) couldn't be renamed "
+            f"(e.g. {old} → {new}: {reason})."
+        )
+        self.applied = applied
+        self.failed = [pair for pair, _ in failures]
+
+
+def apply_renames(
+    directory: str,
+    renames: list[tuple[str, str]],
+    workers: int = 1,
+    operation: str = "apply",
+    existing: Collection[str] | None = None,
+) -> None:
+    """Apply the renaming changes, on up to `workers` threads.
+
+    Renames are ordered so chains and swaps work in one pass (see
+    `renux.executor`), and journaled so an interrupted batch can be resumed
+    or rolled back (see `renux.journal`; `operation` is what the batch is
+    for). Names may be paths relative to `directory`, each rename staying
+    within its subdirectory. Raises ValueError before renaming anything if two files would get
+    the same name, a new name is taken by a file that isn't being renamed,
+    or an earlier batch in `directory` was interrupted, and RenameError if
+    some renames failed. The new names are checked against `existing` (the
+    names in `directory`, as `list_existing` gives them) if the caller knows
+    them to be current, and against a fresh listing otherwise."""
+    changed = [(old, new) for old, new in renames if old != new]
 
-def apply_renames(directory: str, renames: list[tuple[str, str]]) -> None:
-    """Apply the renaming changes."""
     # Abort if no files need renaming
-    if sum(1 for f in renames if f[0] != f[1]) <= 0:
+    if not changed:
         raise ValueError("No files to rename. Try again.")
 
-    # Check for potential duplicate file names
-    seen = set()
-    for _, new_name in renames:
-        if new_name in seen:
-            raise ValueError("There will be duplicate files. Try again.")
-        seen.add(new_name)
-
-    # Apply the renaming changes
-    for old_name, new_name in renames:
-        # Skip unchanged files
-        if old_name == new_name:
-            continue
-
-        # Construct full paths
-        old_path = os.path.join(directory, old_name)
-        new_path = os.path.join(directory, new_name)
-
-        # Attempt to rename the file
-        try:
-            os.rename(old_path, new_path)
-        except FileExistsError as e:
-            continue
-        except PermissionError as e:
-            continue
-        except Exception as e:
-            continue
+    if has_journal(directory):
+        raise ValueError(
+            "A rename in this directory was interrupted. Run renux with "
+            "--resume to finish it or --rollback-incomplete to undo it."
+        )
+
+    # A new name may only be taken by a file that's moving out of the way.
+    if existing is None:
+        existing = list_existing(directory, (new for _, new in changed))
+    moving = {old for old, _ in changed}
+    for _, new_name in changed:
+        if new_name in existing and new_name not in moving:
+            raise ValueError(f"{new_name} already exists. Try again.")
+
+    # Two renames to the same name are refused (by `schedule`) before the
+    # journal is written.
+    with Journal.create(directory, operation, changed) as journal:
+        failures = rename_files(directory, changed, workers, journal)
+    if failures:
+        failed = {pair for pair, _ in failures}
+        applied = [pair for pair in changed if pair not in failed]
+        raise RenameError(applied, failures)
+
+
+def rename_files(
+    directory: str,
+    renames: Iterable[tuple[str, str]],
+    workers: int = 1,
+    journal: Journal | None = None,
+) -> list[Failure]:
+    """Rename each `(old_name, new_name)` pair (see `RenameExecutor`), without
+    the checks `apply_renames` makes (for callers that have checked the
+    batch already). Returns the pairs that couldn't be renamed, with their
+    errors."""
+    with RenameExecutor(directory, workers, journal) as executor:
+        return executor.run(renames)
+
+
+class RenamePlan:
+    """A search pattern, replacement, and options compiled once and reused for
+    every file in a batch.
+
+    The search regex and the replacement `Template` are built up front, and
+    constant placeholders (e.g. `{now}`) are resolved once, so every file in
+    the batch sees the same value."""
+
+    def __init__(self, pattern: str, replacement: str, options: dict) -> None:
+        options = {**DEFAULT_OPTIONS, **options}  # options overrides DEFAULT_OPTIONS
+
+        self.count = int(options["count"])
+        self.apply_to = options["apply_to"]
+        self.per_directory_counters = bool(options["per_directory_counters"])
+
+        # No search pattern means no renaming (avoids matching/replacing every
+        # character), so there is nothing to compile.
+        self.regex: re.Pattern | None = None
+        if pattern:
+            if not options["regex"]:
+                pattern = re.escape(pattern)
+            flags = 0 if options["case_sensitive"] else re.IGNORECASE
+            self.regex = re.compile(pattern, flags)
+
+        self.template = Template(replacement, self.regex)
+
+    def initial_counters(self) -> list[int]:
+        """Return the starting value of each stateful placeholder occurrence."""
+        return [
+            ref.placeholder.initial(ref.args) if ref.placeholder.initial else 1
+            for ref in self.template.stateful
+        ]
+
+    def matches(self, file_name: str) -> bool:
+        """Whether this plan renames `file_name` at all."""
+        if self.regex is None:
+            return False
+        return self.regex.search(os.path.basename(file_name)) is not None
+
+    def get_rename(
+        self,
+        file_name: str,
+        directory: str,
+        counters: list[int],
+        facts: FileFacts | None = None,
+    ) -> str:
+        """Generate a new file name for `file_name`, advancing `counters` if it
+        matches. `facts` may hold the file's already-loaded metadata.
+
+        `file_name` may be a path relative to `directory` (in a recursive
+        run); only its last component is renamed, and it stays in its
+        subdirectory."""
+        # Abort if no match is found for the pattern
+        if not self.matches(file_name):
+            return file_name
+
+        subdir, base = os.path.split(file_name)
+        if subdir:
+            directory = os.path.join(directory, subdir)
+
+        # Resolve placeholders once per file, shared by every match
+        values = self.template.resolve(base, directory, counters, facts)
+
+        # Apply renaming based on the target (file name, extension, or both)
+        name, ext = os.path.splitext(base)
+
+        if self.apply_to == "name":
+            new_name = self._sub(name, values) + ext
+        elif self.apply_to == "ext":
+            new_name = name + "." + self._sub(ext[1:], values)
+        else:
+            new_name = self._sub(base, values)
+        return os.path.join(subdir, new_name)
+
+    def get_renames(
+        self,
+        files: list[str],
+        directory: str,
+        workers: int = 1,
+        processes: int = 1,
+        entries: Mapping[str, Entry] | None = None,
+    ) -> list[tuple[str, str]]:
+        """Rename multiple files in a directory with this plan. See
+        `iter_renames` for the arguments."""
+        return list(self.iter_renames(files, directory, workers, processes, entries))
+
+    def iter_renames(
+        self,
+        files: list[str],
+        directory: str,
+        workers: int = 1,
+        processes: int = 1,
+        entries: Mapping[str, Entry] | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        """Yield `(old_name, new_name)` for each file in order, as it's planned.
+
+        `entries` is the directory's file table from `scan_files` (or a
+        snapshot), if the caller has it; stat-based placeholders then take
+        each file's stat result from its entry (see `FileFacts`).
+
+        With `workers` > 1, the metadata the placeholders need (stat, image
+        header, EXIF, video) is read ahead by that many threads. With
+        `processes` > 1, a template that doesn't read metadata at all is
+        planned in shards across that many processes instead (for large
+        enough `files`). Either way the result, including counter values, is
+        the same as a sequential run.
+
+        `files` may be paths relative to `directory` (see `walk_files`). With
+        the `per_directory_counters` option, counters start over in each
+        subdirectory; `files` must then list each subdirectory's files
+        together, as `walk_files` does."""
+        if (
+            processes > 1
+            and not self.template.extractors
+            and not self.per_directory_counters
+        ):
+            shards = self._shards(files, processes)
+            if len(shards) > 1:
+                yield from self._iter_renames_sharded(shards, directory, processes)
+                return
+
+        if workers > 1 and self.template.extractors:
+            loaded = self._prefetch(files, directory, workers, entries)
+        elif entries and self.template.extractors:
+            loaded = (
+                (file_name, _file_facts(directory, file_name, entries))
+                for file_name in files
+            )
+        else:
+            loaded = ((file_name, None) for file_name in files)
+        yield from self._iter_renames(loaded, directory, self.initial_counters())
+
+    def _iter_renames(
+        self,
+        loaded: Iterable[tuple[str, FileFacts | None]],
+        directory: str,
+        counters: list[int],
+    ) -> Iterator[tuple[str, str]]:
+        subdir = ""
+        for file_name, facts in loaded:
+            if self.per_directory_counters:
+                file_subdir = os.path.dirname(file_name)
+                if file_subdir != subdir:
+                    subdir = file_subdir
+                    counters = self.initial_counters()
+            try:
+                new_name = self.get_rename(file_name, directory, counters, facts)
+            except Exception as e:
+                continue
+            yield file_name, new_name
+
+    @staticmethod
+    def _shards(files: list[str], processes: int) -> list[list[str]]:
+        """Split `files` into contiguous shards, a few per process so a slow
+        shard doesn't hold up the rest."""
+        count = min(processes * 4, len(files) // MIN_SHARD_SIZE)
+        if count <= 1:
+            return [files]
+        size = -(-len(files) // count)
+        return [files[i : i + size] for i in range(0, len(files), size)]
+
+    def _iter_renames_sharded(
+        self, shards: list[list[str]], directory: str, processes: int
+    ) -> Iterator[tuple[str, str]]:
+        """Plan each shard in a worker process and join the results in order.
+
+        Counters advance once per matching file, so each shard's starting
+        counters are found by counting the matches in the shards before it."""
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(self,)
+        ) as pool:
+            starts = []
+            counters = self.initial_counters()
+            if self.template.stateful:
+                for matched in pool.map(_count_matches, shards):
+                    starts.append(list(counters))
+                    self._advance(counters, matched)
+            else:
+                starts = [counters] * len(shards)
+
+            for shard_renames in pool.map(
+                _plan_shard, shards, [directory] * len(shards), starts
+            ):
+                yield from shard_renames
+
+    def _advance(self, counters: list[int], times: int) -> None:
+        """Advance `counters` as if `times` more files had matched."""
+        for index, ref in enumerate(self.template.stateful):
+            advance = ref.placeholder.advance
+            if advance is None:
+                continue
+            for _ in range(times):
+                counters[index] = advance(ref.args, counters[index])
+
+    def _prefetch(
+        self,
+        files: list[str],
+        directory: str,
+        workers: int,
+        entries: Mapping[str, Entry] | None,
+    ) -> Iterator[tuple[str, FileFacts | None]]:
+        """Yield `(file_name, facts)` in order, loading the facts of matching
+        files on a thread pool. At most a few batches of files are in flight,
+        so loaded metadata doesn't pile up ahead of the caller."""
+        families = self.template.extractors
+
+        def load(file_name: str) -> FileFacts:
+            facts = _file_facts(directory, file_name, entries)
+            facts.prefetch(families)
+            return facts
+
+        window = workers * 4
+        pending: deque[tuple[str, Future[FileFacts] | None]] = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for file_name in files:
+                future = (
+                    pool.submit(load, file_name) if self.matches(file_name) else None
+                )
+                pending.append((file_name, future))
+                if len(pending) >= window:
+                    name, done = pending.popleft()
+                    yield name, done.result() if done else None
+            while pending:
+                name, done = pending.popleft()
+                yield name, done.result() if done else None
+
+    def _sub(self, string: str, values: list[str]) -> str:
+        """Like `re.sub`, but skips a zero-length match immediately adjacent to
+        the previous match (e.g. avoids `.*` matching the whole string and then
+        matching again at the empty end)."""
+        assert self.regex is not None
+        pieces = []
+        pos = 0
+        last_end = -1
+        n_subs = 0
+        for m in self.regex.finditer(string):
+            if self.count and n_subs >= self.count:
+                break
+            start, end = m.span()
+            if start < pos or (start == end and start == last_end):
+                continue
+            pieces.append(string[pos:start])
+            pieces.append(self.template.render(m, values))
+            pos = end
+            last_end = end
+            n_subs += 1
+        pieces.append(string[pos:])
+        return "".join(pieces)
+
+
+def _file_facts(
+    directory: str, file_name: str, entries: Mapping[str, Entry] | None
+) -> FileFacts:
+    entry = entries.get(file_name) if entries else None
+    return FileFacts(os.path.join(directory, file_name), entry)
+
+
+# The plan each worker process was started with (see `_iter_renames_sharded`),
+# sent once per process rather than with every shard.
+_worker_plan: RenamePlan | None = None
+
+
+def _init_worker(plan: RenamePlan) -> None:
+    global _worker_plan
+    _worker_plan = plan
+
+
+def _count_matches(files: list[str]) -> int:
+    assert _worker_plan is not None
+    return sum(1 for file_name in files if _worker_plan.matches(file_name))
+
+
+def _plan_shard(
+    files: list[str], directory: str, counters: list[int]
+) -> list[tuple[str, str]]:
+    assert _worker_plan is not None
+    return list(
+        _worker_plan._iter_renames(
+            ((file_name, None) for file_name in files), directory, counters
+        )
+    )
 
 
 def get_renames(
@@ -66,58 +385,35 @@ def get_renames(
     pattern: str,
     replacement: str,
     options: dict,
+    workers: int = 1,
+    processes: int = 1,
+    entries: Mapping[str, Entry] | None = None,
 ) -> list[tuple[str, str]]:
     """Rename multiple files in a directory based on specified search and replacement criteria."""
-    # Initialize counters for stateful placeholders (e.g. {counter(...)})
-    counters = []
-    for match in _placeholder_pattern(stateful=True).finditer(replacement):
-        name, args = match.group(1), match.group(2) or ""
-        placeholder = PLACEHOLDERS[name]
-        initial = placeholder.initial(args) if placeholder.initial else 1
-        counters.append(initial)
-
-    # Store the original and new name of each file
-    renames: list[tuple[str, str]] = []
-    for file_name in files:
-        try:
-            new_name = get_rename(
-                file_name,
-                directory,
-                pattern,
-                replacement,
-                options,
-                counters,
-            )
-        except re.error as e:
-            continue
-        except Exception as e:
-            continue
-        renames.append((file_name, new_name))
-
-    return renames
-
-
-def _sub(pattern: str, repl: str, string: str, count: int, flags: int) -> str:
-    """Like `re.sub`, but skips a zero-length match immediately adjacent to the
-    previous match (e.g. avoids `.*` matching the whole string and then
-    matching again at the empty end)."""
-    pieces = []
-    pos = 0
-    last_end = -1
-    n_subs = 0
-    for m in re.finditer(pattern, string, flags):
-        if count and n_subs >= count:
-            break
-        start, end = m.span()
-        if start < pos or (start == end and start == last_end):
-            continue
-        pieces.append(string[pos:start])
-        pieces.append(m.expand(repl))
-        pos = end
-        last_end = end
-        n_subs += 1
-    pieces.append(string[pos:])
-    return "".join(pieces)
+    try:
+        plan = RenamePlan(pattern, replacement, options)
+    except re.error as e:
+        return []
+    return plan.get_renames(files, directory, workers, processes, entries)
+
+
+def iter_renames(
+    files: list[str],
+    directory: str,
+    pattern: str,
+    replacement: str,
+    options: dict,
+    workers: int = 1,
+    processes: int = 1,
+    entries: Mapping[str, Entry] | None = None,
+) -> Iterator[tuple[str, str]]:
+    """Like `get_renames`, but yields each `(old_name, new_name)` as it's
+    planned instead of building the whole list."""
+    try:
+        plan = RenamePlan(pattern, replacement, options)
+    except re.error as e:
+        return
+    yield from plan.iter_renames(files, directory, workers, processes, entries)
 
 
 def get_rename(
@@ -129,106 +425,6 @@ def get_rename(
     counters: list[int] = [],
 ) -> str:
     """Generate a new file name by applying the search pattern and replacement rules."""
-    options = {**DEFAULT_OPTIONS, **options}  # options overrides DEFAULT_OPTIONS
-
-    # Abort if no search pattern is given (avoids matching/replacing every character)
-    if not pattern:
-        return file_name
-
-    flags = 0
-
-    if not options["regex"]:
-        pattern = re.escape(pattern)
-
-    if not options["case_sensitive"]:
-        flags |= re.IGNORECASE
-
-    # Abort if no match is found for the pattern
-    if not re.search(pattern, file_name, flags):
-        return file_name
-
-    # Process placeholders in the replacement string
-    replacement = process_counter_placeholder(replacement, counters)
-    replacement = process_date_placeholders(replacement, file_name, directory)
-
-    # Apply renaming based on the target (file name, extension, or both)
-    name, ext = os.path.splitext(file_name)
-
-    if options["apply_to"] == "name":
-        new_name = _sub(pattern, replacement, name, options["count"], flags=flags) + ext
-    elif options["apply_to"] == "ext":
-        new_name = (
-            name
-            + "."
-            + _sub(pattern, replacement, ext[1:], options["count"], flags=flags)
-        )
-    else:
-        new_name = _sub(pattern, replacement, file_name, options["count"], flags=flags)
-
-    # Apply additional text operations
-    new_name = apply_text_operations(new_name)
-
-    return new_name
-
-
-def process_counter_placeholder(replacement: str, counters: list[int]) -> str:
-    """Replace stateful placeholders (e.g. {counter(...)}) in the replacement string."""
-    pattern = _placeholder_pattern(stateful=True)
-    index = 0
-
-    def replace(match: re.Match) -> str:
-        nonlocal index
-        name, args, filter_chain = (
-            match.group(1),
-            match.group(2) or "",
-            match.group(3) or "",
-        )
-        placeholder = PLACEHOLDERS[name]
-
-        current = counters[index]
-        ctx = PlaceholderContext(args=args, counter=current, file_name="", directory="")
-        result = placeholder.resolve(ctx)
-
-        counters[index] = (
-            placeholder.advance(args, current) if placeholder.advance else current
-        )
-        index += 1
-
-        return apply_filters(result, filter_chain)
-
-    return pattern.sub(replace, replacement)
-
-
-def process_date_placeholders(replacement: str, file_name: str, directory: str) -> str:
-    """Replace non-stateful placeholders (e.g. {now}, {created_at}) with resolved values."""
-    pattern = _placeholder_pattern(stateful=False)
-
-    def replace(match: re.Match) -> str:
-        name, args, filter_chain = (
-            match.group(1),
-            match.group(2) or "",
-            match.group(3) or "",
-        )
-        placeholder = PLACEHOLDERS[name]
-        ctx = PlaceholderContext(
-            args=args, counter=None, file_name=file_name, directory=directory
-        )
-        result = placeholder.resolve(ctx)
-        return apply_filters(result, filter_chain)
-
-    return pattern.sub(replace, replacement)
-
-
-def apply_text_operations(text: str) -> str:
-    """Apply text transformations using tag syntax like {<group>|<filter>}."""
-    # Pattern to match tag syntax like {<group>|<filter1>|<filter2>...}
-    tag_pattern = re.compile(r"\{([^{}|]+)((?:\|[^{}|]+)+)\}")
-
-    def transform_match(match: re.Match) -> str:
-        group = match.group(1)  # The group reference (e.g., \1)
-        filter_chain = match.group(2)  # The filter(s) to apply (e.g., |slugify)
-
-        return apply_filters(group, filter_chain)
-
-    # Replace all transformations in the text
-    return tag_pattern.sub(transform_match, text)
+    return RenamePlan(pattern, replacement, options).get_rename(
+        file_name, directory, counters
+    )
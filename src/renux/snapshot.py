@@ -0,0 +1,200 @@
+"""Persisted listings of directories, so repeated headless runs on the same
+directory (e.g. `--dry-run`, then `--yes`) don't list it again.
+
+After a headless run lists a directory, the names in it are saved in a
+snapshot file next to the undo/redo backups. The next run uses the snapshot
+instead of listing the directory, both to plan and to check that the new
+names are free, as long as the directory's device, inode, mtime and ctime
+are unchanged: adding, removing or renaming a file in it changes them.
+
+Editing a file in place doesn't touch its directory, so no stat fields are
+kept: stat-based placeholders and metadata cache keys look each file up as
+usual. Snapshots are only used for `MAX_AGE` seconds, which covers a preview
+followed by applying it. Set `RENUX_NO_CACHE=1` (or pass `--no-cache`) to
+turn them off along with the metadata cache.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import zlib
+from typing import Collection, Mapping
+
+from renux.backup import _directory_digest, _env_limit, _get_backup_dir
+from renux.helpers.files import Entry, scan_directory
+
+SNAPSHOT_VERSION = 3
+# Seconds a snapshot is used for. Set with `RENUX_SNAPSHOT_MAX_AGE`.
+MAX_AGE = _env_limit("RENUX_SNAPSHOT_MAX_AGE", 600)
+# A directory changed this recently may still change within the same
+# timestamp tick (2s on FAT), which its mtime wouldn't show; such a listing
+# isn't saved.
+RACY_NS = 2_000_000_000
+
+# A directory's (device, inode, mtime_ns, ctime_ns).
+Stamp = tuple[int, int, int, int]
+
+_enabled = not os.environ.get("RENUX_NO_CACHE")
+
+
+def disable() -> None:
+    """Turn snapshots off for the rest of this process."""
+    global _enabled
+    _enabled = False
+
+
+def _get_snapshot_path(directory: str) -> str:
+    """Return the snapshot file path for the given directory."""
+    filename = f"snapshot_{_directory_digest(directory)}.bin"
+    return os.path.join(_get_backup_dir(), filename)
+
+
+def _stamp(directory: str) -> Stamp:
+    st = os.stat(directory)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns
+
+
+def is_current(directory: str, stamp: Stamp) -> bool:
+    """Whether `directory` still has the `stamp` it had when listed."""
+    try:
+        return _stamp(directory) == stamp
+    except OSError:
+        return False
+
+
+class SnapshotEntry:
+    """A file from a snapshot, standing in for its `os.DirEntry`. Its stat
+    result is looked up (once) when first asked for: the snapshot only vouches
+    for the names, as editing a file doesn't change its directory's stamp."""
+
+    __slots__ = ("name", "path", "_stat")
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat: os.stat_result | None = None
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+class Snapshot:
+    """The files in `directory` (a table of name -> entry, sorted as
+    `scan_files` sorts them), the `others` names in it that aren't files, and
+    the directory's `stamp` when they were listed. `saved` says whether they
+    came from (or went to) the snapshot file."""
+
+    def __init__(
+        self,
+        directory: str,
+        stamp: Stamp,
+        entries: Mapping[str, Entry],
+        others: Collection[str] = (),
+        saved: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.stamp = stamp
+        self.entries = entries
+        self.others = others
+        self.saved = saved
+
+    @classmethod
+    def scan(cls, directory: str) -> Snapshot:
+        """List `directory`, from its snapshot file if that's still valid."""
+        snapshot = cls.load(directory)
+        if snapshot is None:
+            # Stamped before listing, so a change made meanwhile shows up.
+            stamp = _stamp(directory)
+            snapshot = cls(directory, stamp, *scan_directory(directory))
+        return snapshot
+
+    @classmethod
+    def load(cls, directory: str) -> Snapshot | None:
+        """Return the saved snapshot of `directory` if the directory hasn't
+        changed since and it isn't older than `MAX_AGE`."""
+        if not _enabled:
+            return None
+        try:
+            with open(_get_snapshot_path(directory), "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+            if (
+                header["version"] != SNAPSHOT_VERSION
+                or header["directory"] != directory
+                or tuple(header["stamp"]) != _stamp(directory)
+                or time.time_ns() - header["taken"] > MAX_AGE * 10**9
+            ):
+                return None
+            others = frozenset(header["others"])
+            blob = zlib.decompress(data)
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            return None
+
+        names = [os.fsdecode(name) for name in blob.split(b"\0")] if blob else []
+        entries = {name: SnapshotEntry(directory, name) for name in names}
+        return cls(directory, _stamp_of(header), entries, others, saved=True)
+
+    def existing(self) -> set[str] | None:
+        """Every name in the directory, to check new names against (see
+        `renux.renamer.apply_renames`) while `is_current` holds for `stamp`.
+        None if the listing was never saved: one taken while the directory
+        was changing can't be told apart by its stamp."""
+        if not self.saved:
+            return None
+        return {*self.entries, *self.others}
+
+    def save(self) -> None:
+        """Write the snapshot file, if these files were just listed. Failures
+        are ignored: the snapshot only saves time."""
+        taken = time.time_ns()
+        if not _enabled or self.saved:
+            return
+        if max(self.stamp[2], self.stamp[3]) + RACY_NS > taken:
+            return
+
+        names = b"\0".join(os.fsencode(name) for name in self.entries)
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "directory": self.directory,
+            "stamp": list(self.stamp),
+            "taken": taken,
+            "others": sorted(self.others),
+        }
+
+        path = _get_snapshot_path(self.directory)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(json.dumps(header).encode() + b"\n")
+                f.write(zlib.compress(names, 1))
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        self.saved = True
+        _remove_old_snapshots(os.path.dirname(path), MAX_AGE)
+
+
+def _stamp_of(header: dict) -> Stamp:
+    dev, ino, mtime_ns, ctime_ns = header["stamp"]
+    return dev, ino, mtime_ns, ctime_ns
+
+
+def _remove_old_snapshots(backup_dir: str, max_age: float) -> None:
+    """Delete snapshot files too old to be used."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(backup_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.startswith("snapshot_"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
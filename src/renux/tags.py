@@ -10,16 +10,15 @@ To add a new filter, call `register_filter`. To add a new placeholder, call `reg
 from __future__ import annotations
 
 import datetime
+import functools
 import os
 import re
 from dataclasses import dataclass, field
 from typing import Callable
 
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
-from PIL import Image
 from slugify import slugify
 
+from renux.facts import EXIF, IMAGE, STAT, VIDEO, FileFacts
 from renux.helpers.casing import (
     to_camel_case,
     to_kebab_case,
@@ -45,6 +44,9 @@ class PlaceholderContext:
     counter: int | None
     file_name: str
     directory: str
+    # Metadata shared by every placeholder resolved for this file. Created on
+    # demand (see `_facts`) when the caller doesn't supply one.
+    facts: FileFacts | None = None
 
 
 @dataclass(frozen=True)
@@ -65,6 +67,12 @@ class Placeholder:
     stateful: bool = False
     initial: Callable[[str], int] | None = None
     advance: Callable[[str, int], int] | None = None
+    # Constant placeholders (e.g. now) don't depend on the file being renamed,
+    # so they're resolved once per rename batch rather than once per file.
+    constant: bool = False
+    # The `renux.facts` extractor family this placeholder reads (e.g. "image"),
+    # or None if it doesn't read the file at all.
+    extractor: str | None = None
 
 
 FILTERS: dict[str, Filter] = {}
@@ -103,6 +111,8 @@ def register_placeholder(
     stateful: bool = False,
     initial: Callable[[str], int] | None = None,
     advance: Callable[[str, int], int] | None = None,
+    constant: bool = False,
+    extractor: str | None = None,
 ) -> None:
     """Register a `{name}` / `{name(args)}` value provider."""
     PLACEHOLDERS[name] = Placeholder(
@@ -116,11 +126,25 @@ def register_placeholder(
         stateful=stateful,
         initial=initial,
         advance=advance,
+        constant=constant,
+        extractor=extractor,
     )
 
 
 # Filters
 
+# Filter functions must be module-level (no lambdas) so a compiled template
+# can be pickled and sent to worker processes (see `RenamePlan.get_renames`).
+
+
+def _reverse(s: str) -> str:
+    return s[::-1]
+
+
+def _length(s: str) -> str:
+    return str(len(s))
+
+
 register_filter(
     "slugify",
     slugify,
@@ -157,16 +181,17 @@ register_filter(
 )
 register_filter(
     "reverse",
-    lambda s: s[::-1],
+    _reverse,
     'Reverse the string (e.g. "Hello World" → "dlroW olleH")',
 )
 register_filter("strip", str.strip, "Remove leading and trailing whitespace")
-register_filter("len", lambda s: str(len(s)), "Get the length of the string")
+register_filter("len", _length, "Get the length of the string")
 
 
 # Placeholders
 
 
+@functools.lru_cache(maxsize=None)
 def _parse_counter_args(args: str) -> tuple[int, int, int]:
     match = re.match(r"\s*(\d+)?\s*,?\s*(\d+)?\s*,?\s*(\d+)?\s*", args)
     start = int(match.group(1)) if match and match.group(1) else 1
@@ -223,15 +248,19 @@ def _resolve_now(ctx: PlaceholderContext) -> str:
     return datetime.datetime.now().strftime(ctx.args or "%Y-%m-%d")
 
 
+def _facts(ctx: PlaceholderContext) -> FileFacts:
+    if ctx.facts is not None:
+        return ctx.facts
+    return FileFacts(os.path.join(ctx.directory, ctx.file_name))
+
+
 def _resolve_created_at(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    timestamp = os.path.getctime(path)
+    timestamp = _facts(ctx).stat["ctime"]
     return datetime.datetime.fromtimestamp(timestamp).strftime(ctx.args or "%Y-%m-%d")
 
 
 def _resolve_modified_at(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    timestamp = os.path.getmtime(path)
+    timestamp = _facts(ctx).stat["mtime"]
     return datetime.datetime.fromtimestamp(timestamp).strftime(ctx.args or "%Y-%m-%d")
 
 
@@ -243,6 +272,7 @@ register_placeholder(
     category="Date",
     example="{now(%Y)}",
     arg_suggestions=DATE_FORMAT_SUGGESTIONS,
+    constant=True,
 )
 register_placeholder(
     "created_at",
@@ -251,6 +281,7 @@ register_placeholder(
     syntax="{created_at(<format>)}",
     category="Date",
     arg_suggestions=DATE_FORMAT_SUGGESTIONS,
+    extractor=STAT,
 )
 register_placeholder(
     "modified_at",
@@ -259,6 +290,7 @@ register_placeholder(
     syntax="{modified_at(<format>)}",
     category="Date",
     arg_suggestions=DATE_FORMAT_SUGGESTIONS,
+    extractor=STAT,
 )
 
 
@@ -268,8 +300,7 @@ SIZE_UNIT_SUGGESTIONS = ["", "(b)", "(kb)", "(mb)", "(gb)"]
 
 
 def _resolve_size(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    size_bytes = os.path.getsize(path)
+    size_bytes = _facts(ctx).stat["size"]
 
     unit = ctx.args.strip().lower()
     if unit not in _SIZE_UNITS:
@@ -295,19 +326,16 @@ register_placeholder(
     category="File",
     example="{size(mb)}",
     arg_suggestions=SIZE_UNIT_SUGGESTIONS,
+    extractor=STAT,
 )
 
 
 def _resolve_width(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    with Image.open(path) as img:
-        return str(img.width)
+    return str(_facts(ctx).image["width"])
 
 
 def _resolve_height(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    with Image.open(path) as img:
-        return str(img.height)
+    return str(_facts(ctx).image["height"])
 
 
 register_placeholder(
@@ -316,6 +344,7 @@ register_placeholder(
     "The image's width in pixels.",
     syntax="{width}",
     category="Image",
+    extractor=IMAGE,
 )
 register_placeholder(
     "height",
@@ -323,41 +352,33 @@ register_placeholder(
     "The image's height in pixels.",
     syntax="{height}",
     category="Image",
+    extractor=IMAGE,
 )
 
 
-_EXIF_MAKE = 271
-_EXIF_MODEL = 272
-_EXIF_SUB_IFD = 0x8769
-_EXIF_DATETIME_ORIGINAL = 36867
-
-
 def _resolve_taken_at(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    with Image.open(path) as img:
-        raw = img.getexif().get_ifd(_EXIF_SUB_IFD).get(_EXIF_DATETIME_ORIGINAL)
+    facts = _facts(ctx)
+    raw = facts.exif["datetime_original"]
     if not raw:
-        raise ValueError(f"No EXIF capture date found: {path}")
+        raise ValueError(f"No EXIF capture date found: {facts.path}")
     taken_at = datetime.datetime.strptime(raw, "%Y:%m:%d %H:%M:%S")
     return taken_at.strftime(ctx.args or "%Y-%m-%d")
 
 
 def _resolve_camera_make(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    with Image.open(path) as img:
-        make = img.getexif().get(_EXIF_MAKE)
+    facts = _facts(ctx)
+    make = facts.exif["make"]
     if not make:
-        raise ValueError(f"No EXIF camera make found: {path}")
-    return str(make).strip()
+        raise ValueError(f"No EXIF camera make found: {facts.path}")
+    return make
 
 
 def _resolve_camera_model(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    with Image.open(path) as img:
-        model = img.getexif().get(_EXIF_MODEL)
+    facts = _facts(ctx)
+    model = facts.exif["model"]
     if not model:
-        raise ValueError(f"No EXIF camera model found: {path}")
-    return str(model).strip()
+        raise ValueError(f"No EXIF camera model found: {facts.path}")
+    return model
 
 
 register_placeholder(
@@ -369,6 +390,7 @@ register_placeholder(
     category="Image",
     example="{taken_at(%Y)}",
     arg_suggestions=DATE_FORMAT_SUGGESTIONS,
+    extractor=EXIF,
 )
 register_placeholder(
     "camera_make",
@@ -377,6 +399,7 @@ register_placeholder(
     "without EXIF data.",
     syntax="{camera_make}",
     category="Image",
+    extractor=EXIF,
 )
 register_placeholder(
     "camera_model",
@@ -385,23 +408,10 @@ register_placeholder(
     "without EXIF data.",
     syntax="{camera_model}",
     category="Image",
+    extractor=EXIF,
 )
 
 
-_EXIF_GPS_IFD = 0x8825
-_GPS_LAT_REF = 1
-_GPS_LAT = 2
-_GPS_LON_REF = 3
-_GPS_LON = 4
-_GPS_ALT_REF = 5
-_GPS_ALT = 6
-
-
-def _gps_ifd(path: str):
-    with Image.open(path) as img:
-        return img.getexif().get_ifd(_EXIF_GPS_IFD)
-
-
 def _dms_to_decimal(dms: tuple[float, float, float], ref: str) -> float:
     degrees, minutes, seconds = dms
     decimal = float(degrees) + float(minutes) / 60 + float(seconds) / 3600
@@ -409,32 +419,30 @@ def _dms_to_decimal(dms: tuple[float, float, float], ref: str) -> float:
 
 
 def _resolve_latitude(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    gps = _gps_ifd(path)
-    lat, lat_ref = gps.get(_GPS_LAT), gps.get(_GPS_LAT_REF)
+    facts = _facts(ctx)
+    gps = facts.exif
+    lat, lat_ref = gps["lat"], gps["lat_ref"]
     if not lat or not lat_ref:
-        raise ValueError(f"No EXIF GPS latitude found: {path}")
+        raise ValueError(f"No EXIF GPS latitude found: {facts.path}")
     return f"{_dms_to_decimal(lat, lat_ref):.6f}"
 
 
 def _resolve_longitude(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    gps = _gps_ifd(path)
-    lon, lon_ref = gps.get(_GPS_LON), gps.get(_GPS_LON_REF)
+    facts = _facts(ctx)
+    gps = facts.exif
+    lon, lon_ref = gps["lon"], gps["lon_ref"]
     if not lon or not lon_ref:
-        raise ValueError(f"No EXIF GPS longitude found: {path}")
+        raise ValueError(f"No EXIF GPS longitude found: {facts.path}")
     return f"{_dms_to_decimal(lon, lon_ref):.6f}"
 
 
 def _resolve_altitude(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    gps = _gps_ifd(path)
-    alt = gps.get(_GPS_ALT)
+    facts = _facts(ctx)
+    gps = facts.exif
+    alt = gps["alt"]
     if alt is None:
-        raise ValueError(f"No EXIF GPS altitude found: {path}")
-    alt_ref = gps.get(_GPS_ALT_REF, 0)
-    below_sea_level = alt_ref == 1 or alt_ref == b"\x01"
-    value = -float(alt) if below_sea_level else float(alt)
+        raise ValueError(f"No EXIF GPS altitude found: {facts.path}")
+    value = -alt if gps["alt_ref"] == 1 else alt
     return f"{value:.1f}m"
 
 
@@ -445,6 +453,7 @@ register_placeholder(
     "without GPS EXIF data.",
     syntax="{latitude}",
     category="Location",
+    extractor=EXIF,
 )
 register_placeholder(
     "longitude",
@@ -453,6 +462,7 @@ register_placeholder(
     "without GPS EXIF data.",
     syntax="{longitude}",
     category="Location",
+    extractor=EXIF,
 )
 register_placeholder(
     "altitude",
@@ -461,48 +471,40 @@ register_placeholder(
     "GPS EXIF data.",
     syntax="{altitude}",
     category="Location",
+    extractor=EXIF,
 )
 
 
-def _video_metadata(path: str):
-    parser = createParser(path)
-    if not parser:
-        raise ValueError(f"Unable to parse video file: {path}")
-    with parser:
-        metadata = extractMetadata(parser)
-    if not metadata:
-        raise ValueError(f"No metadata found for video file: {path}")
-    return metadata
-
-
 def _resolve_video_width(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    metadata = _video_metadata(path)
-    return str(metadata.get("width"))
+    facts = _facts(ctx)
+    width = facts.video["width"]
+    if width is None:
+        raise ValueError(f"No width found for video file: {facts.path}")
+    return str(width)
 
 
 def _resolve_video_height(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    metadata = _video_metadata(path)
-    return str(metadata.get("height"))
+    facts = _facts(ctx)
+    height = facts.video["height"]
+    if height is None:
+        raise ValueError(f"No height found for video file: {facts.path}")
+    return str(height)
 
 
 def _resolve_frame_rate(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    metadata = _video_metadata(path)
-    fps = metadata.get("frame_rate")
+    facts = _facts(ctx)
+    fps = facts.video["frame_rate"]
     if fps is None:
-        raise ValueError(f"No frame rate found for video file: {path}")
+        raise ValueError(f"No frame rate found for video file: {facts.path}")
     return f"{fps:.2f}".rstrip("0").rstrip(".") + "fps"
 
 
 def _resolve_duration(ctx: PlaceholderContext) -> str:
-    path = os.path.join(ctx.directory, ctx.file_name)
-    metadata = _video_metadata(path)
-    duration = metadata.get("duration")
+    facts = _facts(ctx)
+    duration = facts.video["duration"]
     if duration is None:
-        raise ValueError(f"No duration found for video file: {path}")
-    return f"{int(duration.total_seconds())}s"
+        raise ValueError(f"No duration found for video file: {facts.path}")
+    return f"{int(duration)}s"
 
 
 register_placeholder(
@@ -511,6 +513,7 @@ register_placeholder(
     "The video's width in pixels.",
     syntax="{video_width}",
     category="Video",
+    extractor=VIDEO,
 )
 register_placeholder(
     "video_height",
@@ -518,13 +521,16 @@ register_placeholder(
     "The video's height in pixels.",
     syntax="{video_height}",
     category="Video",
+    extractor=VIDEO,
 )
 register_placeholder(
     "frame_rate",
     _resolve_frame_rate,
-    "The video's frame rate. Not available for all containers (e.g. MP4).",
+    "The video's frame rate. Not available for Matroska/WebM files that "
+    "don't state a default frame duration.",
     syntax="{frame_rate}",
     category="Video",
+    extractor=VIDEO,
 )
 register_placeholder(
     "duration",
@@ -532,4 +538,5 @@ register_placeholder(
     "The video's duration, in seconds.",
     syntax="{duration}",
     category="Video",
+    extractor=VIDEO,
 )
@@ -0,0 +1,302 @@
+"""Compiler for the replacement side of a rename rule.
+
+A replacement like `IMG_{\\1|upper}_{counter(1,1,3)}` is parsed once into a
+flat list of segments (literal text, regex group references, placeholders,
+and `{...|filter}` chains). Building a file's new name is then a single pass
+over those segments, with no re-scanning of intermediate strings, so a
+placeholder's output or a matched group is never re-read as tag syntax.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Union
+
+from renux.facts import FileFacts
+from renux.tags import FILTERS, PLACEHOLDERS, Placeholder, PlaceholderContext
+
+# Escapes `re.sub` accepts in a replacement string, besides group references.
+_ESCAPES = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+}
+_DIGITS = "0123456789"
+_OCTDIGITS = "01234567"
+_FILTER_CHAIN = re.compile(r"((?:\|[^{}|]+)+)\}")
+
+
+@dataclass(frozen=True)
+class Literal:
+    """Text copied as-is into the new name."""
+
+    text: str
+
+    def render(self, match: re.Match, values: list[str]) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class GroupRef:
+    """A `\\1` / `\\g<name>` reference to a group of the search pattern."""
+
+    group: int | str
+
+    def render(self, match: re.Match, values: list[str]) -> str:
+        return match.group(self.group) or ""
+
+
+@dataclass(frozen=True)
+class PlaceholderRef:
+    """A `{name(args)|filter...}` placeholder occurrence. Its value is
+    resolved once per file into `values[slot]`."""
+
+    placeholder: Placeholder
+    args: str
+    filters: tuple[Callable[[str], str], ...]
+    slot: int
+
+    def render(self, match: re.Match, values: list[str]) -> str:
+        return values[self.slot]
+
+
+@dataclass(frozen=True)
+class FilterChain:
+    """A `{...|filter1|filter2}` transformation of the enclosed segments."""
+
+    segments: tuple[Segment, ...]
+    filters: tuple[Callable[[str], str], ...]
+
+    def render(self, match: re.Match, values: list[str]) -> str:
+        value = "".join(segment.render(match, values) for segment in self.segments)
+        return _apply(self.filters, value)
+
+
+Segment = Union[Literal, GroupRef, PlaceholderRef, FilterChain]
+
+
+def _apply(filters: tuple[Callable[[str], str], ...], value: str) -> str:
+    for func in filters:
+        value = func(value)
+    return value
+
+
+def _compile_filters(filter_chain: str) -> tuple[Callable[[str], str], ...]:
+    """Look up a `|filter1|filter2` chain, skipping unknown filter names."""
+    return tuple(
+        FILTERS[name].func for name in filter_chain.split("|") if name in FILTERS
+    )
+
+
+class Template:
+    """A replacement string compiled against the search regex it will be
+    expanded with (`regex` is used to validate group references)."""
+
+    def __init__(self, source: str, regex: re.Pattern | None = None) -> None:
+        self._source = source
+        self._regex = regex
+        names = "|".join(re.escape(name) for name in PLACEHOLDERS)
+        self._placeholder_pattern = (
+            re.compile(rf"\{{({names})(?:\((.*?)\))?((?:\|[^{{}}]+)*)\}}")
+            if names
+            else re.compile(r"(?!)")  # never matches
+        )
+
+        self.placeholders: list[PlaceholderRef] = []
+        segments, _ = self._parse(0, in_tag=False)
+        self.segments = tuple(_merge_literals(segments))
+
+        # Stateful placeholders (e.g. counter), in the order they appear.
+        self.stateful = [p for p in self.placeholders if p.placeholder.stateful]
+        self.stateless = [p for p in self.placeholders if not p.placeholder.stateful]
+        # Extractor families (see `renux.facts`) the placeholders read from.
+        self.extractors = {
+            p.placeholder.extractor for p in self.stateless if p.placeholder.extractor
+        }
+
+    # Parsing
+
+    def _parse(self, pos: int, *, in_tag: bool) -> tuple[list[Segment], int]:
+        """Parse segments from `pos`. Inside a `{...|filter}` tag, stop at the
+        first `|`, `}` or unparseable `{` and let the caller decide."""
+        source = self._source
+        segments: list[Segment] = []
+        while pos < len(source):
+            char = source[pos]
+            if char == "\\":
+                segment, pos = self._parse_escape(pos)
+                segments.append(segment)
+            elif char == "{":
+                tag = self._parse_tag(pos)
+                if tag is None:
+                    if in_tag:
+                        break
+                    segments.append(Literal("{"))
+                    pos += 1
+                else:
+                    segment, pos = tag
+                    segments.append(segment)
+            elif in_tag and char in "|}":
+                break
+            else:
+                end = pos + 1
+                while end < len(source) and source[end] not in "\\{|}":
+                    end += 1
+                segments.append(Literal(source[pos:end]))
+                pos = end
+        return segments, pos
+
+    def _parse_tag(self, pos: int) -> tuple[Segment, int] | None:
+        """Parse a placeholder or `{...|filter}` tag starting at `pos`, or
+        return None if there isn't one."""
+        match = self._placeholder_pattern.match(self._source, pos)
+        if match:
+            return self._placeholder(match), match.end()
+
+        # Remember placeholders found inside a chain that turns out not to be one.
+        n_placeholders = len(self.placeholders)
+        inner, end = self._parse(pos + 1, in_tag=True)
+        chain = _FILTER_CHAIN.match(self._source, end) if inner else None
+        if chain is None:
+            del self.placeholders[n_placeholders:]
+            return None
+        segments = tuple(_merge_literals(inner))
+        return FilterChain(segments, _compile_filters(chain.group(1))), chain.end()
+
+    def _placeholder(self, match: re.Match) -> Segment:
+        name, args, filter_chain = (
+            match.group(1),
+            match.group(2) or "",
+            match.group(3) or "",
+        )
+        placeholder = PLACEHOLDERS[name]
+        filters = _compile_filters(filter_chain)
+
+        # Constant placeholders (e.g. now) are the same for every file.
+        if placeholder.constant:
+            ctx = PlaceholderContext(
+                args=args, counter=None, file_name="", directory=""
+            )
+            return Literal(_apply(filters, placeholder.resolve(ctx)))
+
+        ref = PlaceholderRef(placeholder, args, filters, len(self.placeholders))
+        self.placeholders.append(ref)
+        return ref
+
+    def _parse_escape(self, pos: int) -> tuple[Segment, int]:
+        """Parse a backslash escape the way `re.sub` reads its replacement."""
+        source = self._source
+        if pos + 1 >= len(source):
+            raise re.error("bad escape (end of pattern)", source, pos)
+        char = source[pos + 1]
+
+        if char == "g":
+            if not source.startswith("<", pos + 2):
+                raise re.error("missing <", source, pos + 2)
+            close = source.find(">", pos + 3)
+            if close == -1:
+                raise re.error("missing >, unterminated name", source, pos + 3)
+            name = source[pos + 3 : close]
+            group: int | str = int(name) if name.isdecimal() else name
+            return self._group(group, pos), close + 1
+
+        if char == "0":
+            end = pos + 2
+            while end < len(source) and end < pos + 4 and source[end] in _OCTDIGITS:
+                end += 1
+            return Literal(chr(int(source[pos + 1 : end], 8))), end
+
+        if char in _DIGITS:
+            digits = source[pos + 1 : pos + 4]
+            if len(digits) == 3 and all(d in _OCTDIGITS for d in digits):
+                value = int(digits, 8)
+                if value > 0o377:
+                    raise re.error(f"octal escape value \\{digits} outside of range")
+                return Literal(chr(value)), pos + 4
+            two_digits = pos + 2 < len(source) and source[pos + 2] in _DIGITS
+            end = pos + 3 if two_digits else pos + 2
+            return self._group(int(source[pos + 1 : end]), pos), end
+
+        if char in _ESCAPES:
+            return Literal(_ESCAPES[char]), pos + 2
+        if char.isascii() and char.isalpha():
+            raise re.error(f"bad escape \\{char}", source, pos)
+        return Literal(source[pos : pos + 2]), pos + 2
+
+    def _group(self, group: int | str, pos: int) -> GroupRef:
+        """Validate a group reference against the search regex."""
+        regex = self._regex
+        if regex is not None:
+            if isinstance(group, str):
+                if not group.isidentifier():
+                    raise re.error(f"bad character in group name {group!r}")
+                if group not in regex.groupindex:
+                    raise re.error(f"unknown group name {group!r}", self._source, pos)
+            elif group > regex.groups:
+                raise re.error(f"invalid group reference {group}", self._source, pos)
+        return GroupRef(group)
+
+    # Rendering
+
+    def resolve(
+        self,
+        file_name: str,
+        directory: str,
+        counters: list[int],
+        facts: FileFacts | None = None,
+    ) -> list[str]:
+        """Resolve every placeholder for one file, advancing `counters`.
+        `facts` may be passed in if the file's metadata was already loaded."""
+        values = [""] * len(self.placeholders)
+
+        for index, ref in enumerate(self.stateful):
+            placeholder = ref.placeholder
+            current = counters[index]
+            ctx = PlaceholderContext(
+                args=ref.args, counter=current, file_name="", directory=""
+            )
+            values[ref.slot] = _apply(ref.filters, placeholder.resolve(ctx))
+            counters[index] = (
+                placeholder.advance(ref.args, current)
+                if placeholder.advance
+                else current
+            )
+
+        # One set of facts per file, shared by all of its placeholders.
+        if facts is None and self.stateless:
+            facts = FileFacts(os.path.join(directory, file_name))
+        for ref in self.stateless:
+            ctx = PlaceholderContext(
+                args=ref.args,
+                counter=None,
+                file_name=file_name,
+                directory=directory,
+                facts=facts,
+            )
+            values[ref.slot] = _apply(ref.filters, ref.placeholder.resolve(ctx))
+
+        return values
+
+    def render(self, match: re.Match, values: list[str]) -> str:
+        """Build the replacement text for one match."""
+        return "".join(segment.render(match, values) for segment in self.segments)
+
+
+def _merge_literals(segments: list[Segment]) -> list[Segment]:
+    """Join adjacent literal segments into one."""
+    merged: list[Segment] = []
+    for segment in segments:
+        if merged and isinstance(segment, Literal):
+            last = merged[-1]
+            if isinstance(last, Literal):
+                merged[-1] = Literal(last.text + segment.text)
+                continue
+        merged.append(segment)
+    return merged
@@ -0,0 +1,26 @@
+import pytest
+
+import renux.cache
+import renux.journal
+import renux.snapshot
+
+
+@pytest.fixture(autouse=True)
+def no_metadata_cache(monkeypatch):
+    """Keep tests from reading or writing the user's metadata cache."""
+    monkeypatch.setattr(renux.cache, "_enabled", False)
+    monkeypatch.setattr(renux.cache, "_cache", None)
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots(monkeypatch):
+    """Keep tests from reading or writing directory snapshots."""
+    monkeypatch.setattr(renux.snapshot, "_enabled", False)
+
+
+@pytest.fixture(autouse=True)
+def journal_dir(tmp_path_factory, monkeypatch):
+    """Keep tests' rename journals out of the user's state directory."""
+    journal_dir = tmp_path_factory.mktemp("journals")
+    monkeypatch.setattr(renux.journal, "_get_journal_dir", lambda: str(journal_dir))
+    return journal_dir
@@ -1,18 +1,225 @@
+import asyncio
+import os
 from unittest.mock import MagicMock, patch
 
+from textual.widgets import Checkbox, Input, Static
+
 from renux.app import RenameApp
+from renux.components import Preview, RenameList
+from renux.components.preview import DEBOUNCE
+from renux.constants import DEFAULT_OPTIONS
+from renux.renamer import iter_renames
 
 
+@patch.object(RenameApp, "load_files")
 @patch("renux.app.get_renames")
 @patch("renux.app.apply_renames")
-def test_action_save_success(mock_apply, mock_get):
+def test_action_save_reuses_preview(mock_apply, mock_get, mock_load):
     app = RenameApp(".", "foo", "bar", {})
+    app.files = ["foo.txt", "other.txt"]
     app.query_one = MagicMock()
-    app.query_one.return_value = MagicMock()
-
-    mock_get.return_value = [("file1.txt", "file2.txt")]
+    app.query_one.return_value.cached_rows.return_value = (
+        ["foo.txt", "other.txt"],
+        ["bar.txt", "other.txt"],
+    )
 
     app.action_save()
 
-    mock_apply.assert_called_once()
-    app.query_one.assert_called()
+    mock_get.assert_not_called()
+    mock_apply.assert_called_once_with(
+        ".", [("foo.txt", "bar.txt"), ("other.txt", "other.txt")], 1
+    )
+
+
+def test_action_save_plans_in_background_when_counters_skip_files(tmp_path):
+    for name in ["foo1.txt", "foo2.txt", "foo3.txt"]:
+        (tmp_path / name).touch()
+
+    async def run() -> None:
+        app = RenameApp(
+            str(tmp_path), "foo.", "bar{counter}", DEFAULT_OPTIONS.copy(), "foo2*"
+        )
+        async with app.run_test() as pilot:
+            while app.scanning:
+                await pilot.pause(0.01)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            app.action_save()
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            # The excluded file doesn't take a number, unlike in the preview.
+            assert sorted(os.listdir(tmp_path)) == ["bar1.txt", "bar2.txt", "foo2.txt"]
+
+    asyncio.run(run())
+
+
+def test_preview_computed_in_background(tmp_path):
+    for name in ["foo1.txt", "foo2.txt"]:
+        (tmp_path / name).touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "bar", DEFAULT_OPTIONS.copy())
+        async with app.run_test() as pilot:
+            title = app.query_one("#preview-title", Static)
+            rows = app.query_one("#preview-list", RenameList)
+
+            app.query_one("#replacement", Input).value = "baz"
+            await pilot.pause()
+            assert "computing" in str(title.render())
+
+            await pilot.pause(DEBOUNCE * 2)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert "computing" not in str(title.render())
+            assert [rows.row_text(i) for i in range(rows.row_count)] == [
+                "▣ foo1.txt → baz1.txt",
+                "▣ foo2.txt → baz2.txt",
+            ]
+
+    asyncio.run(run())
+
+
+def test_preview_list_renders_only_visible_rows(tmp_path):
+    for i in range(500):
+        (tmp_path / f"foo{i:03}.txt").touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "bar", DEFAULT_OPTIONS.copy())
+        async with app.run_test(size=(100, 30)) as pilot:
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            rows = app.query_one("#preview-list", RenameList)
+            assert rows.row_count == 500
+
+            with patch.object(rows, "_row_text", wraps=rows._row_text) as row_text:
+                rows.focus()
+                await pilot.press("end")
+                await pilot.pause()
+            assert rows.cursor == 499
+            assert rows.scroll_offset.y > 0
+            # Only the rows in view were styled for the redraw.
+            assert 0 < row_text.call_count <= rows.size.height * 2
+
+            await pilot.press("enter")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert app.disabled_files == {"foo499.txt"}
+            assert rows.row_text(499).startswith("▢")
+
+    asyncio.run(run())
+
+
+def test_preview_reuses_cached_results(tmp_path):
+    for name in ["foo1.txt", "foo2.txt"]:
+        (tmp_path / name).touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "bar", DEFAULT_OPTIONS.copy())
+        async with app.run_test() as pilot:
+            preview = app.query_one(Preview)
+            rows = app.query_one("#preview-list", RenameList)
+
+            async def set_replacement(value: str) -> None:
+                app.query_one("#replacement", Input).value = value
+                await pilot.pause(DEBOUNCE * 2)
+                await app.workers.wait_for_complete()
+                await pilot.pause()
+
+            await set_replacement("baz")
+            with patch(
+                "renux.components.preview.iter_renames", wraps=iter_renames
+            ) as mock_iter:
+                await set_replacement("bar")
+                assert rows.row_text(0) == "▣ foo1.txt → bar1.txt"
+                mock_iter.assert_not_called()
+
+                # A rescanned file list invalidates the cache.
+                app.load_files()
+                while app.scanning:
+                    await pilot.pause(0.01)
+                await app.workers.wait_for_complete()
+                await pilot.pause()
+                mock_iter.assert_called_once()
+
+    asyncio.run(run())
+
+
+def test_toggle_and_exclude_only_restyle(tmp_path):
+    for name in ["foo1.txt", "foo2.txt"]:
+        (tmp_path / name).touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "{size}", DEFAULT_OPTIONS.copy())
+        async with app.run_test() as pilot:
+            await app.workers.wait_for_complete()
+            await pilot.pause(DEBOUNCE * 2)
+            rows = app.query_one("#preview-list", RenameList)
+
+            with (
+                patch("renux.components.preview.iter_renames") as mock_iter,
+                patch("renux.facts.os.stat") as mock_stat,
+            ):
+                rows.focus()
+                await pilot.press("down", "enter")
+                app.query_one("#exclude", Input).value = "foo1.txt"
+                await pilot.pause(DEBOUNCE * 2)
+
+            mock_iter.assert_not_called()
+            mock_stat.assert_not_called()
+            assert app.disabled_files == {"foo2.txt"}
+            assert rows.row_text(0).startswith("▢ foo1.txt")
+            assert rows.row_text(1).startswith("▢ foo2.txt")
+
+    asyncio.run(run())
+
+
+def test_startup_streams_files_and_defers_history(tmp_path):
+    for name in ["foo2.txt", "Foo1.txt", "foo3.txt"]:
+        (tmp_path / name).touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "bar", DEFAULT_OPTIONS.copy())
+        assert app.files == []  # nothing is read before the first frame
+        async with app.run_test() as pilot:
+            while app.scanning:
+                await pilot.pause(0.01)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            assert app.files == ["Foo1.txt", "foo2.txt", "foo3.txt"]
+            rows = app.query_one("#preview-list", RenameList)
+            assert rows.row_text(1) == "▣ foo2.txt → bar2.txt"
+            assert app._history is None  # undo history not loaded yet
+            app.action_undo()
+            assert app._history is not None
+
+    asyncio.run(run())
+
+
+def test_recursive_checkbox_lists_subdirectories(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "foo1.txt").touch()
+    (tmp_path / "sub" / "foo2.txt").touch()
+
+    async def run() -> None:
+        app = RenameApp(str(tmp_path), "foo", "bar", DEFAULT_OPTIONS.copy())
+        async with app.run_test() as pilot:
+            while app.scanning:
+                await pilot.pause(0.01)
+            assert app.files == ["foo1.txt"]
+
+            app.query_one("#recursive", Checkbox).value = True
+            await pilot.pause()
+            while app.scanning:
+                await pilot.pause(0.01)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            assert app.files == ["foo1.txt", os.path.join("sub", "foo2.txt")]
+            app.action_save()
+            assert (tmp_path / "sub" / "bar2.txt").exists()
+            assert len(app.undo_stack) == 1
+
+    asyncio.run(run())
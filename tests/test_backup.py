@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+import renux.backup
+from renux.backup import (
+    HistoryStore,
+    _decode,
+    _encode,
+    _get_backup_path,
+    disk_usage,
+    load_backup,
+    record_operation,
+)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(renux.backup, "_store", store)
+    yield store
+    store.close()
+
+
+def test_stacks_read_and_write_in_place(store, tmp_path):
+    undo_stack, redo_stack = load_backup(str(tmp_path))
+    assert not undo_stack and len(redo_stack) == 0
+
+    undo_stack.append([("a", "b")])
+    undo_stack.append([("c", "d"), ("e", "f")])
+
+    undo_again, _ = load_backup(str(tmp_path))
+    assert len(undo_again) == 2
+    assert undo_again[-1] == [("c", "d"), ("e", "f")]
+    assert undo_again[0] == [("a", "b")]
+    assert list(undo_again) == [[("a", "b")], [("c", "d"), ("e", "f")]]
+    with pytest.raises(IndexError):
+        undo_again[2]
+
+    assert undo_stack.pop() == [("c", "d"), ("e", "f")]
+    assert len(undo_again) == 1
+    undo_stack.clear()
+    with pytest.raises(IndexError):
+        undo_stack.pop()
+
+
+def test_stacks_are_per_directory(store, tmp_path):
+    undo_a, _ = load_backup(str(tmp_path / "a"))
+    undo_b, _ = load_backup(str(tmp_path / "b"))
+    undo_a.append([("x", "y")])
+    assert len(undo_a) == 1 and len(undo_b) == 0
+
+
+def test_json_backup_is_migrated(store, tmp_path):
+    directory = str(tmp_path)
+    path = _get_backup_path(directory)
+    with open(path, "w") as f:
+        json.dump({"undo_stack": [[["a", "b"]], [["b", "c"]]], "redo_stack": []}, f)
+
+    undo_stack, redo_stack = load_backup(directory)
+
+    assert list(undo_stack) == [[("a", "b")], [("b", "c")]]
+    assert len(redo_stack) == 0
+    with pytest.raises(FileNotFoundError):
+        open(path)
+
+
+def test_encode_round_trip():
+    renames = [
+        ("IMG_0001.jpg", "Trip_0001.jpg"),
+        ("IMG_0002.jpg", "Trip_0002.jpg"),
+        ("line\nbreak.txt", "tab\tname.txt"),
+        ("caf\u00e9.txt", "\U0001f600.txt"),
+        ("bad\udcff.bin", "fixed.bin"),  # undecodable byte from os.listdir
+        ("", "x"),
+    ]
+    assert _decode(_encode(renames)) == renames
+    assert _decode(_encode([])) == []
+
+
+def test_encoded_record_is_compact():
+    renames = [(f"IMG_{i:06}.jpg", f"Holiday_{i:06}.jpg") for i in range(300)]
+    assert len(_encode(renames)) < 2000
+
+
+def test_json_rows_still_load(store, tmp_path):
+    # Rows written before operations were encoded hold a JSON list.
+    store._conn.execute(
+        "INSERT INTO history (directory, stack, renames) VALUES (?, ?, ?)",
+        (str(tmp_path), "undo", '[["a", "b"]]'),
+    )
+    undo_stack, _ = load_backup(str(tmp_path))
+    assert undo_stack[-1] == [("a", "b")]
+
+
+def test_record_operation(store, tmp_path):
+    undo_stack, redo_stack = load_backup(str(tmp_path))
+    record_operation(
+        undo_stack, redo_stack, "apply", [("a", "b"), ("x", "x"), ("c", "d")]
+    )
+    assert list(undo_stack) == [[("a", "b"), ("c", "d")]]
+
+    # A partly failed undo: what was undone moves to redo, the rest stays.
+    record_operation(undo_stack, redo_stack, "undo", [("b", "a")], [("d", "c")])
+    assert list(undo_stack) == [[("c", "d")]]
+    assert list(redo_stack) == [[("a", "b")]]
+
+    record_operation(undo_stack, redo_stack, "redo", [("a", "b")])
+    assert list(undo_stack) == [[("c", "d")], [("a", "b")]]
+    assert len(redo_stack) == 0
+
+
+def test_evict_per_directory(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"), max_operations=2)
+    for i in range(4):
+        store.push("dir", "undo", [(f"a{i}", f"b{i}")])
+    store.push("other", "undo", [("x", "y")])
+
+    store.evict("dir")  # (pushing starts the same pass in the background)
+    assert list(store.iter("dir", "undo")) == [[("a2", "b2")], [("a3", "b3")]]
+    assert store.count("other", "undo") == 1
+    store.close()
+
+
+def test_evict_by_age_and_size(tmp_path):
+    store = HistoryStore(
+        str(tmp_path / "history.sqlite3"), max_age_days=1, max_bytes=1000
+    )
+    store.push("old", "undo", [("a", "b")])
+    store._evicting.join()
+    store._conn.execute("UPDATE history SET created = ?", (time.time() - 2 * 86400,))
+    for i in range(10):
+        store.push("big", "undo", [(os.urandom(40).hex(), os.urandom(40).hex())])
+    legacy = tmp_path / "backup_0123456789abcdef.json"
+    legacy.write_text("{}")
+    os.utime(legacy, (0, 0))
+
+    store.evict()
+
+    assert store.count("old", "undo") == 0
+    assert 0 < store.count("big", "undo") < 10
+    assert sum(entry.size for entry in store.stats()) <= 1000
+    assert not legacy.exists()
+    store.close()
+
+
+def test_stats(store, tmp_path):
+    store.push("a", "undo", [("x", "y")])
+    store.push("a", "redo", [("y", "x")])
+    store.push("b", "undo", [("p", "q")])
+
+    stats = {entry.directory: entry for entry in store.stats()}
+
+    assert (stats["a"].undo, stats["a"].redo) == (1, 1)
+    assert (stats["b"].undo, stats["b"].redo) == (1, 0)
+    assert stats["a"].size > 0
+
+
+def test_rows_from_older_versions_are_filled_in(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    HistoryStore(path).close()
+    # A renux from before history limits, sharing the upgraded database.
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "INSERT INTO history (directory, stack, renames) VALUES (?, ?, ?)",
+            ("dir", "undo", '[["a", "b"]]'),
+        )
+    conn.close()
+
+    store = HistoryStore(path, max_age_days=1)
+    (entry,) = store.stats()
+    assert entry.size == len('[["a", "b"]]')
+    assert entry.newest is not None
+    store.close()
+
+
+def test_evict_shrinks_database(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = HistoryStore(path, max_operations=0, max_bytes=0, max_age_days=0)
+    for _ in range(50):
+        store.push("dir", "undo", [(os.urandom(1000).hex(), "b")])
+    store.close()
+    size = os.path.getsize(path)
+
+    store = HistoryStore(path, max_operations=1)
+    assert store.evict("dir") == 49
+
+    assert os.path.getsize(path) < size / 4
+    store.close()
+
+
+def test_disk_usage(tmp_path):
+    (tmp_path / "history.sqlite3").write_bytes(b"x" * 10)
+    (tmp_path / "history.sqlite3-wal").write_bytes(b"x" * 5)
+    (tmp_path / "snapshot_1.bin").write_bytes(b"x" * 3)
+    (tmp_path / "other").write_bytes(b"x")
+
+    usage = disk_usage(
+        str(tmp_path),
+        {"history": "history.sqlite3", "snapshots": "snapshot_", "cache": "m"},
+    )
+
+    assert usage == {"history": 15, "snapshots": 3}
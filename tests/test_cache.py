@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+import renux.cache
+from renux.cache import MetadataCache
+from renux.facts import IMAGE, FileFacts
+
+KEY = (1, 2, 3, 4)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_put_get(cache):
+    assert cache.get(KEY, IMAGE) is None
+    cache.put(KEY, IMAGE, value={"width": 2, "height": 1})
+    assert cache.get(KEY, IMAGE) == ({"width": 2, "height": 1}, None)
+    assert cache.get(KEY, "video") is None
+    assert cache.get((1, 2, 3, 5), IMAGE) is None
+
+
+def test_errors_are_cached(cache):
+    cache.put(KEY, IMAGE, error="not an image")
+    assert cache.get(KEY, IMAGE) == (None, "not an image")
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "metadata.sqlite3")
+    first = MetadataCache(path)
+    first.put(KEY, IMAGE, value={"width": 2, "height": 1})
+    first.close()
+
+    second = MetadataCache(path)
+    assert second.get(KEY, IMAGE) == ({"width": 2, "height": 1}, None)
+    second.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"), max_entries=10)
+    for i in range(10):
+        cache.put((i, 0, 0, 0), IMAGE, value=i)
+        cache.flush()
+    cache.get((0, 0, 0, 0), IMAGE)  # make the oldest entry recently used
+    cache.flush()
+
+    cache.put((10, 0, 0, 0), IMAGE, value=10)
+    cache.flush()
+
+    assert cache.get((0, 0, 0, 0), IMAGE) == (0, None)
+    assert cache.get((10, 0, 0, 0), IMAGE) == (10, None)
+    assert cache.get((1, 0, 0, 0), IMAGE) is None
+    cache.close()
+
+
+def test_replacing_an_entry_does_not_evict(tmp_path):
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"), max_entries=10)
+    for i in range(10):
+        cache.put((i, 0, 0, 0), IMAGE, value=i)
+    cache.flush()
+    for _ in range(3):
+        cache.put((0, 0, 0, 0), IMAGE, error="changed")
+        cache.flush()
+
+    assert all(cache.get((i, 0, 0, 0), IMAGE) is not None for i in range(10))
+    cache.close()
+
+
+def test_unserializable_value_is_skipped(cache):
+    cache.put(KEY, IMAGE, value={"width": object()})
+    assert cache.get(KEY, IMAGE) is None
+
+
+def test_get_cache_opens_one_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(renux.cache, "_enabled", True)
+    monkeypatch.setattr(renux.cache, "_get_backup_dir", lambda: str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        caches = set(pool.map(lambda _: renux.cache.get_cache(), range(32)))
+    assert len(caches) == 1
+    renux.cache._cache.close()
+
+
+def test_file_facts_use_cache(tmp_path, cache):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"not really an image")
+    extract = mock.Mock(return_value={"width": 2, "height": 1})
+
+    with (
+        mock.patch("renux.facts.get_cache", return_value=cache),
+        mock.patch.dict("renux.facts.EXTRACTORS", {IMAGE: extract}),
+    ):
+        assert FileFacts(str(path)).image == {"width": 2, "height": 1}
+        assert FileFacts(str(path)).image == {"width": 2, "height": 1}
+        assert extract.call_count == 1
+
+        # A modified file is a new cache entry.
+        path.write_bytes(b"a different, longer non-image")
+        FileFacts(str(path)).image
+        assert extract.call_count == 2
+
+
+def test_file_facts_cache_errors(tmp_path, cache):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"not an image")
+    extract = mock.Mock(side_effect=ValueError("not an image"))
+
+    with (
+        mock.patch("renux.facts.get_cache", return_value=cache),
+        mock.patch.dict("renux.facts.EXTRACTORS", {IMAGE: extract}),
+    ):
+        for _ in range(2):
+            with pytest.raises(ValueError, match="not an image"):
+                FileFacts(str(path)).image
+        assert extract.call_count == 1
+
+        # I/O errors aren't about the file's content, so they're retried.
+        extract.side_effect = PermissionError(13, "Permission denied")
+        path.write_bytes(b"still not an image")
+        for _ in range(2):
+            with pytest.raises(PermissionError):
+                FileFacts(str(path)).image
+        assert extract.call_count == 3
+
+
+def test_get_cache_disabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(renux.cache, "_get_backup_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(renux.cache, "_enabled", True)
+    cache = renux.cache.get_cache()
+    assert cache is not None
+    assert renux.cache.get_cache() is cache
+    cache.close()
+
+    renux.cache.disable()
+    assert renux.cache.get_cache() is None
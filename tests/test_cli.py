@@ -1,5 +1,6 @@
 import os
 
+from renux.backup import load_backup
 from renux.cli import main
 
 
@@ -19,6 +20,18 @@ def test_headless_dry_run_does_not_rename(tmp_path, monkeypatch):
     assert sorted(os.listdir(tmp_path)) == ["foo1.txt", "foo2.txt"]
 
 
+def test_headless_dry_run_prints_each_change(tmp_path, monkeypatch, capsys):
+    _make_files(tmp_path, ["foo1.txt", "foo2.txt", "other.txt"])
+
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), "foo", "bar", "--dry-run"])
+
+    main()
+
+    out = capsys.readouterr().out
+    assert "foo1.txt -> bar1.txt" in out and "foo2.txt -> bar2.txt" in out
+    assert "other.txt" not in out
+
+
 def test_headless_yes_applies_rename(tmp_path, monkeypatch):
     """`--yes` should apply the rename immediately without opening the TUI."""
     _make_files(tmp_path, ["foo1.txt", "foo2.txt"])
@@ -139,3 +152,88 @@ def test_headless_exclude_negation_reincludes_file(tmp_path, monkeypatch):
     main()
 
     assert sorted(os.listdir(tmp_path)) == ["bar1.txt", "foo2.txt", "foo3.txt"]
+
+
+def test_headless_invalid_pattern(tmp_path, monkeypatch, capsys):
+    """An invalid regex should be reported without touching any files."""
+    _make_files(tmp_path, ["foo1.txt"])
+
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), "(", "bar", "--yes"])
+
+    main()
+
+    assert "Invalid pattern" in capsys.readouterr().out
+    assert sorted(os.listdir(tmp_path)) == ["foo1.txt"]
+
+
+def test_headless_jobs(tmp_path, monkeypatch):
+    """`--jobs` should give the same result as a sequential run."""
+    _make_files(tmp_path, ["foo1.txt", "foo2.txt"])
+
+    monkeypatch.setattr(
+        "sys.argv",
+        ["renux", str(tmp_path), "foo", "{counter}_{size}", "--yes", "--jobs", "4"],
+    )
+    main()
+
+    assert sorted(os.listdir(tmp_path)) == ["1_0b1.txt", "2_0b2.txt"]
+
+
+def test_headless_refuses_duplicates(tmp_path, monkeypatch):
+    """Headless mode shouldn't rename anything if two files would collide."""
+    _make_files(tmp_path, ["foo1.txt", "foo2.txt"])
+
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), r"foo\d", "same", "--yes"])
+    main()
+
+    assert sorted(os.listdir(tmp_path)) == ["foo1.txt", "foo2.txt"]
+
+
+def test_headless_undo_record_has_only_changes(tmp_path, monkeypatch):
+    """The undo record of a headless rename holds just the changed pairs."""
+    _make_files(tmp_path, ["foo1.txt", "other.txt"])
+
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), "foo", "bar", "--yes"])
+    main()
+
+    undo_stack, _ = load_backup(str(tmp_path))
+    assert [list(map(tuple, record)) for record in undo_stack] == [
+        [("foo1.txt", "bar1.txt")]
+    ]
+
+
+def test_history_stats(tmp_path, monkeypatch, capsys):
+    """`--history-stats` lists the directories with history and the limits."""
+    _make_files(tmp_path, ["foo1.txt"])
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), "foo", "bar", "--yes"])
+    main()
+    capsys.readouterr()
+
+    monkeypatch.setattr("sys.argv", ["renux", "--history-stats"])
+    main()
+
+    out = capsys.readouterr().out
+    assert "operations per directory" in out
+    assert "operation(s) in" in out
+    assert "undo history" in out
+
+
+def test_headless_recursive_is_one_undo(tmp_path, monkeypatch):
+    """`--recursive` should rename within each subdirectory as one batch."""
+    (tmp_path / "sub" / "deep").mkdir(parents=True)
+    _make_files(tmp_path, ["foo1.txt", "sub/foo2.txt", "sub/deep/foo3.txt"])
+
+    argv = ["renux", str(tmp_path), "foo.", "bar{counter}", "-R", "--yes"]
+    monkeypatch.setattr("sys.argv", [*argv, "--per-directory-counters"])
+    main()
+    assert sorted(os.listdir(tmp_path)) == ["bar1.txt", "sub"]
+    assert sorted(os.listdir(tmp_path / "sub")) == ["bar1.txt", "deep"]
+    assert os.listdir(tmp_path / "sub" / "deep") == ["bar1.txt"]
+
+    undo_stack, _ = load_backup(str(tmp_path))
+    assert len(undo_stack) == 1
+
+    monkeypatch.setattr("sys.argv", ["renux", str(tmp_path), "--undo"])
+    main()
+    assert (tmp_path / "sub" / "deep" / "foo3.txt").exists()
+    assert (tmp_path / "foo1.txt").exists()
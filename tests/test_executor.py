@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from renux.executor import RenameExecutor, schedule
+
+
+def test_schedule_independent():
+    chains, cycles = schedule([("a", "x"), ("b", "y"), ("c", "c")])
+    assert chains == [[("a", "x")], [("b", "y")]]
+    assert cycles == []
+
+
+def test_schedule_chain():
+    # Shifting numbers up by one: each rename waits for the one above it.
+    renames = [("1", "2"), ("2", "3"), ("3", "4")]
+    chains, cycles = schedule(renames)
+    assert chains == [[("3", "4"), ("2", "3"), ("1", "2")]]
+    assert cycles == []
+
+
+def test_schedule_cycle():
+    renames = [("a", "b"), ("b", "c"), ("c", "a"), ("d", "e")]
+    chains, cycles = schedule(renames)
+    assert chains == [[("d", "e")]]
+    assert cycles == [[("a", "b"), ("b", "c"), ("c", "a")]]
+
+
+def test_schedule_duplicate_targets():
+    with pytest.raises(ValueError):
+        schedule([("a", "b"), ("b", "a"), ("c", "a")])
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_executor_runs_chains_in_order(tmp_path, workers):
+    for i in range(1, 51):
+        (tmp_path / f"{i}.txt").write_text(str(i))
+    renames = [(f"{i}.txt", f"{i + 1}.txt") for i in range(1, 51)]
+
+    with RenameExecutor(str(tmp_path), workers) as executor:
+        executor.run(renames)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{i}.txt" for i in range(2, 52))
+    assert all((tmp_path / f"{i + 1}.txt").read_text() == str(i) for i in range(1, 51))
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_executor_runs_cycles(tmp_path, workers):
+    for name in "abcxy":
+        (tmp_path / name).write_text(name)
+    renames = [("a", "b"), ("b", "c"), ("c", "a"), ("x", "y"), ("y", "x")]
+
+    with RenameExecutor(str(tmp_path), workers) as executor:
+        assert executor.run(renames) == []
+
+    assert sorted(os.listdir(tmp_path)) == list("abcxy")
+    assert [(tmp_path / name).read_text() for name in "abcxy"] == list("cabyx")
+
+
+def test_executor_reports_failures(tmp_path):
+    for name in ("1", "2", "3"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / "4").mkdir()
+    (tmp_path / "4" / "keep").write_text("")
+    # "3 → 4" fails (a non-empty directory is in the way), so "2 → 3" and
+    # "1 → 2" can't happen either.
+    renames = [("1", "2"), ("2", "3"), ("3", "4")]
+
+    with RenameExecutor(str(tmp_path), 1) as executor:
+        failures = executor.run(renames)
+
+    assert [pair for pair, _ in failures] == [("3", "4"), ("2", "3"), ("1", "2")]
+    assert all(isinstance(error, OSError) for _, error in failures)
+    assert [(tmp_path / name).read_text() for name in ("1", "2", "3")] == [
+        "1",
+        "2",
+        "3",
+    ]
+
+
+def test_executor_rolls_back_failed_cycle(tmp_path, monkeypatch):
+    for name in "ab":
+        (tmp_path / name).write_text(name)
+    executor = RenameExecutor(str(tmp_path))
+    rename = executor.rename
+
+    def flaky(old, new):
+        if (old, new) == ("b", "a"):
+            raise PermissionError(13, "Permission denied", old)
+        rename(old, new)
+
+    monkeypatch.setattr(executor, "rename", flaky)
+    with executor:
+        failures = executor.run([("a", "b"), ("b", "a")])
+
+    assert len(failures) == 2
+    assert sorted(os.listdir(tmp_path)) == ["a", "b"]
+    assert (tmp_path / "a").read_text() == "a"
@@ -0,0 +1,141 @@
+import struct
+
+import pytest
+from PIL import Image
+
+from renux.helpers.exif import read_exif
+
+
+def _exif(*, gps: bool = True) -> Image.Exif:
+    exif = Image.new("RGB", (1, 1)).getexif()
+    exif[271] = "Canon"
+    exif[272] = "EOS R5"
+    exif.get_ifd(0x8769)[36867] = "2021:05:04 10:20:30"
+    if gps:
+        gps_ifd = exif.get_ifd(0x8825)
+        gps_ifd[1] = "N"
+        gps_ifd[2] = (40.0, 26.0, 46.0)
+        gps_ifd[3] = "W"
+        gps_ifd[4] = (79.0, 58.0, 56.0)
+        gps_ifd[5] = 1
+        gps_ifd[6] = 12.5
+    return exif
+
+
+EXPECTED = {
+    "make": "Canon",
+    "model": "EOS R5",
+    "datetime_original": "2021:05:04 10:20:30",
+    "lat": (40.0, 26.0, 46.0),
+    "lat_ref": "N",
+    "lon": (79.0, 58.0, 56.0),
+    "lon_ref": "W",
+    "alt": 12.5,
+    "alt_ref": 1,
+}
+
+
+@pytest.mark.parametrize("file_name", ["img.jpg", "img.png", "img.webp"])
+def test_read_exif(tmp_path, file_name):
+    path = tmp_path / file_name
+    Image.new("RGB", (10, 10)).save(path, exif=_exif())
+
+    assert read_exif(str(path)) == EXPECTED
+
+
+def test_read_exif_tiff(tmp_path):
+    """TIFF-based files (including most camera RAW formats) are read as-is."""
+    path = tmp_path / "img.dng"
+    path.write_bytes(_exif().tobytes()[6:])  # strip the "Exif\0\0" prefix
+
+    assert read_exif(str(path)) == EXPECTED
+
+
+def test_read_exif_heif(tmp_path):
+    """The `Exif` item of a HEIF `meta` box is located through `iinf`/`iloc`."""
+    tiff = _exif().tobytes()[6:]
+    item = struct.pack(">I", 6) + b"Exif\0\0" + tiff
+
+    def box(box_type: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+    ftyp = box(b"ftyp", b"heic\0\0\0\0mif1heic")
+    infe = box(b"infe", b"\x02\0\0\0" + struct.pack(">HH", 1, 0) + b"Exif\0")
+    iinf = box(b"iinf", b"\0\0\0\0" + struct.pack(">H", 1) + infe)
+
+    def iloc(offset: int) -> bytes:
+        entry = struct.pack(">HHHII", 1, 0, 1, offset, len(item))
+        return box(b"iloc", b"\0\0\0\0" + b"\x44\x00" + struct.pack(">H", 1) + entry)
+
+    meta_size = len(box(b"meta", b"\0\0\0\0" + iinf + iloc(0)))
+    offset = len(ftyp) + meta_size + 8  # past the mdat header
+    meta = box(b"meta", b"\0\0\0\0" + iinf + iloc(offset))
+    path = tmp_path / "img.heic"
+    path.write_bytes(ftyp + meta + box(b"mdat", item))
+
+    assert read_exif(str(path)) == EXPECTED
+
+
+def _tiff_with_exif_pointer(type_: int, count: int) -> bytes:
+    """A little-endian TIFF whose IFD0 has a Make and an Exif IFD pointer of
+    the given type and count, pointing at an IFD with DateTimeOriginal."""
+    date = b"2021:05:04 10:20:30\0"
+    make_at, exif_at = 38, 44
+    date_at = exif_at + 18
+    pointer = struct.pack("<I", exif_at)
+    if count > 1:
+        pointer = struct.pack("<I", date_at + len(date))  # offset to the values
+    ifd0 = struct.pack("<H", 2)
+    ifd0 += struct.pack("<HHII", 271, 2, 6, make_at)
+    ifd0 += struct.pack("<HHI", 0x8769, type_, count) + pointer
+    ifd0 += struct.pack("<I", 0)
+    exif = struct.pack("<H", 1) + struct.pack("<HHII", 36867, 2, len(date), date_at)
+    exif += struct.pack("<I", 0)
+    values = struct.pack("<II", exif_at, exif_at)
+    return b"II*\0" + struct.pack("<I", 8) + ifd0 + b"Canon\0" + exif + date + values
+
+
+def test_read_exif_ifd_typed_pointer(tmp_path):
+    path = tmp_path / "img.dng"
+    path.write_bytes(_tiff_with_exif_pointer(13, 1))
+
+    fields = read_exif(str(path))
+    assert fields is not None
+    assert fields["make"] == "Canon"
+    assert fields["datetime_original"] == "2021:05:04 10:20:30"
+
+
+def test_read_exif_malformed_pointer(tmp_path):
+    path = tmp_path / "img.dng"
+    path.write_bytes(_tiff_with_exif_pointer(4, 2))
+
+    fields = read_exif(str(path))
+    assert fields is not None
+    assert fields["make"] == "Canon"
+    assert fields["datetime_original"] is None
+
+
+def test_read_exif_without_gps(tmp_path):
+    path = tmp_path / "img.jpg"
+    Image.new("RGB", (10, 10)).save(path, exif=_exif(gps=False))
+
+    fields = read_exif(str(path))
+    assert fields is not None
+    assert fields["make"] == "Canon"
+    assert fields["lat"] is None and fields["alt"] is None
+
+
+def test_read_exif_no_exif(tmp_path):
+    path = tmp_path / "img.jpg"
+    Image.new("RGB", (10, 10)).save(path)
+
+    fields = read_exif(str(path))
+    assert fields is not None
+    assert set(fields.values()) == {None, 0}
+
+
+def test_read_exif_unknown_format(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not an image")
+
+    assert read_exif(str(path)) is None
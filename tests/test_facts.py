@@ -0,0 +1,72 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from renux.facts import IMAGE, STAT, VIDEO, FileFacts
+from renux.helpers.imagesize import image_size
+from renux.renamer import get_renames
+
+
+def test_file_facts_extracts_each_family_once():
+    extract_image = MagicMock(return_value={"width": 1, "height": 2})
+    with patch.dict("renux.facts.EXTRACTORS", {IMAGE: extract_image}):
+        facts = FileFacts("img.png")
+        assert facts.image["width"] == 1
+        assert facts.image["height"] == 2
+
+    extract_image.assert_called_once_with("img.png")
+
+
+def test_file_facts_remembers_errors():
+    extract_stat = MagicMock(side_effect=FileNotFoundError("gone"))
+    with patch.dict("renux.facts.EXTRACTORS", {STAT: extract_stat}):
+        facts = FileFacts("gone.txt")
+        for _ in range(2):
+            with pytest.raises(FileNotFoundError):
+                facts.stat
+
+    extract_stat.assert_called_once()
+
+
+def test_placeholders_share_facts_per_file(tmp_path):
+    Image.new("RGB", (32, 16)).save(tmp_path / "a.png")
+    Image.new("RGB", (8, 4)).save(tmp_path / "b.png")
+
+    with patch("renux.facts.image_size", wraps=image_size) as mock_probe:
+        renames = get_renames(
+            ["a.png", "b.png"], str(tmp_path), "^", "{width}x{height}_", {}
+        )
+
+    assert renames == [("a.png", "32x16_a.png"), ("b.png", "8x4_b.png")]
+    assert mock_probe.call_count == 2
+
+
+def test_file_facts_prefetch():
+    extract_image = MagicMock(return_value={"width": 1, "height": 2})
+    extract_video = MagicMock(side_effect=ValueError("not a video"))
+    with patch.dict(
+        "renux.facts.EXTRACTORS", {IMAGE: extract_image, VIDEO: extract_video}
+    ):
+        facts = FileFacts("img.png")
+        facts.prefetch({IMAGE, VIDEO})
+        extract_image.assert_called_once()
+        extract_video.assert_called_once()
+
+        assert facts.image["width"] == 1
+        with pytest.raises(ValueError):
+            facts.video
+        extract_image.assert_called_once()
+        extract_video.assert_called_once()
+
+
+def test_file_facts_stat_from_dir_entry(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"abc")
+    entry = next(os.scandir(tmp_path))
+
+    with patch("renux.facts.os.stat") as mock_stat:
+        facts = FileFacts(entry.path, entry)
+        assert facts.stat["size"] == 3
+
+    mock_stat.assert_not_called()
@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from renux.helpers.files import (
+    ExcludeMatcher,
+    filter_excluded,
+    is_excluded,
+    list_existing,
+    scan_batches,
+    scan_directory,
+    scan_files,
+    sort_entries,
+    sort_paths,
+    walk_files,
+)
+
+
+@pytest.mark.parametrize(
+    "patterns, excluded",
+    [
+        ([], set()),
+        (["README.md"], {"README.md"}),
+        (["*.log"], {"a.log", "b.log"}),
+        (["*.log", "!a.log"], {"b.log"}),
+        (["*.log", "!a.log", "a.*"], {"a.log", "a.txt", "b.log"}),
+        (["!a.log", "*.log"], {"a.log", "b.log"}),
+        (["*.txt", "README.md", "!a.*"], {"README.md"}),
+        (["[ab].log"], {"a.log", "b.log"}),
+    ],
+)
+def test_exclude_matcher(patterns, excluded):
+    files = ["README.md", "a.log", "a.txt", "b.log"]
+    matcher = ExcludeMatcher(patterns)
+
+    assert {f for f in files if matcher.matches(f)} == excluded
+    assert {f for f in files if is_excluded(f, patterns)} == excluded
+    assert filter_excluded(files, patterns) == [f for f in files if f not in excluded]
+
+
+def test_exclude_matcher_from_string():
+    matcher = ExcludeMatcher.from_string(" *.log, !a.log ,, ")
+    assert matcher.matches("b.log")
+    assert not matcher.matches("a.log")
+    assert not ExcludeMatcher.from_string("").matches("a.log")
+
+
+def test_exclude_matcher_paths():
+    matcher = ExcludeMatcher(["drafts/*", "*.log", "!keep/a.log"])
+    assert matcher.matches(os.path.join("drafts", "a.txt"))
+    assert matcher.matches(os.path.join("x", "y", "b.log"))  # by file name
+    assert not matcher.matches(os.path.join("keep", "a.log"))
+    assert not matcher.matches(os.path.join("x", "a.txt"))
+
+
+def test_scan_batches(tmp_path):
+    for name in ["b.txt", "A.txt", "c.txt", "d.txt", "e.txt"]:
+        (tmp_path / name).touch()
+    (tmp_path / "subdir").mkdir()
+
+    batches = list(scan_batches(str(tmp_path), batch_size=2, interval=60))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    entries = sort_entries(entry for batch in batches for entry in batch)
+    assert list(entries) == ["A.txt", "b.txt", "c.txt", "d.txt", "e.txt"]
+    assert list(entries) == list(scan_files(str(tmp_path)))
+
+
+def test_scan_directory(tmp_path):
+    for name in ["b.txt", "A.txt"]:
+        (tmp_path / name).touch()
+    (tmp_path / "subdir").mkdir()
+    (tmp_path / "broken").symlink_to(tmp_path / "missing")
+
+    files, others = scan_directory(str(tmp_path))
+
+    assert list(files) == ["A.txt", "b.txt"]
+    assert others == {"subdir", "broken"}
+
+
+def test_walk_files(tmp_path):
+    for path in ["b.txt", "A.txt", "sub/c.txt", "sub/B.txt", "sub/deep/d.txt"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+    (tmp_path / "empty").mkdir()
+    os.symlink(tmp_path / "sub", tmp_path / "link")
+
+    entries = walk_files(str(tmp_path), workers=4)
+
+    sub = os.path.join("sub", "")
+    assert list(entries) == [
+        "A.txt",
+        "b.txt",
+        sub + "B.txt",
+        sub + "c.txt",
+        os.path.join("sub", "deep", "d.txt"),
+    ]
+    assert entries[sub + "c.txt"].name == "c.txt"
+
+
+def test_sort_paths_keeps_directories_differing_in_case_apart():
+    paths = [
+        os.path.join(subdir, name)
+        for subdir, name in [("A", "f1"), ("a", "f2"), ("A", "f3"), ("a", "f4")]
+    ]
+
+    ordered = list(sort_paths((path, None) for path in paths))
+
+    assert ordered == [paths[0], paths[2], paths[1], paths[3]]
+
+
+def test_walk_files_missing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        walk_files(str(tmp_path / "missing"))
+
+
+def test_list_existing(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a").touch()
+    (tmp_path / "sub" / "b").touch()
+    paths = ["x", os.path.join("sub", "y"), os.path.join("gone", "z")]
+
+    assert list_existing(str(tmp_path), paths) == {
+        "a",
+        "sub",
+        os.path.join("sub", "b"),
+    }
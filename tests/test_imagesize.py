@@ -0,0 +1,74 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from renux.helpers.imagesize import HeadReader, image_size, iter_boxes
+
+
+@pytest.mark.parametrize(
+    "file_name, save_kwargs",
+    [
+        ("img.png", {}),
+        ("img.jpg", {}),
+        ("progressive.jpg", {"progressive": True}),
+        ("img.gif", {}),
+        ("img.bmp", {}),
+        ("lossy.webp", {}),
+        ("lossless.webp", {"lossless": True}),
+        ("img.tif", {}),
+    ],
+)
+def test_image_size_matches_pillow(tmp_path, file_name, save_kwargs):
+    path = tmp_path / file_name
+    Image.new("RGB", (321, 123)).save(path, **save_kwargs)
+
+    assert image_size(str(path)) == (321, 123)
+
+
+def test_image_size_jpeg_with_large_exif(tmp_path):
+    """The frame header can sit well past the first read, behind EXIF data."""
+    path = tmp_path / "exif.jpg"
+    img = Image.new("RGB", (640, 480))
+    exif = img.getexif()
+    exif[0x010E] = "x" * 20000  # ImageDescription
+    img.save(path, exif=exif)
+
+    assert image_size(str(path)) == (640, 480)
+
+
+def test_image_size_big_endian_tiff(tmp_path):
+    path = tmp_path / "mm.tif"
+    ifd = struct.pack(">H", 2)
+    ifd += struct.pack(">HHIHH", 256, 3, 1, 50, 0)  # ImageWidth, SHORT
+    ifd += struct.pack(">HHII", 257, 4, 1, 70)  # ImageLength, LONG
+    path.write_bytes(b"MM\x00*" + struct.pack(">I", 8) + ifd + b"\x00" * 4)
+
+    assert image_size(str(path)) == (50, 70)
+
+
+def test_image_size_webp_extended(tmp_path):
+    path = tmp_path / "alpha.webp"
+    Image.new("RGBA", (50, 70)).save(path, exif=b"Exif\x00\x00")
+
+    assert image_size(str(path)) == (50, 70)
+
+
+def test_image_size_unknown_format(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not an image")
+
+    assert image_size(str(path)) is None
+
+
+def test_iter_boxes():
+    data = struct.pack(">I4s", 12, b"ftyp") + b"heic"
+    data += struct.pack(">I4sQ", 1, b"mdat", 24) + b"payload!"
+    data += struct.pack(">I4s", 1, b"meta") + b"\0\0"  # 64-bit size cut off
+    r = HeadReader(io.BytesIO(data), data)
+
+    assert list(iter_boxes(r, 0, len(data))) == [
+        (b"ftyp", 8, 12),
+        (b"mdat", 28, 36),
+    ]
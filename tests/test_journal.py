@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from renux.backup import load_backup
+from renux.cli import run_resume, run_rollback
+from renux.executor import cycle_steps
+from renux.journal import Journal, _get_journal_dir, has_journal
+from renux.renamer import apply_renames
+
+
+def make_files(directory, names):
+    for name in names:
+        (directory / name).write_text(name)
+
+
+def contents(directory):
+    return {name: (directory / name).read_text() for name in os.listdir(directory)}
+
+
+def interrupt(directory, renames, steps, recorded=0):
+    """Journal `renames` as an "apply" batch, carry out the first `steps`
+    renames (as (old, new) pairs) and record the first `recorded` of them,
+    then stop as if killed."""
+    journal = Journal.create(str(directory), "apply", renames)
+    for i, (old, new) in enumerate(steps):
+        os.rename(directory / old, directory / new)
+        if i < recorded:
+            journal.done((old, new))
+    journal.close()
+    return journal
+
+
+@pytest.fixture
+def shift(tmp_path):
+    """Files 1..5 being shifted up by one."""
+    make_files(tmp_path, [str(i) for i in range(1, 6)])
+    yield tmp_path, [(str(i), str(i + 1)) for i in range(1, 6)]
+    if has_journal(str(tmp_path)):
+        Journal.load(str(tmp_path)).finish()
+
+
+def test_apply_renames_removes_journal(shift):
+    directory, renames = shift
+    apply_renames(str(directory), renames)
+    assert not has_journal(str(directory))
+
+
+def test_journal_kept_when_interrupted(shift, monkeypatch):
+    directory, renames = shift
+
+    def killed(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("renux.executor.RenameExecutor.rename", killed)
+    with pytest.raises(KeyboardInterrupt):
+        apply_renames(str(directory), renames)
+
+    assert has_journal(str(directory))
+    with pytest.raises(ValueError, match="--resume"):
+        apply_renames(str(directory), renames)
+
+
+def test_recover_finds_renames_after_checkpoint(shift):
+    directory, renames = shift
+    # The chain runs from its free end: 5 → 6, 4 → 5, ...; only the first of
+    # the three renames made it into the journal.
+    steps = [("5", "6"), ("4", "5"), ("3", "4")]
+    interrupt(directory, renames, steps, recorded=1)
+
+    journal = Journal.load(str(directory))
+    applied, pending = journal.recover()
+    journal.close()
+
+    assert applied == steps
+    assert pending == [("2", "3"), ("1", "2")]
+
+
+def test_resume_finishes_and_records_batch(shift):
+    directory, renames = shift
+    interrupt(directory, renames, [("5", "6"), ("4", "5")])
+
+    run_resume(str(directory))
+
+    assert contents(directory) == {str(i + 1): str(i) for i in range(1, 6)}
+    assert not has_journal(str(directory))
+    undo_stack, _ = load_backup(str(directory))
+    assert sorted(map(tuple, undo_stack[-1])) == renames
+
+
+def test_rollback_restores_files(shift):
+    directory, renames = shift
+    interrupt(directory, renames, [("5", "6"), ("4", "5")], recorded=2)
+
+    run_rollback(str(directory))
+
+    assert contents(directory) == {str(i): str(i) for i in range(1, 6)}
+    assert not has_journal(str(directory))
+
+
+@pytest.mark.parametrize("run", [run_resume, run_rollback])
+def test_recovery_failure_is_reported(shift, monkeypatch, capsys, run):
+    directory, renames = shift
+    interrupt(directory, renames, [("5", "6")])
+
+    def failed(self):
+        raise PermissionError("Permission denied")
+
+    monkeypatch.setattr(Journal, "recover", failed)
+    run(str(directory))
+
+    assert "Couldn't recover the interrupted rename" in capsys.readouterr().out
+    assert has_journal(str(directory))
+
+
+def test_journal_dir_is_persistent_state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+    monkeypatch.setattr(os, "name", "posix")
+
+    assert _get_journal_dir() == str(tmp_path / "state" / "renux")
+    assert os.path.isdir(tmp_path / "state" / "renux")
+
+
+def test_recover_puts_back_half_done_cycle(tmp_path):
+    make_files(tmp_path, "abc")
+    renames = [("a", "b"), ("b", "c"), ("c", "a")]
+    journal = Journal.create(str(tmp_path), "apply", renames)
+    steps = cycle_steps(renames, journal.temp_name(renames[0]))
+    for old, new in steps[:2]:
+        os.rename(tmp_path / old, tmp_path / new)
+    journal.close()
+
+    applied, pending = Journal.load(str(tmp_path)).recover()
+
+    assert applied == []
+    assert pending == renames
+    assert contents(tmp_path) == {"a": "a", "b": "b", "c": "c"}
+    journal.finish()
+
+
+def test_recover_finished_cycle(tmp_path):
+    make_files(tmp_path, "ab")
+    renames = [("a", "b"), ("b", "a")]
+    journal = Journal.create(str(tmp_path), "apply", renames)
+    for old, new in cycle_steps(renames, journal.temp_name(renames[0])):
+        os.rename(tmp_path / old, tmp_path / new)
+    journal.close()  # killed before the cycle was recorded
+
+    applied, pending = Journal.load(str(tmp_path)).recover()
+
+    assert applied == renames
+    assert pending == []
+    journal.finish()
@@ -1,16 +1,16 @@
 import os
 from datetime import datetime
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
 
 from renux.renamer import (
+    RenameError,
+    RenamePlan,
     apply_renames,
-    apply_text_operations,
     get_rename,
     get_renames,
-    process_counter_placeholder,
-    process_date_placeholders,
+    iter_renames,
 )
 
 
@@ -25,8 +25,7 @@ def mock_os_functions():
         patch("os.scandir", MagicMock()) as mock_scandir,
         patch("os.rename", MagicMock()) as mock_rename,
         patch("os.path.exists", MagicMock()) as mock_exists,
-        patch("os.path.getctime", MagicMock()) as mock_getctime,
-        patch("os.path.getmtime", MagicMock()) as mock_getmtime,
+        patch("os.stat", MagicMock()) as mock_stat,
     ):
 
         # Yield the mocks so the test can access and control their behavior
@@ -35,8 +34,7 @@ def mock_os_functions():
             "scandir": mock_scandir,
             "rename": mock_rename,
             "exists": mock_exists,
-            "getctime": mock_getctime,
-            "getmtime": mock_getmtime,
+            "stat": mock_stat,
         }
 
 
@@ -50,19 +48,85 @@ def test_apply_renames(mock_os_functions):
         ("file2.txt", "newfile2.txt"),
         ("file3.txt", "newfile3.txt"),
     ]
+    mock_os_functions["exists"].return_value = False  # no interrupted batch
 
     apply_renames(
         directory=".",
         renames=renames,
     )
 
-    # Assert that each file was renamed
+    # Assert that each file was renamed, relative to the directory's fd
     mock_rename = mock_os_functions["rename"]
     for old, new in renames:
-        mock_rename.assert_any_call(
-            os.path.join(".", old),
-            os.path.join(".", new),
-        )
+        mock_rename.assert_any_call(old, new, src_dir_fd=ANY, dst_dir_fd=ANY)
+
+
+def test_apply_renames_swaps_and_shifts(tmp_path):
+    """
+    Test that swaps and shift-by-one renumbering apply in one pass.
+    """
+    for i in range(1, 6):
+        (tmp_path / f"{i}.txt").write_text(str(i))
+    (tmp_path / "a").write_text("a")
+    (tmp_path / "b").write_text("b")
+    renames = [(f"{i}.txt", f"{i + 1}.txt") for i in range(1, 6)]
+    renames += [("a", "b"), ("b", "a")]
+
+    apply_renames(str(tmp_path), renames, workers=4)
+
+    assert [(tmp_path / f"{i}.txt").read_text() for i in range(2, 7)] == list("12345")
+    assert not (tmp_path / "1.txt").exists()
+    assert (tmp_path / "a").read_text() == "b"
+    assert (tmp_path / "b").read_text() == "a"
+
+
+def test_apply_renames_in_subdirectories(tmp_path):
+    """
+    Test that renames given as relative paths (a recursive run) apply within
+    each subdirectory, including a swap and a taken target there.
+    """
+    (tmp_path / "sub").mkdir()
+    for name in ("a", "b", "c"):
+        (tmp_path / "sub" / name).write_text(name)
+    sub = lambda name: os.path.join("sub", name)  # noqa: E731
+
+    with pytest.raises(ValueError, match="already exists"):
+        apply_renames(str(tmp_path), [(sub("a"), sub("c"))])
+
+    apply_renames(str(tmp_path), [(sub("a"), sub("b")), (sub("b"), sub("a"))])
+
+    assert (tmp_path / "sub" / "a").read_text() == "b"
+    assert (tmp_path / "sub" / "b").read_text() == "a"
+    assert sorted(os.listdir(tmp_path / "sub")) == ["a", "b", "c"]
+
+
+def test_apply_renames_existing_target(tmp_path):
+    """
+    Test that a new name taken by a file that isn't renamed is refused
+    before anything is renamed.
+    """
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_text(name)
+
+    with pytest.raises(ValueError, match="c already exists"):
+        apply_renames(str(tmp_path), [("a", "x"), ("b", "c")])
+
+    assert sorted(os.listdir(tmp_path)) == ["a", "b", "c"]
+
+
+def test_apply_renames_reports_failures(tmp_path):
+    """
+    Test that renames that fail are reported along with the ones applied.
+    """
+    (tmp_path / "a").write_text("a")
+    (tmp_path / "b").write_text("b")
+
+    with pytest.raises(RenameError) as info:
+        apply_renames(str(tmp_path), [("a", "x"), ("missing", "y"), ("b", "z")])
+
+    assert info.value.applied == [("a", "x"), ("b", "z")]
+    assert info.value.failed == [("missing", "y")]
+    assert "1 file(s) couldn't be renamed" in str(info.value)
 
 
 def test_get_renames():
@@ -196,64 +260,250 @@ def test_get_rename():
         ("{filename|upper|reverse}", "EMANELIF"),
     ],
 )
-def test_apply_text_operations(replacement, expected_output):
+def test_text_operations(replacement, expected_output):
     """
-    Test the `apply_text_operations` function to ensure that
-    text transformations are applied correctly.
+    Test that `{...|filter}` tags in the replacement apply
+    text transformations correctly.
     """
-    result = apply_text_operations(replacement)
+    result = get_rename(
+        file_name="x",
+        directory=".",
+        pattern="x",
+        replacement=replacement,
+        options={"regex": False},
+    )
     assert result == expected_output
 
 
-def test_process_counter_placeholder():
+def test_text_operations_on_groups():
     """
-    Test the `process_counter_placeholder` function to ensure
-    the counter placeholders are replaced with the correct incremented value.
+    Test that filters apply to the text of a referenced group, and that
+    tag syntax in the original file name is left alone.
+    """
+    result = get_rename(
+        file_name="my file.txt",
+        directory=".",
+        pattern=r"(.+)",
+        replacement=r"{\1|kebab}",
+        options={"regex": True},
+    )
+    assert result == "my-file.txt"
+
+    result = get_rename(
+        file_name="{a|upper}x.txt",
+        directory=".",
+        pattern="x",
+        replacement="y",
+        options={"regex": False},
+    )
+    assert result == "{a|upper}y.txt"
+
+
+def test_counter_placeholders():
+    """
+    Test that counter placeholders are replaced with the correct
+    incremented value, each occurrence tracking its own sequence.
     """
     counters = [1, 2]
-    result = process_counter_placeholder(
-        "file_{counter}_{counter(1, 2, 3)}.txt", counters
+    result = get_rename(
+        "file.txt", ".", "file", "file_{counter}_{counter(1, 2, 3)}", {}, counters
     )
     assert result == "file_1_002.txt"
     assert counters == [2, 4]  # Counters should be incremented accordingly
 
-    # For file names with no counter tag
-    result2 = process_counter_placeholder("file_no_counter.txt", counters)
-    assert result2 == "file_no_counter.txt"
-    assert counters == [2, 4]
-
     # A filter chained onto a placeholder is applied to its resolved value
     counters = [1]
-    result3 = process_counter_placeholder("file_{counter(1,1,3)|upper}", counters)
-    assert result3 == "file_001"
+    result = get_rename(
+        "file", ".", "file", "file_{counter(1,1,3)|upper}", {}, counters
+    )
+    assert result == "file_001"
+
+    # Counters only advance for files that match the pattern
+    renames = get_renames(
+        ["a1.txt", "b.txt", "a2.txt"], ".", "a", "{counter(1,1,2)}_", {}
+    )
+    assert renames == [
+        ("a1.txt", "01_1.txt"),
+        ("b.txt", "b.txt"),
+        ("a2.txt", "02_2.txt"),
+    ]
 
 
-def test_process_date_placeholders(mock_os_functions):
+def test_get_renames_in_subdirectories():
     """
-    Test the `process_date_placeholders` function to ensure the correct date values
-    are inserted for placeholders like {created_at}, {modified_at}, and {now}.
+    Test that only the last component of a relative path is renamed, and
+    that counters can restart in each directory.
+    """
+    files = ["a.txt", os.path.join("x", "a.txt"), os.path.join("x", "ab.txt")]
+    files.append(os.path.join("y", "a.txt"))
+
+    renames = get_renames(files, ".", "a", "{counter}", {})
+    assert [new for _, new in renames] == [
+        "1.txt",
+        os.path.join("x", "2.txt"),
+        os.path.join("x", "3b.txt"),
+        os.path.join("y", "4.txt"),
+    ]
+
+    options = {"per_directory_counters": True}
+    renames = get_renames(files, ".", "a", "{counter}", options, processes=4)
+    assert [new for _, new in renames] == [
+        "1.txt",
+        os.path.join("x", "1.txt"),
+        os.path.join("x", "2b.txt"),
+        os.path.join("y", "1.txt"),
+    ]
+
+    # The directory in the pattern isn't matched or replaced
+    assert get_renames([os.path.join("xa", "b")], ".", "a", "z", {}) == [
+        (os.path.join("xa", "b"), os.path.join("xa", "b"))
+    ]
+
+
+def test_date_placeholders(mock_os_functions):
+    """
+    Test that the correct date values are inserted for placeholders
+    like {created_at}, {modified_at}, and {now}.
     """
     # Extract mock functions from fixture
-    mock_getctime = mock_os_functions["getctime"]
-    mock_getmtime = mock_os_functions["getmtime"]
+    mock_stat = mock_os_functions["stat"]
 
     # Set mock creation and modification times
-    mock_getctime.return_value = 1577836800  # Jan 1, 2020
-    mock_getmtime.return_value = 1609459200  # Jan 1, 2021
+    mock_stat.return_value.st_ctime = 1577836800  # Jan 1, 2020
+    mock_stat.return_value.st_mtime = 1609459200  # Jan 1, 2021
+
+    def rename(replacement: str) -> str:
+        return get_rename("file1.txt", ".", "file1", replacement, {})
 
     # Test for created_at placeholder
-    result = process_date_placeholders("{created_at(%Y-%m-%d)}", "file1.txt", ".")
-    assert result == "2020-01-01"
+    assert rename("{created_at(%Y-%m-%d)}") == "2020-01-01.txt"
 
     # Test for modified_at placeholder
-    result = process_date_placeholders("{modified_at(%Y-%m-%d)}", "file1.txt", ".")
-    assert result == "2021-01-01"
+    assert rename("{modified_at(%Y-%m-%d)}") == "2021-01-01.txt"
 
     # Test for current date (now)
     current_date = datetime.now().strftime("%Y-%m-%d")
-    result = process_date_placeholders("{now(%Y-%m-%d)}", "file1.txt", ".")
-    assert result == current_date
+    assert rename("{now(%Y-%m-%d)}") == f"{current_date}.txt"
 
     # A filter chained onto a placeholder is applied to its resolved value
-    result = process_date_placeholders("{created_at(%Y-%m-%d)|upper}", "file1.txt", ".")
-    assert result == "2020-01-01"
+    assert rename("{created_at(%Y-%m-%d)|upper}") == "2020-01-01.txt"
+
+
+def test_rename_plan_resolves_constant_placeholders_once():
+    """
+    Test that constant placeholders (e.g. {now}) are resolved once per plan,
+    so every file in a batch gets the same value.
+    """
+    with patch("renux.tags.datetime") as mock_datetime:
+        mock_datetime.datetime.now.return_value = datetime(2024, 1, 2)
+        plan = RenamePlan("file", "{now(%Y)}_{counter}", {"regex": False})
+
+    renames = plan.get_renames(["file1.txt", "file2.txt", "other.txt"], ".")
+
+    assert mock_datetime.datetime.now.call_count == 1
+    assert renames == [
+        ("file1.txt", "2024_11.txt"),
+        ("file2.txt", "2024_22.txt"),
+        ("other.txt", "other.txt"),
+    ]
+
+
+def test_get_renames_invalid_pattern():
+    """
+    Test that an invalid regex yields no renames instead of raising.
+    """
+    assert get_renames(["file1.txt"], ".", "(", "x", {"regex": True}) == []
+
+
+def test_get_renames_with_workers(tmp_path):
+    """
+    Test that prefetching metadata on a thread pool gives the same renames,
+    in the same order and with the same counters, as a sequential run.
+    """
+    files = [f"file{i:02}.txt" for i in range(40)] + ["other.txt", "file99.txt"]
+    for i, name in enumerate(files[:-1]):
+        (tmp_path / name).write_bytes(b"x" * i)
+
+    plan = RenamePlan(r"file(\d+)", r"{counter}_{size}_\1", {})
+    sequential = plan.get_renames(files, str(tmp_path))
+    parallel = plan.get_renames(files, str(tmp_path), workers=8)
+
+    assert parallel == sequential
+    assert parallel[:2] == [
+        ("file00.txt", "1_0b_00.txt"),
+        ("file01.txt", "2_1b_01.txt"),
+    ]
+    assert ("other.txt", "other.txt") in parallel
+    assert "file99.txt" not in dict(parallel)  # stat failed: file dropped
+
+
+def test_get_renames_with_processes(monkeypatch):
+    """
+    Test that planning in shards across processes matches a sequential run,
+    including counters that continue across shard boundaries.
+    """
+    monkeypatch.setattr("renux.renamer.MIN_SHARD_SIZE", 10)
+    files = [f"Photo {i}.JPG" if i % 3 else f"other {i}.txt" for i in range(100)]
+
+    plan = RenamePlan(r"photo (\d+)", r"{counter(5,5,4)}_{\1|reverse}_{photo|len}", {})
+    sequential = plan.get_renames(files, ".")
+    sharded = plan.get_renames(files, ".", processes=4)
+
+    assert plan._shards(files, 4) != [files]
+    assert sharded == sequential
+    assert sharded[1] == ("Photo 1.JPG", "0005_1_5.JPG")
+    assert sharded[-2] == ("Photo 98.JPG", "0330_89_5.JPG")
+
+
+def test_get_renames_reuses_scanned_stat(tmp_path):
+    """
+    Test that stat-based placeholders take each file's stat result from its
+    entry, once per file however many placeholders read it, instead of
+    looking the path up.
+    """
+    (tmp_path / "a.txt").write_bytes(b"abc")
+    (tmp_path / "b.txt").write_bytes(b"abcdef")
+
+    class CountingEntry:
+        def __init__(self, path):
+            self.name = os.path.basename(path)
+            self.st = os.stat(path)
+            self.calls = 0
+
+        def stat(self, *, follow_symlinks=True):
+            self.calls += 1
+            return self.st
+
+    entries = {name: CountingEntry(str(tmp_path / name)) for name in ["a.txt", "b.txt"]}
+
+    with patch("renux.facts.os.stat") as mock_stat:
+        renames = get_renames(
+            list(entries),
+            str(tmp_path),
+            "^",
+            "{size(b)}_{modified_at(%Y)}_",
+            {},
+            entries=entries,
+        )
+
+    mock_stat.assert_not_called()
+    assert [entry.calls for entry in entries.values()] == [1, 1]
+    year = datetime.fromtimestamp(entries["a.txt"].st.st_mtime).year
+    assert renames == [
+        ("a.txt", f"3b_{year}_a.txt"),
+        ("b.txt", f"6b_{year}_b.txt"),
+    ]
+
+
+def test_iter_renames_is_lazy():
+    """
+    Test that `iter_renames` plans each file only when it's asked for.
+    """
+    plan = RenamePlan("file", "doc", {})
+    with patch.object(plan, "get_rename", wraps=plan.get_rename) as mock_get_rename:
+        renames = plan.iter_renames(["file1.txt", "file2.txt"], ".")
+        assert next(renames) == ("file1.txt", "doc1.txt")
+        assert mock_get_rename.call_count == 1
+        assert list(renames) == [("file2.txt", "doc2.txt")]
+
+    assert list(iter_renames(["file1.txt"], ".", "(", "x", {})) == []
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import renux.snapshot
+from renux.cli import main
+from renux.snapshot import Snapshot
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    """Snapshots enabled, kept in a temporary backup directory, and saved even
+    for a directory changed a moment ago."""
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+    monkeypatch.setattr(renux.snapshot, "_enabled", True)
+    monkeypatch.setattr(renux.snapshot, "_get_backup_dir", lambda: str(backup_dir))
+    monkeypatch.setattr(renux.snapshot, "RACY_NS", 0)
+    directory = tmp_path / "files"
+    directory.mkdir()
+    return directory
+
+
+def test_snapshot_round_trip(snapshots):
+    for name in ["b.txt", "A.txt", "c\udcff.txt"]:
+        (snapshots / name).write_bytes(b"x" * len(name))
+    (snapshots / "subdir").mkdir()
+    directory = str(snapshots)
+
+    listing = Snapshot.scan(directory)
+    assert not listing.saved and listing.existing() is None
+    listing.save()
+
+    loaded = Snapshot.load(directory)
+    assert loaded is not None and loaded.saved
+    assert list(loaded.entries) == list(listing.entries)
+    assert loaded.existing() == {"A.txt", "b.txt", "c\udcff.txt", "subdir"}
+
+
+def test_snapshot_entries_stat_files_afresh(snapshots):
+    (snapshots / "a.txt").write_bytes(b"abc")
+    Snapshot.scan(str(snapshots)).save()
+
+    with open(snapshots / "a.txt", "ab") as f:
+        f.write(b"x" * 30)
+
+    loaded = Snapshot.load(str(snapshots))
+    assert loaded is not None
+    assert loaded.entries["a.txt"].stat().st_size == 33
+
+
+def test_snapshot_invalidated_by_changes(snapshots):
+    (snapshots / "a").touch()
+    Snapshot.scan(str(snapshots)).save()
+    assert Snapshot.load(str(snapshots)) is not None
+
+    (snapshots / "b").touch()
+
+    assert Snapshot.load(str(snapshots)) is None
+    assert list(Snapshot.scan(str(snapshots)).entries) == ["a", "b"]
+
+
+def test_snapshot_not_saved_when_racy_or_used_when_old(snapshots, monkeypatch):
+    (snapshots / "a").touch()
+    monkeypatch.setattr(renux.snapshot, "RACY_NS", 60 * 10**9)
+    Snapshot.scan(str(snapshots)).save()
+    assert Snapshot.load(str(snapshots)) is None
+
+    monkeypatch.setattr(renux.snapshot, "RACY_NS", 0)
+    Snapshot.scan(str(snapshots)).save()
+    monkeypatch.setattr(renux.snapshot, "MAX_AGE", -1)
+    assert Snapshot.load(str(snapshots)) is None
+
+
+def test_yes_after_dry_run_reuses_listing(snapshots, monkeypatch):
+    for name in ["foo1.txt", "foo2.txt"]:
+        (snapshots / name).touch()
+    argv = ["renux", str(snapshots), "foo", "bar{size}"]
+
+    monkeypatch.setattr("sys.argv", [*argv, "--dry-run"])
+    main()
+    (snapshots / "foo2.txt").write_bytes(b"edited")
+    listdir = os.listdir
+
+    def no_listing(directory):
+        raise AssertionError("listed the directory again")
+
+    monkeypatch.setattr(renux.snapshot, "scan_directory", no_listing)
+    monkeypatch.setattr(os, "listdir", no_listing)
+    monkeypatch.setattr("sys.argv", [*argv, "--yes"])
+    main()
+
+    assert sorted(listdir(snapshots)) == ["bar0b1.txt", "bar6b2.txt"]
+
+
+def test_yes_after_dry_run_refuses_taken_names(snapshots, monkeypatch, capsys):
+    (snapshots / "foo.txt").touch()
+    (snapshots / "bar.txt").mkdir()
+    argv = ["renux", str(snapshots), "foo", "bar"]
+
+    monkeypatch.setattr("sys.argv", [*argv, "--dry-run"])
+    main()
+    monkeypatch.setattr("sys.argv", [*argv, "--yes"])
+    main()
+
+    assert "bar.txt already exists" in capsys.readouterr().out
+    assert (snapshots / "foo.txt").exists()
+    assert (snapshots / "bar.txt").is_dir()
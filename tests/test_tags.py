@@ -243,10 +243,11 @@ def test_resolve_altitude_missing_raises(tmp_path):
 def mock_video_metadata():
     metadata = MagicMock()
     with (
+        patch("renux.facts.video_info", MagicMock(return_value=None)),
         patch(
-            "renux.tags.createParser", MagicMock(return_value=MagicMock())
+            "hachoir.parser.createParser", MagicMock(return_value=MagicMock())
         ) as mock_parser,
-        patch("renux.tags.extractMetadata", MagicMock(return_value=metadata)),
+        patch("hachoir.metadata.extractMetadata", MagicMock(return_value=metadata)),
     ):
         mock_parser.return_value.__enter__ = MagicMock(
             return_value=mock_parser.return_value
@@ -291,6 +292,9 @@ def test_resolve_duration_missing_raises(mock_video_metadata):
 
 
 def test_video_metadata_no_parser_raises():
-    with patch("renux.tags.createParser", MagicMock(return_value=None)):
+    with (
+        patch("renux.facts.video_info", MagicMock(return_value=None)),
+        patch("hachoir.parser.createParser", MagicMock(return_value=None)),
+    ):
         with pytest.raises(ValueError):
             _resolve_video_width(ctx(file_name="unreadable.mp4"))
@@ -0,0 +1,65 @@
+import re
+
+import pytest
+
+from renux.template import FilterChain, GroupRef, Literal, PlaceholderRef, Template
+
+
+@pytest.mark.parametrize(
+    "replacement",
+    [
+        r"plain",
+        r"\2-\1",
+        r"\g<1>0",
+        r"\g<word>_\g<0>",
+        r"tab\tnew\nline\\",
+        r"\0\012\101",
+        r"keep\.dot\-dash",
+    ],
+)
+def test_render_matches_re_expand(replacement):
+    """Group references and escapes expand exactly like `re.sub`."""
+    regex = re.compile(r"(?P<word>[a-z]+)(\d+)")
+    match = regex.search("abc123")
+    assert match is not None
+
+    template = Template(replacement, regex)
+
+    assert template.render(match, []) == match.expand(replacement)
+
+
+@pytest.mark.parametrize("replacement", [r"\3", r"\g<nope>", r"\q", "trailing\\"])
+def test_invalid_references_raise(replacement):
+    with pytest.raises(re.error):
+        Template(replacement, re.compile(r"(a)(b)"))
+
+
+def test_parse_segments():
+    template = Template(r"IMG_{\1|upper}_{counter(1,1,3)}", re.compile(r"(\w+)"))
+
+    literal, chain, sep, counter = template.segments
+    assert literal == Literal("IMG_")
+    assert isinstance(chain, FilterChain)
+    assert chain.segments == (GroupRef(1),)
+    assert sep == Literal("_")
+    assert isinstance(counter, PlaceholderRef)
+    assert template.stateful == [counter]
+    assert template.stateless == []
+
+
+@pytest.mark.parametrize(
+    "replacement, expected",
+    [
+        ("{a|upper", "{a|upper"),
+        ("{abc}", "{abc}"),
+        ("{|upper}", "{|upper}"),
+        ("x}{a|upper}|", "x}A|"),
+        ("{a{b|upper}|reverse}", "Ba"),
+    ],
+)
+def test_tags(replacement, expected):
+    """Incomplete tags are kept as literal text; filter chains can nest."""
+    match = re.search("", "")
+    assert match is not None
+
+    assert Template(replacement).render(match, []) == expected
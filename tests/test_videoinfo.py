@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+
+from renux.helpers.videoinfo import video_info
+
+
+def _box(box_type: bytes, *children: bytes) -> bytes:
+    payload = b"".join(children)
+    return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+
+def _full(version: int = 0) -> bytes:
+    return bytes([version, 0, 0, 0])
+
+
+def _mp4(*, moov_first: bool = True, version: int = 0) -> bytes:
+    """A minimal MP4: 1920x1080, 10 s, 300 frames (30 fps) in one video track."""
+    if version == 1:
+        mvhd = _box(b"mvhd", _full(1), b"\0" * 16, struct.pack(">IQ", 1000, 10_000))
+        mdhd = _box(b"mdhd", _full(1), b"\0" * 16, struct.pack(">IQ", 30_000, 300_000))
+        tkhd = _box(
+            b"tkhd", _full(1), b"\0" * 84, struct.pack(">II", 1920 << 16, 1080 << 16)
+        )
+    else:
+        mvhd = _box(b"mvhd", _full(), b"\0" * 8, struct.pack(">II", 1000, 10_000))
+        mdhd = _box(b"mdhd", _full(), b"\0" * 8, struct.pack(">II", 30_000, 300_000))
+        tkhd = _box(
+            b"tkhd", _full(), b"\0" * 72, struct.pack(">II", 1920 << 16, 1080 << 16)
+        )
+    hdlr = _box(b"hdlr", _full(), b"\0" * 4, b"vide", b"\0" * 12)
+    stts = _box(b"stts", _full(), struct.pack(">III", 1, 300, 1000))
+    stsd = _box(b"stsd", _full(), struct.pack(">I", 0))
+    stbl = _box(b"stbl", stsd, stts)
+    trak = _box(b"trak", tkhd, _box(b"mdia", mdhd, hdlr, _box(b"minf", stbl)))
+    sound = _box(b"trak", _box(b"mdia", _box(b"hdlr", _full(), b"\0" * 4, b"soun")))
+    moov = _box(b"moov", mvhd, sound, trak)
+    ftyp = _box(b"ftyp", b"isom\0\0\0\0isom")
+    mdat = _box(b"mdat", b"\0" * 10_000)
+    return ftyp + (moov + mdat if moov_first else mdat + moov)
+
+
+@pytest.mark.parametrize("moov_first", [True, False])
+@pytest.mark.parametrize("version", [0, 1])
+def test_video_info_mp4(tmp_path, moov_first, version):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(_mp4(moov_first=moov_first, version=version))
+
+    assert video_info(str(path)) == {
+        "width": 1920,
+        "height": 1080,
+        "frame_rate": 30.0,
+        "duration": 10.0,
+    }
+
+
+def _ebml(element_id: int, payload: bytes) -> bytes:
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + _size(len(payload)) + payload
+
+
+def _size(n: int) -> bytes:
+    return (0x10000000 | n).to_bytes(4, "big")  # 4-byte EBML size
+
+
+@pytest.mark.parametrize("unknown_segment_size", [False, True])
+def test_video_info_mkv(tmp_path, unknown_segment_size):
+    """A minimal Matroska file: 1280x720, 25 fps, 12.5 s."""
+    info = _ebml(
+        0x1549A966,
+        _ebml(0x2AD7B1, (1_000_000).to_bytes(3, "big"))
+        + _ebml(0x4489, struct.pack(">d", 12_500.0)),
+    )
+    video = _ebml(
+        0xE0,
+        _ebml(0xB0, (1280).to_bytes(2, "big")) + _ebml(0xBA, (720).to_bytes(2, "big")),
+    )
+    entry = _ebml(
+        0xAE,
+        _ebml(0x83, b"\x01") + _ebml(0x23E383, (40_000_000).to_bytes(4, "big")) + video,
+    )
+    tracks = _ebml(0x1654AE6B, entry)
+    cluster = _ebml(0x1F43B675, b"\0" * 100)
+    body = info + tracks + cluster
+    if unknown_segment_size:
+        segment = (
+            (0x18538067).to_bytes(4, "big") + b"\x01\xff\xff\xff\xff\xff\xff\xff" + body
+        )
+    else:
+        segment = _ebml(0x18538067, body)
+    path = tmp_path / "v.mkv"
+    path.write_bytes(_ebml(0x1A45DFA3, _ebml(0x4282, b"matroska")) + segment)
+
+    assert video_info(str(path)) == {
+        "width": 1280,
+        "height": 720,
+        "frame_rate": 25.0,
+        "duration": 12.5,
+    }
+
+
+def test_video_info_unknown_format(tmp_path):
+    path = tmp_path / "v.avi"
+    path.write_bytes(b"RIFF\0\0\0\0AVI LIST")
+
+    assert video_info(str(path)) is None